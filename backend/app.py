@@ -3,10 +3,11 @@ Albion Market Helper - Backend API
 FastAPI application for analyzing market opportunities in Albion Online
 """
 from items_database import ALBION_ITEMS, get_all_items_flat
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from typing import List, Optional, Dict, Any
+import asyncio
 import os
 from dotenv import load_dotenv
 from database import init_db, get_db, MarketTick
@@ -21,32 +22,149 @@ from schemas import (
     PricesRequest, PricesResponse,
     OpportunitiesRequest, OpportunitiesResponse,
     HistoryRequest, HistoryResponse,
+    HistoryBatchRequest, HistoryBatchResponse,
+    CrossRegionPricesRequest, CrossRegionPricesResponse,
+    CacheInvalidateRequest,
     MetaResponse
 )
-from services.aodp_client import AODPClient
-from services.pricing import PricingCalculator
-from services.cache import CacheManager
+from services.aodp_client import AODPClient, AODPUnavailableError, REGION_URLS
+from services.pricing import PricingCalculator, pair_quality
+from services.cache import CacheManager, RedisCache, SQLiteCache, TieredCache, city_tag, item_tag
+from services.codec import parse_codecs
+from services.epoch import PriceEpochs
+from services.prefetch import PrefetchScheduler
+from services.history import HistoryService
+from services.fastjson import FastJSONResponse
+from services.response_cache import ResponseCache
 from schemas_breeding import BreedingRequest, BreedingResponse
 from services.breeding import BreedingCalculator
 
 load_dotenv()
 
 # Configuration
-AODP_BASE = os.getenv("AODP_BASE", "https://west.albion-online-data.com")
+AODP_BASE = os.getenv("AODP_BASE", REGION_URLS["west"])
+# AODP_EMULATOR_URL (e.g. the local benchmarks/aodp_emulator.py) serves every region;
+# AODP_BASE_WEST / AODP_BASE_EUROPE / AODP_BASE_EAST override single regions
+AODP_EMULATOR_URL = os.getenv("AODP_EMULATOR_URL")
+AODP_REGION_URLS = {
+    region: os.getenv(f"AODP_BASE_{region.upper()}") or AODP_EMULATOR_URL or url
+    for region, url in REGION_URLS.items()
+}
 CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "600"))
+CACHE_STALE_TTL_SECONDS = int(os.getenv("CACHE_STALE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "100000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+CACHE_SWEEP_INTERVAL_SECONDS = float(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "1"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()  # memory, sqlite or redis
+CACHE_L2_PATH = os.getenv("CACHE_L2_PATH", "./cache_l2.sqlite3")
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", "1"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+CACHE_L2_MAX_BYTES = int(os.getenv("CACHE_L2_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_COMPACT_INTERVAL_SECONDS = float(os.getenv("CACHE_COMPACT_INTERVAL_SECONDS", "300"))
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", "20000"))
+# Per-namespace value codecs, e.g. "history=msgpack+columnar+zstd;prices=msgpack"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "60"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_CODECS = parse_codecs(os.getenv("CACHE_CODECS", "history=msgpack+columnar+zstd"))
 RATE_LIMIT_PER_MIN = int(os.getenv("RATE_LIMIT_PER_MIN", "120"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", str(RATE_LIMIT_PER_MIN)))
+AODP_MAX_CONCURRENCY = int(os.getenv("AODP_MAX_CONCURRENCY", "4"))
+ADAPTIVE_RATE_LIMIT = os.getenv("ADAPTIVE_RATE_LIMIT", "true").lower() == "true"
+RATE_LIMIT_FLOOR_PER_MIN = float(os.getenv("RATE_LIMIT_FLOOR_PER_MIN", "10"))
+# Headroom above the configured rate, so the controller can learn a higher budget
+RATE_LIMIT_CEILING_PER_MIN = float(os.getenv("RATE_LIMIT_CEILING_PER_MIN", str(RATE_LIMIT_PER_MIN * 3)))
+RATE_LIMIT_STATE_PATH = os.getenv("RATE_LIMIT_STATE_PATH", "./aodp_rate_state.json")
+AODP_HTTP2 = os.getenv("AODP_HTTP2", "false").lower() == "true"
+AODP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("AODP_MAX_CONNECTIONS_PER_HOST", "10"))
+AODP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("AODP_MAX_KEEPALIVE_PER_HOST", "10"))
+AODP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("AODP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+AODP_CONNECT_TIMEOUT = float(os.getenv("AODP_CONNECT_TIMEOUT", "5"))
+AODP_READ_TIMEOUT = float(os.getenv("AODP_READ_TIMEOUT", "30"))
+AODP_WRITE_TIMEOUT = float(os.getenv("AODP_WRITE_TIMEOUT", "10"))
+AODP_POOL_TIMEOUT = float(os.getenv("AODP_POOL_TIMEOUT", "10"))
+AODP_ACCEPT_ENCODING = os.getenv("AODP_ACCEPT_ENCODING", "gzip, deflate")
+AODP_WARMUP = os.getenv("AODP_WARMUP", "true").lower() == "true"
+AODP_WARMUP_CONNECTIONS = int(os.getenv("AODP_WARMUP_CONNECTIONS", "1"))
+OFFLINE_MODE = os.getenv("OFFLINE_MODE", "false").lower() == "true"
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+DEGRADED_MAX_AGE_HOURS = int(os.getenv("DEGRADED_MAX_AGE_HOURS", "168"))
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_CATEGORY = os.getenv("PREFETCH_CATEGORY", "")
+PREFETCH_REGION = os.getenv("PREFETCH_REGION", "west")
+PREFETCH_QUALITIES = [int(q) for q in os.getenv("PREFETCH_QUALITIES", "0").split(",") if q]
+PREFETCH_INTERVAL_SECONDS = int(os.getenv("PREFETCH_INTERVAL_SECONDS", "60"))
+PREFETCH_BUDGET_FRACTION = float(os.getenv("PREFETCH_BUDGET_FRACTION", "0.5"))
+
+def build_cache():
+    """In-process cache, optionally tiered over a shared L2 (CACHE_BACKEND)"""
+    l1 = CacheManager(
+        ttl_seconds=CACHE_TTL_SECONDS,
+        stale_ttl_seconds=CACHE_STALE_TTL_SECONDS,
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES,
+        codecs=CACHE_CODECS
+    )
+    if CACHE_BACKEND == "sqlite":
+        l2 = SQLiteCache(
+            CACHE_L2_PATH, CACHE_TTL_SECONDS, CACHE_STALE_TTL_SECONDS,
+            max_bytes=CACHE_L2_MAX_BYTES, codecs=CACHE_CODECS
+        )
+    elif CACHE_BACKEND == "redis":
+        l2 = RedisCache(REDIS_URL, CACHE_TTL_SECONDS, CACHE_STALE_TTL_SECONDS, codecs=CACHE_CODECS)
+        if not l2.enabled:
+            return l1
+    else:
+        return l1
+    return TieredCache(
+        l1, l2,
+        poll_interval_seconds=CACHE_INVALIDATION_POLL_SECONDS,
+        compact_interval_seconds=CACHE_COMPACT_INTERVAL_SECONDS
+    )
 
 # Initialize services
-cache_manager = CacheManager(ttl_seconds=CACHE_TTL_SECONDS)
+cache_manager = build_cache()
+price_epochs = PriceEpochs()
 aodp_client = AODPClient(
     base_url=AODP_BASE,
     cache_manager=cache_manager,
-    rate_limit_per_min=RATE_LIMIT_PER_MIN
+    rate_limit_per_min=RATE_LIMIT_PER_MIN,
+    epochs=price_epochs,
+    rate_limit_burst=RATE_LIMIT_BURST,
+    max_concurrency=AODP_MAX_CONCURRENCY,
+    adaptive_rate={
+        "floor_per_min": RATE_LIMIT_FLOOR_PER_MIN,
+        "ceiling_per_min": RATE_LIMIT_CEILING_PER_MIN,
+        "state_path": RATE_LIMIT_STATE_PATH
+    } if ADAPTIVE_RATE_LIMIT else None,
+    offline=OFFLINE_MODE,
+    circuit_failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    circuit_reset_seconds=CIRCUIT_RESET_SECONDS,
+    region_urls=AODP_REGION_URLS,
+    http_settings={
+        "http2": AODP_HTTP2,
+        "max_connections": AODP_MAX_CONNECTIONS_PER_HOST,
+        "max_keepalive_connections": AODP_MAX_KEEPALIVE_PER_HOST,
+        "keepalive_expiry": AODP_KEEPALIVE_EXPIRY_SECONDS,
+        "connect_timeout": AODP_CONNECT_TIMEOUT,
+        "read_timeout": AODP_READ_TIMEOUT,
+        "write_timeout": AODP_WRITE_TIMEOUT,
+        "pool_timeout": AODP_POOL_TIMEOUT,
+        "accept_encoding": AODP_ACCEPT_ENCODING,
+        "warmup_connections": AODP_WARMUP_CONNECTIONS
+    }
 )
+response_cache = ResponseCache(ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, max_bytes=RESPONSE_CACHE_MAX_BYTES)
 pricing_calculator = PricingCalculator()
 init_db()
-ingest_service = IngestService()
+ingest_service = IngestService(epochs=price_epochs, cache=cache_manager)
 breeding_calculator = BreedingCalculator(aodp_client, pricing_calculator)
+history_service = HistoryService(aodp_client, cache_manager)
+prefetch_scheduler = PrefetchScheduler(
+    aodp_client,
+    interval_seconds=PREFETCH_INTERVAL_SECONDS,
+    budget_fraction=PREFETCH_BUDGET_FRACTION
+)
 
 # Schemas for ingest endpoints
 class ADCRecord(BaseModel):
@@ -75,16 +193,32 @@ class IngestStatsResponse(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    if isinstance(cache_manager, TieredCache) and CACHE_WARM_ENTRIES:
+        # Come up warm from the persistent L2 instead of asking AODP again
+        warmed = cache_manager.warm(CACHE_WARM_ENTRIES)
+        print(f"Cache warmed with {warmed} entries")
+    cache_manager.start_sweeper(CACHE_SWEEP_INTERVAL_SECONDS)
+    response_cache.start_sweeper(CACHE_SWEEP_INTERVAL_SECONDS)
     await aodp_client.initialize()
+    if AODP_WARMUP:
+        warmed = await aodp_client.warm_up()
+        print(f"AODP connections warmed up: {warmed}")
+    if PREFETCH_ENABLED and not OFFLINE_MODE:
+        prefetch_scheduler.start()
     yield
     # Shutdown
+    await prefetch_scheduler.stop()
+    aodp_client.save_rate_state()
     await aodp_client.close()
+    await cache_manager.stop_sweeper()
+    await response_cache.stop_sweeper()
 
 app = FastAPI(
     title="Albion Market Helper API",
     version="1.0.0",
     description="API for analyzing market opportunities in Albion Online",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS configuration
@@ -106,6 +240,47 @@ SUPPORTED_CITIES = [
 # Popular items 
 DEFAULT_ITEMS = get_all_items_flat()
 
+# Prefetch watchlist from categories of ALBION_ITEMS (matched by name, e.g. "Mounts")
+if PREFETCH_CATEGORY:
+    for category_name, category_items in ALBION_ITEMS.items():
+        if PREFETCH_CATEGORY.lower() in category_name.lower():
+            prefetch_scheduler.watch(
+                region=PREFETCH_REGION,
+                items=list(category_items),
+                cities=SUPPORTED_CITIES,
+                qualities=PREFETCH_QUALITIES
+            )
+
+def _aodp_qualities(qualities: List[int], quality_mode: str) -> List[int]:
+    """Qualities to fetch from AODP for the given resolution mode"""
+    if quality_mode == 'at_least':
+        return list(range(min(qualities), 6))
+    return qualities
+
+def _response_key(endpoint: str, request) -> str:
+    """Response cache key: normalized request body + price epochs of its items"""
+    return response_cache.make_key(
+        endpoint, request.dict(), price_epochs.signature(request.region, request.items)
+    )
+
+def _store_response(endpoint: str, request, response, if_none_match: Optional[str]):
+    """Cache an endpoint response under _response_key(), tagged with the request's items and cities"""
+    tags = [item_tag(request.region, item_id) for item_id in request.items]
+    tags += [city_tag(request.region, city) for city in request.cities]
+    return response_cache.store(_response_key(endpoint, request), response, if_none_match, tags)
+
+def _degraded_prices(db: Session, request) -> List[Dict[str, Any]]:
+    """Best local market_ticks data for a request while AODP is unavailable"""
+    return ingest_service.get_best_snapshot(
+        db=db,
+        region=request.region,
+        cities=request.cities,
+        items=request.items,
+        max_age_hours=max(request.max_age_hours, DEGRADED_MAX_AGE_HOURS),
+        qualities=request.qualities,
+        quality_mode=getattr(request, 'quality_mode', 'exact')
+    )
+
 @app.post("/api/ingest/adc")
 async def ingest_adc_data(
     request: ADCIngestRequest,
@@ -153,6 +328,7 @@ async def get_private_stats(db: Session = Depends(get_db)):
 @app.post("/api/market/prices/v2", response_model=PricesResponse)
 async def get_market_prices_v2(
     request: PricesRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """
@@ -162,32 +338,55 @@ async def get_market_prices_v2(
     1. Checks local database for PRIVATE data first
     2. Falls back to AODP API for missing data
     3. Returns merged results with source indicators
+    
+    Identical requests are answered from the response cache (ETag/304).
     """
     try:
+        prefetch_scheduler.record_request(
+            request.region, request.items, request.cities, request.qualities
+        )
+        
+        if_none_match = http_request.headers.get("if-none-match")
+        cached = response_cache.lookup(_response_key("prices_v2", request), if_none_match)
+        if cached is not None:
+            return cached
+        
         # First, try to get data from local database
         local_prices = ingest_service.get_best_snapshot(
             db=db,
             region=request.region,
             cities=request.cities,
             items=request.items,
-            max_age_hours=request.max_age_hours
+            max_age_hours=request.max_age_hours,
+            qualities=request.qualities,
+            quality_mode=request.quality_mode
         )
         
         # If we have all the data locally and it's fresh, use it
-        if len(local_prices) == len(request.cities) * len(request.items):
-            return PricesResponse(
+        expected = len(request.cities) * len(request.items) * len(request.qualities)
+        if len(local_prices) == expected:
+            response = PricesResponse(
                 region=request.region,
                 prices=local_prices,
                 timestamp=pricing_calculator.get_current_timestamp()
             )
+            return _store_response("prices_v2", request, FastJSONResponse(response.dict()), if_none_match)
         
         # Otherwise, also fetch from AODP
-        aodp_prices = await aodp_client.get_prices(
-            region=request.region,
-            items=request.items,
-            cities=request.cities,
-            qualities=request.qualities
-        )
+        try:
+            aodp_prices = await aodp_client.get_prices(
+                region=request.region,
+                items=request.items,
+                cities=request.cities,
+                qualities=_aodp_qualities(request.qualities, request.quality_mode)
+            )
+        except AODPUnavailableError:
+            return PricesResponse(
+                region=request.region,
+                prices=_degraded_prices(db, request),
+                timestamp=pricing_calculator.get_current_timestamp(),
+                degraded=True
+            )
         
         # Merge with preference for private data
         merged_prices = ingest_service.merge_with_aodp(
@@ -196,12 +395,16 @@ async def get_market_prices_v2(
             region=request.region,
             max_age_hours=request.max_age_hours
         )
+        if request.quality_mode == 'at_least':
+            merged_prices = ingest_service.resolve_min_quality(merged_prices, request.qualities)
         
-        return PricesResponse(
+        response = PricesResponse(
             region=request.region,
             prices=merged_prices,
             timestamp=pricing_calculator.get_current_timestamp()
         )
+        # Keyed after the fetch, which may have moved the price epochs
+        return _store_response("prices_v2", request, FastJSONResponse(response.dict()), if_none_match)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -209,6 +412,7 @@ async def get_market_prices_v2(
 @app.post("/api/market/opportunities/v2")
 async def calculate_opportunities_v2(
     request: OpportunitiesRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
     """
@@ -220,30 +424,49 @@ async def calculate_opportunities_v2(
     - Shows data age for transparency
     """
     try:
+        prefetch_scheduler.record_request(
+            request.region, request.items, request.cities, request.qualities
+        )
+        
+        if_none_match = http_request.headers.get("if-none-match")
+        cached = response_cache.lookup(_response_key("opportunities_v2", request), if_none_match)
+        if cached is not None:
+            return cached
+        
         # Get prices with private data priority
         local_prices = ingest_service.get_best_snapshot(
             db=db,
             region=request.region,
             cities=request.cities,
             items=request.items,
-            max_age_hours=request.max_age_hours
+            max_age_hours=request.max_age_hours,
+            qualities=request.qualities,
+            quality_mode=request.quality_mode
         )
         
         # If local data is incomplete, fetch from AODP
-        if len(local_prices) < len(request.cities) * len(request.items):
-            aodp_prices = await aodp_client.get_prices(
-                region=request.region,
-                items=request.items,
-                cities=request.cities,
-                qualities=request.qualities
-            )
-            
-            merged_prices = ingest_service.merge_with_aodp(
-                db=db,
-                aodp_data=aodp_prices,
-                region=request.region,
-                max_age_hours=request.max_age_hours
-            )
+        expected = len(request.cities) * len(request.items) * len(request.qualities)
+        degraded = False
+        if len(local_prices) < expected:
+            try:
+                aodp_prices = await aodp_client.get_prices(
+                    region=request.region,
+                    items=request.items,
+                    cities=request.cities,
+                    qualities=_aodp_qualities(request.qualities, request.quality_mode)
+                )
+                
+                merged_prices = ingest_service.merge_with_aodp(
+                    db=db,
+                    aodp_data=aodp_prices,
+                    region=request.region,
+                    max_age_hours=request.max_age_hours
+                )
+                if request.quality_mode == 'at_least':
+                    merged_prices = ingest_service.resolve_min_quality(merged_prices, request.qualities)
+            except AODPUnavailableError:
+                merged_prices = _degraded_prices(db, request)
+                degraded = True
         else:
             merged_prices = local_prices
         
@@ -254,7 +477,8 @@ async def calculate_opportunities_v2(
                 # Calculate for each city pair
                 for other_price in merged_prices:
                     if (price['city'] != other_price['city'] and 
-                        price['item_id'] == other_price['item_id']):
+                        price['item_id'] == other_price['item_id'] and
+                        pair_quality(price) == pair_quality(other_price)):
                         
                         # Buy in first city, sell in second
                         buy_price = price['sell_price_min']
@@ -297,18 +521,23 @@ async def calculate_opportunities_v2(
             key=lambda x: (-x['profit_percentage'], -x['profit_absolute'])
         )
         
-        return {
+        # Large payload: skip FastAPI's jsonable_encoder pass
+        response = FastJSONResponse({
             'region': request.region,
             'opportunities': sorted_opportunities,
             'timestamp': pricing_calculator.get_current_timestamp(),
             'parameters': request.dict(),
+            'degraded': degraded,
             'stats': {
                 'total_routes': len(sorted_opportunities),
                 'profitable_routes': sum(1 for o in sorted_opportunities if o['is_profitable']),
                 'negative_routes': sum(1 for o in sorted_opportunities if not o['is_profitable']),
                 'private_data_used': sum(1 for o in sorted_opportunities if o['source_buy'] == 'PRIVATE' or o['source_sell'] == 'PRIVATE')
             }
-        }
+        })
+        if degraded:
+            return response
+        return _store_response("opportunities_v2", request, response, if_none_match)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -331,48 +560,146 @@ async def get_cities():
     )
 
 @app.post("/api/market/prices", response_model=PricesResponse)
-async def get_market_prices(request: PricesRequest):
+async def get_market_prices(
+    request: PricesRequest,
+    http_request: Request,
+    db: Session = Depends(get_db)
+):
     """Get current market prices for specified items and cities"""
     try:
-        # Get prices from AODP
-        prices_data = await aodp_client.get_prices(
+        prefetch_scheduler.record_request(
+            request.region, request.items, request.cities, request.qualities
+        )
+        
+        if_none_match = http_request.headers.get("if-none-match")
+        cached = response_cache.lookup(_response_key("prices", request), if_none_match)
+        if cached is not None:
+            return cached
+        
+        # Get prices from AODP (large item lists are fetched in chunks)
+        result = await aodp_client.fetch_prices(
             region=request.region,
             items=request.items,
             cities=request.cities,
-            qualities=request.qualities
+            qualities=_aodp_qualities(request.qualities, request.quality_mode)
         )
+        if result["errors"] and not result["data"]:
+            if not aodp_client.is_available(request.region):
+                return PricesResponse(
+                    region=request.region,
+                    prices=_degraded_prices(db, request),
+                    timestamp=pricing_calculator.get_current_timestamp(),
+                    errors=result["errors"],
+                    degraded=True
+                )
+            raise RuntimeError(result["errors"][0]["error"])
         
         # Filter by max age
         filtered_prices = pricing_calculator.filter_by_age(
-            prices_data, 
+            result["data"], 
             max_age_hours=request.max_age_hours
         )
+        if request.quality_mode == 'at_least':
+            filtered_prices = ingest_service.resolve_min_quality(filtered_prices, request.qualities)
         
-        return PricesResponse(
+        response = PricesResponse(
             region=request.region,
             prices=filtered_prices,
+            timestamp=pricing_calculator.get_current_timestamp(),
+            errors=result["errors"]
+        )
+        if result["errors"]:
+            return response  # Partial results are not worth repeating
+        return _store_response("prices", request, FastJSONResponse(response.dict()), if_none_match)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/market/prices/regions", response_model=CrossRegionPricesResponse)
+async def get_cross_region_prices(request: CrossRegionPricesRequest):
+    """
+    Compare prices of the same items across server regions
+    
+    Regions are fetched concurrently, each against its own host's rate
+    limit, so the call takes as long as the slowest region.
+    """
+    try:
+        for region in request.regions:
+            prefetch_scheduler.record_request(region, request.items, request.cities, request.qualities)
+        
+        results = await asyncio.gather(*(
+            aodp_client.fetch_prices(
+                region=region,
+                items=request.items,
+                cities=request.cities,
+                qualities=request.qualities
+            )
+            for region in request.regions
+        ), return_exceptions=True)
+        
+        prices_by_region = {}
+        errors = {}
+        for region, result in zip(request.regions, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                prices_by_region[region] = []
+                errors[region] = [{"items": request.items, "error": str(result)}]
+                continue
+            prices_by_region[region] = pricing_calculator.filter_by_age(
+                result["data"],
+                max_age_hours=request.max_age_hours
+            )
+            errors[region] = result["errors"]
+        
+        rows, summaries = pricing_calculator.align_regions(prices_by_region)
+        for region, summary in summaries.items():
+            summary["errors"] = errors[region]
+        
+        return CrossRegionPricesResponse(
+            regions=summaries,
+            prices=rows,
             timestamp=pricing_calculator.get_current_timestamp()
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/market/opportunities", response_model=OpportunitiesResponse)
-async def calculate_opportunities(request: OpportunitiesRequest):
+async def calculate_opportunities(
+    request: OpportunitiesRequest,
+    http_request: Request,
+    db: Session = Depends(get_db)
+):
     """Calculate profit opportunities between cities"""
     try:
-        # Get current prices
-        prices_data = await aodp_client.get_prices(
-            region=request.region,
-            items=request.items,
-            cities=request.cities,
-            qualities=request.qualities
+        prefetch_scheduler.record_request(
+            request.region, request.items, request.cities, request.qualities
         )
         
-        # Filter by age
-        filtered_prices = pricing_calculator.filter_by_age(
-            prices_data,
-            max_age_hours=request.max_age_hours
-        )
+        if_none_match = http_request.headers.get("if-none-match")
+        cached = response_cache.lookup(_response_key("opportunities", request), if_none_match)
+        if cached is not None:
+            return cached
+        
+        # Get current prices (local data only while AODP is unavailable)
+        degraded = False
+        try:
+            prices_data = await aodp_client.get_prices(
+                region=request.region,
+                items=request.items,
+                cities=request.cities,
+                qualities=_aodp_qualities(request.qualities, request.quality_mode)
+            )
+            
+            # Filter by age
+            filtered_prices = pricing_calculator.filter_by_age(
+                prices_data,
+                max_age_hours=request.max_age_hours
+            )
+            if request.quality_mode == 'at_least':
+                filtered_prices = ingest_service.resolve_min_quality(filtered_prices, request.qualities)
+        except AODPUnavailableError:
+            filtered_prices = _degraded_prices(db, request)
+            degraded = True
         
         # Calculate opportunities
         opportunities = pricing_calculator.calculate_opportunities(
@@ -380,26 +707,27 @@ async def calculate_opportunities(request: OpportunitiesRequest):
             premium=request.premium,
             setup_fee=request.setup_fee,
             transport_cost=request.transport_cost,
-            prefer_caerleon=request.prefer_caerleon
-        )
-        
-        # Sort by profit percentage (descending) then by absolute profit
-        sorted_opportunities = sorted(
-            opportunities,
-            key=lambda x: (-x["profit_percentage"], -x["profit_absolute"])
+            prefer_caerleon=request.prefer_caerleon,
+            top_k=100  # Ranked by profit percentage, then absolute profit
         )
         
-        return OpportunitiesResponse(
-            region=request.region,
-            opportunities=sorted_opportunities[:100],  # Limit to top 100
-            timestamp=pricing_calculator.get_current_timestamp(),
-            parameters={
+        # Built as a plain dict (same shape as OpportunitiesResponse) to skip
+        # pydantic validation of every opportunity
+        response = FastJSONResponse({
+            "region": request.region,
+            "opportunities": opportunities,
+            "timestamp": pricing_calculator.get_current_timestamp(),
+            "parameters": {
                 "premium": request.premium,
                 "setup_fee": request.setup_fee,
                 "transport_cost": request.transport_cost,
                 "max_age_hours": request.max_age_hours
-            }
-        )
+            },
+            "degraded": degraded
+        })
+        if degraded:
+            return response
+        return _store_response("opportunities", request, response, if_none_match)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -408,16 +736,28 @@ async def get_market_history(
     region: str,
     item: str,
     city: str,
-    timescale: int = 24
+    timescale: int = 24,
+    db: Session = Depends(get_db)
 ):
     """Get historical price data for an item in a specific city"""
     try:
-        history_data = await aodp_client.get_history(
-            region=region,
-            item=item,
-            city=city,
-            timescale=timescale
-        )
+        try:
+            history_data = await aodp_client.get_history(
+                region=region,
+                item=item,
+                city=city,
+                timescale=timescale
+            )
+        except AODPUnavailableError:
+            # Buckets stored by /api/market/history/batch
+            return HistoryResponse(
+                region=region,
+                item=item,
+                city=city,
+                timescale=timescale,
+                data=history_service.get_stored_history(db, region, item, city, timescale),
+                degraded=True
+            )
         
         return HistoryResponse(
             region=region,
@@ -429,19 +769,74 @@ async def get_market_history(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/market/history/batch", response_model=HistoryBatchResponse)
+async def get_market_history_batch(
+    request: HistoryBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Get historical data for many items x cities x timescales
+    
+    Completed buckets are stored in the local market_history table, so
+    repeated views only ask AODP for buckets that completed since.
+    """
+    try:
+        result = await history_service.get_history_batch(
+            db=db,
+            region=request.region,
+            items=request.items,
+            cities=request.cities,
+            timescales=request.timescales
+        )
+        
+        return HistoryBatchResponse(
+            region=request.region,
+            series=result["series"],
+            timestamp=pricing_calculator.get_current_timestamp(),
+            errors=result["errors"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/cache/clear")
 async def clear_cache():
     """Clear the cache (admin endpoint)"""
     cache_manager.clear()
+    response_cache.clear()
     return {"message": "Cache cleared successfully"}
 
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest):
+    """Drop cached data for specific items and/or cities, keeping the rest (admin endpoint)"""
+    tags = [item_tag(request.region, item_id) for item_id in request.items]
+    tags += [city_tag(request.region, city) for city in request.cities]
+    invalidated = cache_manager.invalidate_tags(tags)
+    price_epochs.bump(request.region, request.items)
+    # Cached responses for the cities would otherwise keep their (unchanged) keys
+    response_cache.invalidate_tags(tags)
+    return {"invalidated": len(invalidated)}
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Cache counters overall and per key namespace (prices, history, ...)"""
+    return {
+        "cache": cache_manager.get_stats(exact=True),
+        "namespaces": cache_manager.get_namespace_stats(),
+        "responses": response_cache.get_namespace_stats()
+    }
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "cache_size": cache_manager.size(),
-        "rate_limit": f"{RATE_LIMIT_PER_MIN} requests/min"
+        "cache": cache_manager.get_stats(),
+        "cache_namespaces": cache_manager.get_namespace_stats(),
+        "rate_limit": f"{RATE_LIMIT_PER_MIN} requests/min",
+        "adaptive_rate_per_min": aodp_client.get_region_rates(),
+        "aodp": aodp_client.get_metrics(),
+        "prefetch": prefetch_scheduler.get_stats()
     }
 
 @app.post("/api/breeding/calc", response_model=BreedingResponse)
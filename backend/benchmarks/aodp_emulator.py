@@ -0,0 +1,270 @@
+"""
+Local AODP emulator
+Serves /api/v2/stats/prices and /api/v2/stats/history from recorded or
+synthetic fixtures, with configurable latency, 429 injection and payload size
+
+Run standalone:
+    python benchmarks/aodp_emulator.py --port 8100 --latency-ms 50 --throttle-rate 0.05
+    AODP_EMULATOR_URL=http://127.0.0.1:8100 python app.py
+
+Or in-process, with no network at all:
+    client = AODPClient(..., transport=httpx.ASGITransport(app=AODPEmulator()))
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote
+
+DEFAULT_CITIES = ["Martlock", "Lymhurst", "Bridgewatch", "Thetford", "Fort Sterling", "Caerleon"]
+PRICES_PREFIX = "/api/v2/stats/prices/"
+HISTORY_PREFIX = "/api/v2/stats/history/"
+EPOCH = datetime(1970, 1, 1)
+
+class AODPEmulator:
+    """
+    ASGI app mimicking the AODP price and history endpoints
+
+    Rows found in the fixtures file are served as recorded; every other
+    item/city/quality gets a synthetic row derived from a hash of the key,
+    so the same request always returns the same payload.
+    """
+
+    def __init__(
+        self,
+        fixtures_path: Optional[str] = None,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        rate_limit_per_min: Optional[int] = None,
+        retry_after: Optional[float] = 1.0,
+        history_points: int = 30,
+        pad_bytes: int = 0,
+        seed: int = 0
+    ):
+        """
+        Args:
+            fixtures_path: JSON file with recorded {"prices": [...], "history": [...]}
+            latency_ms: Added latency per request
+            latency_jitter_ms: Uniform random jitter on top of latency_ms
+            throttle_rate: Fraction of requests answered with 429
+            rate_limit_per_min: Answer 429 once more requests arrive in a 60s window
+            retry_after: Retry-After seconds sent with 429s (None to omit the header)
+            history_points: Buckets per synthetic history series
+            pad_bytes: Extra bytes per row, to emulate larger payloads
+            seed: Seed for synthetic prices, jitter and throttling
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.throttle_rate = throttle_rate
+        self.rate_limit_per_min = rate_limit_per_min
+        self.retry_after = retry_after
+        self.history_points = history_points
+        self.pad_bytes = pad_bytes
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.prices: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        self.history: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        if fixtures_path:
+            self.load_fixtures(fixtures_path)
+
+        self.window: List[float] = []
+        self.stats = {"requests": 0, "throttled": 0, "rows": 0, "bytes": 0}
+
+    def load_fixtures(self, path: str) -> None:
+        """Load recorded rows keyed by (item_id, city, quality)"""
+        with open(path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+        for row in fixtures.get("prices", []):
+            self.prices[(row["item_id"], row["city"], row.get("quality", 1))] = row
+        for series in fixtures.get("history", []):
+            self.history[(series["item_id"], series["location"], series.get("quality", 1))] = series
+
+    def reset_stats(self) -> None:
+        self.stats = {"requests": 0, "throttled": 0, "rows": 0, "bytes": 0}
+
+    def _number(self, *parts: Any) -> int:
+        """Deterministic pseudo-random number for a key"""
+        digest = hashlib.md5("|".join(str(p) for p in (self.seed, *parts)).encode()).hexdigest()
+        return int(digest[:8], 16)
+
+    def _synthetic_price(self, item_id: str, city: str, quality: int, now: str) -> Dict[str, Any]:
+        base = 1000 + self._number(item_id, quality) % 50000
+        # Each city trades within +-20% of the base, so some routes are profitable
+        level = base * (80 + self._number(item_id, city, quality) % 41) // 100
+        spread = max(1, level // 20)
+        sell_min = level + spread
+        buy_max = level - spread
+        return {
+            "item_id": item_id,
+            "city": city,
+            "quality": quality,
+            "sell_price_min": sell_min,
+            "sell_price_min_date": now,
+            "sell_price_max": sell_min + spread,
+            "sell_price_max_date": now,
+            "buy_price_min": buy_max // 2,
+            "buy_price_min_date": now,
+            "buy_price_max": buy_max,
+            "buy_price_max_date": now
+        }
+
+    def _synthetic_history(self, item_id: str, city: str, quality: int, timescale: int) -> Dict[str, Any]:
+        hours = int((datetime.utcnow() - EPOCH).total_seconds() // 3600)
+        last_bucket = EPOCH + timedelta(hours=hours - hours % timescale)
+        base = 1000 + self._number(item_id, quality) % 50000
+        data = []
+        for n in range(self.history_points, 0, -1):
+            bucket = last_bucket - timedelta(hours=n * timescale)
+            wiggle = self._number(item_id, city, quality, bucket.isoformat()) % 200
+            data.append({
+                "item_count": 1 + wiggle,
+                "avg_price": base + wiggle,
+                "timestamp": bucket.isoformat()
+            })
+        return {"location": city, "item_id": item_id, "quality": quality, "data": data}
+
+    def _pad(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.pad_bytes:
+            return {**row, "padding": "x" * self.pad_bytes}
+        return row
+
+    def prices_payload(self, items: List[str], cities: List[str], qualities: List[int]) -> List[Dict[str, Any]]:
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+        return [
+            self._pad(self.prices.get((item_id, city, quality)) or self._synthetic_price(item_id, city, quality, now))
+            for item_id in items for city in cities for quality in qualities
+        ]
+
+    def history_payload(self, items: List[str], cities: List[str], qualities: List[int], timescale: int) -> List[Dict[str, Any]]:
+        return [
+            self._pad(self.history.get((item_id, city, quality)) or self._synthetic_history(item_id, city, quality, timescale))
+            for item_id in items for city in cities for quality in qualities
+        ]
+
+    def _throttled(self) -> bool:
+        if self.throttle_rate and self.random.random() < self.throttle_rate:
+            return True
+        if self.rate_limit_per_min:
+            now = time.monotonic()
+            self.window = [t for t in self.window if now - t < 60]
+            if len(self.window) >= self.rate_limit_per_min:
+                return True
+            self.window.append(now)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.stats["requests"] += 1
+
+        delay = self.latency_ms + self.random.uniform(0, self.latency_jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if self._throttled():
+            self.stats["throttled"] += 1
+            headers = [(b"retry-after", str(self.retry_after).encode())] if self.retry_after is not None else []
+            await self._respond(send, 429, {"error": "Too Many Requests"}, headers)
+            return
+
+        path = unquote(scope["path"])
+        query = parse_qs(scope.get("query_string", b"").decode())
+        cities = query["locations"][0].split(",") if "locations" in query else DEFAULT_CITIES
+        qualities = [int(q) for q in query["qualities"][0].split(",")] if "qualities" in query else [1]
+
+        if path.startswith(PRICES_PREFIX) and path.endswith(".json"):
+            items = path[len(PRICES_PREFIX):-len(".json")].split(",")
+            payload = self.prices_payload(items, cities, qualities)
+        elif path.startswith(HISTORY_PREFIX) and path.endswith(".json"):
+            items = path[len(HISTORY_PREFIX):-len(".json")].split(",")
+            timescale = int(query.get("time-scale", ["24"])[0])
+            payload = self.history_payload(items, cities, qualities, timescale)
+        else:
+            await self._respond(send, 404, {"error": "Not Found"})
+            return
+
+        self.stats["rows"] += len(payload)
+        await self._respond(send, 200, payload)
+
+    async def _respond(self, send, status: int, payload: Any, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        body = json.dumps(payload).encode()
+        self.stats["bytes"] += len(body)
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *(headers or [])
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+async def record_fixtures(base_url: str, items: List[str], cities: List[str], qualities: List[int], path: str) -> None:
+    """Record real AODP responses into a fixtures file for the emulator"""
+    import httpx
+
+    params = {"locations": ",".join(cities), "qualities": ",".join(map(str, qualities))}
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        prices = await client.get(f"{base_url}{PRICES_PREFIX}{','.join(items)}.json", params=params)
+        history = await client.get(f"{base_url}{HISTORY_PREFIX}{','.join(items)}.json", params={**params, "time-scale": 24})
+    prices.raise_for_status()
+    history.raise_for_status()
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"prices": prices.json(), "history": history.json()}, f, indent=2)
+    print(f"Recorded {len(prices.json())} price rows and {len(history.json())} history series to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Local AODP emulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fixtures", help="Fixtures JSON file (recorded rows)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-per-min", type=int)
+    parser.add_argument("--history-points", type=int, default=30)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", metavar="BASE_URL", help="Record fixtures from a real AODP host instead of serving")
+    parser.add_argument("--items", default="T4_BAG,T5_BAG,T6_BAG")
+    parser.add_argument("--cities", default=",".join(DEFAULT_CITIES))
+    parser.add_argument("--qualities", default="1")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record_fixtures(
+            args.record,
+            args.items.split(","),
+            args.cities.split(","),
+            [int(q) for q in args.qualities.split(",")],
+            args.fixtures or "aodp_fixtures.json"
+        ))
+        return
+
+    import uvicorn
+    uvicorn.run(
+        AODPEmulator(
+            fixtures_path=args.fixtures,
+            latency_ms=args.latency_ms,
+            latency_jitter_ms=args.latency_jitter_ms,
+            throttle_rate=args.throttle_rate,
+            rate_limit_per_min=args.rate_limit_per_min,
+            history_points=args.history_points,
+            pad_bytes=args.pad_bytes,
+            seed=args.seed
+        ),
+        host=args.host,
+        port=args.port
+    )
+
+if __name__ == "__main__":
+    main()
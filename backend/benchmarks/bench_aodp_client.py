@@ -0,0 +1,98 @@
+"""
+End-to-end benchmark for AODPClient against the local AODP emulator
+Runs fully in-process (httpx.ASGITransport), so results are reproducible
+without network access
+Run with: python benchmarks/bench_aodp_client.py [--latency-ms 50] [--throttle-rate 0.05]
+"""
+
+import argparse
+import asyncio
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.aodp_emulator import AODPEmulator, DEFAULT_CITIES
+from items_database import get_all_items_flat
+from services.aodp_client import AODPClient
+from services.cache import CacheManager
+
+def make_client(emulator: AODPEmulator, **kwargs) -> AODPClient:
+    return AODPClient(
+        "http://aodp.local",
+        CacheManager(),
+        rate_limit_per_min=kwargs.pop("rate_limit_per_min", 600000),
+        region_urls={"west": "http://aodp.local"},
+        transport=httpx.ASGITransport(app=emulator),
+        **kwargs
+    )
+
+async def scenario_cold_and_warm(emulator: AODPEmulator, items, cities, qualities):
+    """Cold fetch of a large item list (chunked), then the same request from cache"""
+    client = make_client(emulator)
+    await client.initialize()
+    results = []
+    for label in ("cold prices", "warm prices"):
+        emulator.reset_stats()
+        start = time.perf_counter()
+        rows = await client.get_prices("west", items, cities, qualities)
+        elapsed = time.perf_counter() - start
+        results.append((label, elapsed, emulator.stats["requests"], len(rows)))
+    await client.close()
+    return results
+
+async def scenario_coalescing(emulator: AODPEmulator, callers: int):
+    """Concurrent identical history requests share one upstream call"""
+    client = make_client(emulator)
+    await client.initialize()
+    emulator.reset_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client.get_history("west", "T4_BAG", "Martlock") for _ in range(callers)
+    ))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return [(f"{callers} same history", elapsed, emulator.stats["requests"], callers)]
+
+async def scenario_history_batch(emulator: AODPEmulator, items, cities):
+    """Batched history for many items/cities"""
+    client = make_client(emulator)
+    await client.initialize()
+    emulator.reset_stats()
+    start = time.perf_counter()
+    result = await client.fetch_history_batch("west", items, cities, 24)
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return [("history batch", elapsed, emulator.stats["requests"], len(result["data"]))]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    args = parser.parse_args()
+
+    emulator = AODPEmulator(
+        latency_ms=args.latency_ms,
+        throttle_rate=args.throttle_rate,
+        retry_after=0,
+        pad_bytes=args.pad_bytes
+    )
+    items = list(get_all_items_flat())[:args.items]
+    cities = DEFAULT_CITIES
+
+    results = []
+    results += await scenario_cold_and_warm(emulator, items, cities, [1])
+    results += await scenario_coalescing(emulator, 50)
+    results += await scenario_history_batch(emulator, items[:100], cities[:2])
+
+    print(f"items={len(items)} latency={args.latency_ms}ms throttle={args.throttle_rate}")
+    print(f"{'scenario':<20} {'seconds':>9} {'upstream':>9} {'rows':>8}")
+    for label, elapsed, requests, rows in results:
+        print(f"{label:<20} {elapsed:>9.3f} {requests:>9} {rows:>8}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""
+Benchmark for cache value codecs
+Compares stored size and encode/decode time of a 30-point history series
+and a single price row across codec specs
+Run with: python benchmarks/bench_codec.py
+"""
+
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.aodp_emulator import AODPEmulator
+from services import fastjson
+from services.codec import decode, parse_codecs
+
+SPECS = ["json", "msgpack", "json+columnar+zlib", "msgpack+columnar+zstd", "msgpack+columnar+lz4"]
+ROUNDS = 2000
+
+def per_call_us(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+def main():
+    emulator = AODPEmulator()
+    history = emulator.history_payload(["T4_BAG"], ["Martlock"], [1], 24)[0]["data"]
+    price_row = emulator.prices_payload(["T4_BAG"], ["Martlock"], [1])[0]
+
+    print(f"{'spec':<24} {'value':<8} {'bytes':>7} {'ratio':>6} {'enc us':>8} {'dec us':>8}")
+    for label, value in (("history", history), ("price", price_row)):
+        baseline = len(fastjson.dumps(value))
+        for spec in SPECS:
+            codec = parse_codecs(f"ns={spec}")["ns"]
+            data = codec.encode(value)
+            print(
+                f"{repr(codec):<24} {label:<8} {len(data):>7} {baseline / len(data):>6.1f} "
+                f"{per_call_us(lambda: codec.encode(value)):>8.1f} {per_call_us(lambda: decode(data)):>8.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark for the fast JSON layer
+Compares FastAPI's default response path (pydantic validation + jsonable_encoder
++ stdlib json) with FastJSONResponse on a 1,000-item opportunity response, and
+stdlib vs fast decoding of the matching AODP prices payload
+Run with: python benchmarks/bench_json.py
+"""
+
+import json
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.aodp_emulator import AODPEmulator, DEFAULT_CITIES
+from schemas import OpportunitiesResponse
+from services import fastjson
+from services.fastjson import FastJSONResponse
+from services.pricing import PricingCalculator
+
+ITEMS = 1000
+ROUNDS = 5
+
+def best_of(fn) -> float:
+    """Best wall time of ROUNDS runs, in milliseconds"""
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main():
+    emulator = AODPEmulator()
+    items = [f"T{4 + n % 5}_ITEM_{n}" for n in range(ITEMS)]
+    prices = emulator.prices_payload(items, DEFAULT_CITIES, [1])
+    raw_prices = json.dumps(prices).encode()
+
+    opportunities = PricingCalculator().calculate_opportunities(prices, premium=True, setup_fee=0.025)
+    payload = {
+        "region": "west",
+        "opportunities": opportunities,
+        "timestamp": "2024-01-01T00:00:00Z",
+        "parameters": {"premium": True, "setup_fee": 0.025, "transport_cost": 0, "max_age_hours": 24},
+        "degraded": False
+    }
+
+    def default_response():
+        JSONResponse(jsonable_encoder(OpportunitiesResponse(**payload)))
+
+    def fast_response():
+        FastJSONResponse(payload)
+
+    results = [
+        ("decode AODP prices (json)", best_of(lambda: json.loads(raw_prices))),
+        (f"decode AODP prices ({fastjson.BACKEND})", best_of(lambda: fastjson.loads(raw_prices))),
+        ("opportunities default path", best_of(default_response)),
+        (f"opportunities FastJSONResponse ({fastjson.BACKEND})", best_of(fast_response)),
+    ]
+
+    # Same response through the stdlib fallback of the fast layer
+    backend = fastjson.orjson
+    fastjson.orjson = None
+    results.append(("opportunities FastJSONResponse (json)", best_of(fast_response)))
+    fastjson.orjson = backend
+
+    print(f"{len(items)} items, {len(prices)} price rows ({len(raw_prices) / 1e6:.1f} MB), "
+          f"{len(opportunities)} opportunities")
+    print(f"{'case':<45} {'ms':>8}")
+    for label, ms in results:
+        print(f"{label:<45} {ms:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for PricingCalculator.calculate_opportunities
+Compares the loop with the NumPy engine on a full-catalog scan, returning
+every route and only the top 100
+Run with: python benchmarks/bench_opportunities.py
+"""
+
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.aodp_emulator import AODPEmulator, DEFAULT_CITIES
+from services import pricing
+from services.pricing import PricingCalculator
+
+ITEMS = 5000
+QUALITIES = [1, 2, 3]
+ROUNDS = 5
+
+def best_of(fn) -> float:
+    """Best wall time of ROUNDS runs, in milliseconds"""
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main():
+    if pricing.np is None:
+        print("numpy is not installed; only the loop can be measured")
+    calculator = PricingCalculator()
+    items = [f"T{4 + n % 5}_ITEM_{n}" for n in range(ITEMS)]
+    prices = AODPEmulator().prices_payload(items, DEFAULT_CITIES, QUALITIES)
+    kwargs = {"premium": True, "setup_fee": 0.025}
+
+    results = [
+        ("loop, all routes", best_of(lambda: calculator._calculate_opportunities_loop(prices, **kwargs))),
+        ("loop, top 100", best_of(lambda: calculator._calculate_opportunities_loop(prices, top_k=100, **kwargs))),
+    ]
+    if pricing.np is not None:
+        results += [
+            ("numpy, all routes", best_of(lambda: calculator._calculate_opportunities_vectorized(prices, **kwargs))),
+            ("numpy, top 100", best_of(lambda: calculator._calculate_opportunities_vectorized(prices, top_k=100, **kwargs))),
+        ]
+
+    print(f"{len(prices)} price rows ({len(items)} items x {len(DEFAULT_CITIES)} cities x {len(QUALITIES)} qualities)")
+    print(f"{'case':<25} {'ms':>8}")
+    for label, ms in results:
+        print(f"{label:<25} {ms:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Micro-benchmark for RateLimiter.acquire
+Measures the cost of taking a reservation while N callers are already waiting
+Run with: python benchmarks/bench_rate_limiter.py
+"""
+
+import asyncio
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.aodp_client import RateLimiter
+
+SAMPLES = 10000
+
+async def measure(waiters: int) -> float:
+    """Average microseconds per acquire with `waiters` callers queued"""
+    # Slow refill so every waiter stays queued for the whole measurement
+    limiter = RateLimiter(1, 3600, burst=1)
+    tasks = [asyncio.create_task(limiter.acquire()) for _ in range(waiters)]
+    await asyncio.sleep(0)  # Let the waiters take their reservations
+
+    start = time.perf_counter()
+    for _ in range(SAMPLES):
+        coro = limiter.acquire()
+        # Run acquire up to its first sleep, which is where the caller parks
+        try:
+            coro.send(None)
+        except StopIteration:
+            pass
+        coro.close()
+    elapsed = time.perf_counter() - start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return elapsed / SAMPLES * 1e6
+
+async def main():
+    print(f"{'waiters':>8} {'us/acquire':>12}")
+    for waiters in (0, 10, 100, 1000):
+        cost = await measure(waiters)
+        print(f"{waiters:>8} {cost:>12.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -53,6 +53,29 @@ class MarketTick(Base):
         UniqueConstraint('city', 'item_id', 'quality', 'timestamp', 'source', name='uq_market_tick'),
     )
 
+class MarketHistory(Base):
+    """Completed market history bucket fetched from AODP"""
+    __tablename__ = "market_history"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    region = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    item_id = Column(String, nullable=False)
+    quality = Column(Integer, default=0)
+    timescale = Column(Integer, nullable=False)  # Hours per bucket (1, 6, 24)
+    
+    # Bucket values
+    timestamp = Column(DateTime, nullable=False)  # Bucket start (UTC)
+    item_count = Column(Integer, default=0)
+    avg_price = Column(Float, nullable=True)
+    
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('idx_history_lookup', 'region', 'item_id', 'city', 'timescale'),
+        UniqueConstraint('region', 'city', 'item_id', 'quality', 'timescale', 'timestamp', name='uq_market_history'),
+    )
+
 class IngestStats(Base):
     """Statistics for monitoring ingestion"""
     __tablename__ = "ingest_stats"
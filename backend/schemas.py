@@ -13,6 +13,7 @@ class PricesRequest(BaseModel):
     cities: List[str] = Field(..., description="List of city names")
     qualities: List[int] = Field(default=[0], description="Item qualities (0-5)")
     max_age_hours: int = Field(default=12, description="Maximum data age in hours")
+    quality_mode: str = Field(default="exact", description="exact or at_least (best offer at quality >= Q)")
     
     @validator('region')
     def validate_region(cls, v):
@@ -26,6 +27,12 @@ class PricesRequest(BaseModel):
             if q < 0 or q > 5:
                 raise ValueError('Quality must be between 0 and 5')
         return v
+    
+    @validator('quality_mode')
+    def validate_quality_mode(cls, v):
+        if v not in ['exact', 'at_least']:
+            raise ValueError('Quality mode must be exact or at_least')
+        return v
 
 class OpportunitiesRequest(BaseModel):
     region: str = Field(default="west")
@@ -37,12 +44,19 @@ class OpportunitiesRequest(BaseModel):
     max_age_hours: int = Field(default=12)
     transport_cost: float = Field(default=0, description="Transport cost per item")
     prefer_caerleon: bool = Field(default=False, description="Prioritize Caerleon routes")
+    quality_mode: str = Field(default="exact", description="exact or at_least (best offer at quality >= Q)")
     
     @validator('setup_fee')
     def validate_setup_fee(cls, v):
         if v < 0 or v > 0.1:
             raise ValueError('Setup fee must be between 0 and 10%')
         return v
+    
+    @validator('quality_mode')
+    def validate_quality_mode(cls, v):
+        if v not in ['exact', 'at_least']:
+            raise ValueError('Quality mode must be exact or at_least')
+        return v
 
 class HistoryRequest(BaseModel):
     region: str = Field(default="west")
@@ -50,11 +64,65 @@ class HistoryRequest(BaseModel):
     city: str = Field(..., description="City name")
     timescale: int = Field(default=24, description="Time scale (1=hourly, 24=daily)")
 
+class HistoryBatchRequest(BaseModel):
+    region: str = Field(default="west")
+    items: List[str] = Field(..., description="List of item IDs")
+    cities: List[str] = Field(..., description="List of city names")
+    timescales: List[int] = Field(default=[24], description="Time scales in hours (1, 6, 24)")
+    
+    @validator('timescales')
+    def validate_timescales(cls, v):
+        for t in v:
+            if t not in [1, 6, 24]:
+                raise ValueError('Timescale must be 1, 6 or 24')
+        return v
+
+class CrossRegionPricesRequest(BaseModel):
+    regions: List[str] = Field(default=["west", "europe", "east"], description="Server regions to compare")
+    items: List[str] = Field(..., description="List of item IDs")
+    cities: List[str] = Field(..., description="List of city names")
+    qualities: List[int] = Field(default=[0], description="Item qualities (0-5)")
+    max_age_hours: int = Field(default=12, description="Maximum data age in hours")
+    
+    @validator('regions')
+    def validate_regions(cls, v):
+        if not v:
+            raise ValueError('At least one region is required')
+        for region in v:
+            if region not in ['west', 'europe', 'east']:
+                raise ValueError('Region must be west, europe, or east')
+        return list(dict.fromkeys(v))
+    
+    @validator('qualities')
+    def validate_qualities(cls, v):
+        for q in v:
+            if q < 0 or q > 5:
+                raise ValueError('Quality must be between 0 and 5')
+        return v
+
+class CacheInvalidateRequest(BaseModel):
+    region: str = Field(default="west")
+    items: List[str] = Field(default=[], description="Drop cached data for these item IDs")
+    cities: List[str] = Field(default=[], description="Drop cached data for these cities")
+    
+    @validator('region')
+    def validate_region(cls, v):
+        if v not in ['west', 'europe', 'east']:
+            raise ValueError('Region must be west, europe, or east')
+        return v
+    
+    @validator('cities', always=True)
+    def validate_targets(cls, v, values):
+        if not v and not values.get('items'):
+            raise ValueError('At least one item or city is required')
+        return v
+
 # Response schemas
 class PriceInfo(BaseModel):
     item_id: str
     city: str
     quality: int
+    requested_quality: Optional[int] = None  # Minimum quality this row answers (at_least mode)
     sell_price_min: Optional[float]
     sell_price_max: Optional[float]
     buy_price_min: Optional[float]
@@ -69,6 +137,8 @@ class PricesResponse(BaseModel):
     region: str
     prices: List[PriceInfo]
     timestamp: str
+    errors: List[Dict[str, Any]] = []  # Failed AODP chunks (items + error)
+    degraded: bool = False  # True when served from local data because AODP is unavailable
 
 class OpportunityInfo(BaseModel):
     item_id: str
@@ -93,6 +163,7 @@ class OpportunitiesResponse(BaseModel):
     opportunities: List[Dict[str, Any]]
     timestamp: str
     parameters: Dict[str, Any]
+    degraded: bool = False  # True when served from local data because AODP is unavailable
 
 class HistoryDataPoint(BaseModel):
     timestamp: str
@@ -107,6 +178,18 @@ class HistoryResponse(BaseModel):
     city: str
     timescale: int
     data: List[Dict[str, Any]]
+    degraded: bool = False  # True when served from local data because AODP is unavailable
+
+class HistoryBatchResponse(BaseModel):
+    region: str
+    series: List[Dict[str, Any]]
+    timestamp: str
+    errors: List[Dict[str, Any]] = []
+
+class CrossRegionPricesResponse(BaseModel):
+    regions: Dict[str, Dict[str, Any]]  # Per-region row count, ages and errors
+    prices: List[Dict[str, Any]]  # One row per item/city/quality with per-region prices
+    timestamp: str
 
 class MetaResponse(BaseModel):
     cities: List[str]
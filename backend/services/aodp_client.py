@@ -5,106 +5,1006 @@ Handles all communication with the AODP API with rate limiting and caching
 
 import httpx
 import asyncio
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import heapq
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import json
 import hashlib
-from urllib.parse import urljoin
+import importlib.util
+import os
+from urllib.parse import urljoin, urlencode, quote
+
+from services import fastjson
+from services.cache import city_tag, item_tag
+
+# AODP rejects request URLs beyond roughly 4k characters
+MAX_URL_LENGTH = 4096
+
+# HTTP transport defaults; every AODP host gets its own connection pool
+HTTP_SETTINGS = {
+    "http2": False,  # Needs the optional h2 package
+    "max_connections": 10,  # Per host
+    "max_keepalive_connections": 10,  # Per host
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+    "write_timeout": 10.0,
+    "pool_timeout": 10.0,
+    "accept_encoding": "gzip, deflate",
+    "warmup_connections": 1  # Connections pre-opened per host by warm_up()
+}
+
+# Public AODP hosts per region
+REGION_URLS = {
+    "west": "https://west.albion-online-data.com",
+    "europe": "https://europe.albion-online-data.com",
+    "east": "https://east.albion-online-data.com"
+}
 
 class RateLimiter:
-    """Simple rate limiter implementation"""
-    def __init__(self, max_requests: int, time_window: int = 60):
+    """
+    Token bucket rate limiter
+    
+    Each acquire reserves a token in O(1) and then sleeps outside of any
+    critical section. The bucket may go negative, which turns pending
+    reservations into a FIFO queue: every caller waits exactly until its
+    own token would have been refilled.
+    """
+    def __init__(self, max_requests: int, time_window: int = 60, burst: Optional[int] = None):
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = []
-        self.lock = asyncio.Lock()
+        self.rate = max_requests / time_window  # Tokens per second
+        self.capacity = burst or max_requests
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it"""
+        now = time.monotonic()
+        # updated_at can lie in the future while a Retry-After pause is active
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+        
+        self.tokens -= 1
+        ready_at = self.updated_at + max(0.0, -self.tokens) / self.rate
+        return max(0.0, ready_at - now)
     
     async def acquire(self):
-        async with self.lock:
-            now = datetime.now()
-            # Remove old requests outside the time window
-            self.requests = [
-                req_time for req_time in self.requests
-                if now - req_time < timedelta(seconds=self.time_window)
-            ]
-            
-            # Check if we can make a request
-            if len(self.requests) >= self.max_requests:
-                # Calculate wait time
-                oldest_request = self.requests[0]
-                wait_time = (oldest_request + timedelta(seconds=self.time_window) - now).total_seconds()
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
-                    return await self.acquire()
-            
-            # Add current request
-            self.requests.append(now)
+        wait_time = self._reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        
+        # Honor pauses requested by the server after we reserved our slot
+        while True:
+            remaining = self.blocked_until - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+    
+    def set_rate(self, max_requests: float):
+        """Change the sustained rate, keeping tokens earned at the old rate"""
+        now = time.monotonic()
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+        self.max_requests = max_requests
+        self.rate = max_requests / self.time_window
+    
+    def available(self) -> float:
+        """Tokens currently available without waiting (negative if callers are queued)"""
+        now = time.monotonic()
+        if now <= self.updated_at:
+            return self.tokens
+        return min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+    
+    def defer(self, seconds: float):
+        """Pause all requests for the given time (e.g. from a Retry-After header)"""
+        until = time.monotonic() + seconds
+        if until <= self.blocked_until:
+            return
+        
+        self.blocked_until = until
+        # Drop any saved-up burst and start refilling only after the pause
+        now = time.monotonic()
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated_at = max(self.updated_at, until)
+
+class AdaptiveRateController:
+    """
+    AIMD controller that learns AODP's actual request budget
+    
+    Every successful response adds increase_per_min / current rate, so a
+    minute of full-rate success raises the limit by about increase_per_min.
+    A 429 or 5xx multiplies it by decrease_factor (at most once per
+    cooldown, since one overload usually fails several requests at once).
+    The learned rate is kept in a small JSON file so restarts resume from it.
+    """
+    def __init__(
+        self,
+        rate_limiter: RateLimiter,
+        floor_per_min: float,
+        ceiling_per_min: float,
+        increase_per_min: float = 1.0,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 5.0,
+        state_path: Optional[str] = None,
+        save_interval_seconds: float = 30.0
+    ):
+        self.rate_limiter = rate_limiter
+        self.floor_per_min = floor_per_min
+        self.ceiling_per_min = ceiling_per_min
+        self.increase_per_min = increase_per_min
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.state_path = state_path
+        self.save_interval_seconds = save_interval_seconds
+        self.last_decrease = 0.0
+        self.last_save = 0.0
+        self.stats = {"increases": 0, "decreases": 0}
+        
+        self.rate_per_min = self._clamp(self._load() or rate_limiter.max_requests)
+        self.rate_limiter.set_rate(self.rate_per_min)
+    
+    def _clamp(self, rate: float) -> float:
+        return min(self.ceiling_per_min, max(self.floor_per_min, rate))
+    
+    def _load(self) -> Optional[float]:
+        """Load the learned rate from the state file"""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path) as f:
+                return float(json.load(f)["rate_per_min"])
+        except Exception as e:
+            print(f"Could not load adaptive rate state: {e}")
+            return None
+    
+    def _save(self, force: bool = False):
+        """Persist the learned rate (throttled unless forced)"""
+        now = time.monotonic()
+        if not self.state_path or (not force and now - self.last_save < self.save_interval_seconds):
+            return
+        self.last_save = now
+        try:
+            with open(self.state_path, "w") as f:
+                json.dump({
+                    "rate_per_min": round(self.rate_per_min, 2),
+                    "updated_at": datetime.now(timezone.utc).isoformat()
+                }, f)
+        except Exception as e:
+            print(f"Could not save adaptive rate state: {e}")
+    
+    def on_success(self):
+        """Additive increase"""
+        if self.rate_per_min >= self.ceiling_per_min:
+            return
+        self.rate_per_min = self._clamp(self.rate_per_min + self.increase_per_min / self.rate_per_min)
+        self.rate_limiter.set_rate(self.rate_per_min)
+        self.stats["increases"] += 1
+        self._save()
+    
+    def on_throttle(self):
+        """Multiplicative decrease"""
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown_seconds:
+            return
+        self.last_decrease = now
+        self.rate_per_min = self._clamp(self.rate_per_min * self.decrease_factor)
+        self.rate_limiter.set_rate(self.rate_per_min)
+        self.stats["decreases"] += 1
+        self._save(force=True)
+    
+    def save(self):
+        """Persist the learned rate now (e.g. on shutdown)"""
+        self._save(force=True)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Current learned rate and bounds"""
+        return {
+            "rate_per_min": round(self.rate_per_min, 2),
+            "floor_per_min": self.floor_per_min,
+            "ceiling_per_min": self.ceiling_per_min,
+            **self.stats
+        }
+
+# Weighted fair queuing shares of the rate limit per traffic class
+PRIORITY_WEIGHTS = {
+    "interactive": 8,
+    "breeding": 4,
+    "background": 2,
+    "backfill": 1
+}
+
+class PriorityLimiter:
+    """
+    Weighted fair queuing of AODP requests on top of a shared RateLimiter
+    
+    Callers queue in their traffic class and get a virtual finish tag of
+    start + 1/weight. A single dispatcher takes tokens from the rate limiter
+    one at a time and hands each to the queued caller with the lowest tag,
+    so interactive requests overtake background work while every class
+    still gets its share of the budget.
+    """
+    def __init__(self, rate_limiter: RateLimiter, weights: Optional[Dict[str, float]] = None):
+        self.rate_limiter = rate_limiter
+        self.weights = weights or PRIORITY_WEIGHTS
+        self.queue: List[Tuple[float, int, str, asyncio.Future]] = []
+        self.sequence = 0
+        self.virtual_time = 0.0
+        self.last_finish = {priority: 0.0 for priority in self.weights}
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.metrics = {
+            priority: {"queue_depth": 0, "dispatched": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in self.weights
+        }
+    
+    async def acquire(self, priority: str = "interactive"):
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority class: {priority}")
+        
+        start = max(self.virtual_time, self.last_finish[priority])
+        finish = start + 1.0 / self.weights[priority]
+        self.last_finish[priority] = finish
+        
+        future = asyncio.get_running_loop().create_future()
+        self.sequence += 1
+        heapq.heappush(self.queue, (finish, self.sequence, priority, future))
+        self.metrics[priority]["queue_depth"] += 1
+        
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.ensure_future(self._dispatch())
+        
+        enqueued_at = time.monotonic()
+        try:
+            await future
+        finally:
+            if not future.done():
+                future.cancel()
+        
+        wait = time.monotonic() - enqueued_at
+        metrics = self.metrics[priority]
+        metrics["total_wait"] += wait
+        metrics["max_wait"] = max(metrics["max_wait"], wait)
+    
+    async def _dispatch(self):
+        """Grant rate limiter tokens to queued callers in finish-tag order"""
+        while self.queue:
+            await self.rate_limiter.acquire()
+            while self.queue:
+                finish, _, priority, future = heapq.heappop(self.queue)
+                self.metrics[priority]["queue_depth"] -= 1
+                if not future.done():
+                    self.virtual_time = finish
+                    self.metrics[priority]["dispatched"] += 1
+                    future.set_result(None)
+                    break
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-class queue depth and wait times"""
+        return {
+            priority: {
+                "queue_depth": metrics["queue_depth"],
+                "dispatched": metrics["dispatched"],
+                "avg_wait_seconds": round(metrics["total_wait"] / metrics["dispatched"], 4) if metrics["dispatched"] else 0.0,
+                "max_wait_seconds": round(metrics["max_wait"], 4)
+            }
+            for priority, metrics in self.metrics.items()
+        }
+    
+    async def close(self):
+        """Stop the dispatcher"""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
+
+class AODPUnavailableError(Exception):
+    """AODP cannot be reached right now (circuit open or offline mode)"""
+    pass
+
+class CircuitBreaker:
+    """
+    Circuit breaker for AODP calls
+    
+    After failure_threshold consecutive failures (timeouts, connection
+    errors, 5xx) the circuit opens and calls fail fast. Once reset_timeout
+    has passed a single probe is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.probe_started = 0.0
+    
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_in_flight = False
+        # A probe that never reported back (e.g. cancelled) is replaced after reset_timeout
+        if self.state == "half_open" and (
+            not self.probe_in_flight or time.monotonic() - self.probe_started >= self.reset_timeout
+        ):
+            self.probe_in_flight = True
+            self.probe_started = time.monotonic()
+            return True
+        return False
+    
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+class HostChannel:
+    """
+    Request budget of one AODP host
+    
+    Each region is served by its own host with its own rate limit, so every
+    host gets a separate token bucket, priority lanes, adaptive rate and
+    circuit breaker. Regions that share a host (e.g. all pointed at the
+    local emulator) share one channel.
+    """
+    def __init__(
+        self,
+        host: str,
+        rate_limit_per_min: int,
+        rate_limit_burst: Optional[int],
+        priority_weights: Optional[Dict[str, float]],
+        adaptive_rate: Optional[Dict[str, Any]],
+        circuit_failure_threshold: int,
+        circuit_reset_seconds: float
+    ):
+        self.host = host
+        self.http_version: Optional[str] = None  # Of the last response
+        self.rate_limiter = RateLimiter(rate_limit_per_min, 60, burst=rate_limit_burst)
+        self.lanes = PriorityLimiter(self.rate_limiter, priority_weights)
+        self.adaptive = AdaptiveRateController(self.rate_limiter, **adaptive_rate) if adaptive_rate else None
+        self.breaker = CircuitBreaker(circuit_failure_threshold, circuit_reset_seconds)
+        self.client: Optional[httpx.AsyncClient] = None
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "http_version": self.http_version,
+            "rate_per_min": round(self.rate_limiter.max_requests, 2),
+            "available_tokens": round(self.rate_limiter.available(), 2),
+            "queue_depth": sum(m["queue_depth"] for m in self.lanes.get_metrics().values()),
+            "circuit": self.breaker.state,
+            "adaptive_rate": self.adaptive.get_metrics() if self.adaptive else None
+        }
 
 class AODPClient:
     """Client for Albion Online Data Project API"""
     
-    def __init__(self, base_url: str, cache_manager, rate_limit_per_min: int = 120):
+    def __init__(
+        self,
+        base_url: str,
+        cache_manager,
+        rate_limit_per_min: int = 120,
+        epochs=None,
+        rate_limit_burst: Optional[int] = None,
+        max_concurrency: int = 4,
+        max_url_length: int = MAX_URL_LENGTH,
+        priority_weights: Optional[Dict[str, float]] = None,
+        adaptive_rate: Optional[Dict[str, Any]] = None,
+        offline: bool = False,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_seconds: float = 30.0,
+        region_urls: Optional[Dict[str, str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        http_settings: Optional[Dict[str, Any]] = None
+    ):
         self.base_url = base_url
         self.cache = cache_manager
-        self.rate_limiter = RateLimiter(rate_limit_per_min, 60)
-        self.client = None
-        self.region_urls = {
-            "west": "https://west.albion-online-data.com",
-            "europe": "https://europe.albion-online-data.com",
-            "east": "https://east.albion-online-data.com"
-        }
+        self.epochs = epochs
+        self.rate_limit_per_min = rate_limit_per_min
+        self.rate_limit_burst = rate_limit_burst
+        self.priority_weights = priority_weights
+        # Optional AIMD tuning, e.g. {"floor_per_min": 10, "ceiling_per_min": 300, "state_path": "..."}
+        self.adaptive_rate = adaptive_rate
+        self.circuit_failure_threshold = circuit_failure_threshold
+        self.circuit_reset_seconds = circuit_reset_seconds
+        self.offline = offline
+        self.max_concurrency = max_concurrency
+        self.max_url_length = max_url_length
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing = set()  # Cache keys with a background refresh scheduled
+        self._background_tasks = set()
+        self.metrics = {"requests": 0, "coalesced": 0, "short_circuited": 0}
+        self.http_settings = {**HTTP_SETTINGS, **(http_settings or {})}
+        if self.http_settings["http2"] and importlib.util.find_spec("h2") is None:
+            print("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+            self.http_settings["http2"] = False
+        # Overrides point regions elsewhere, e.g. at the local emulator
+        self.region_urls = {**REGION_URLS, **(region_urls or {})}
+        self.transport = transport
+        
+        # One request budget per host; the west host's is the default one
+        self.hosts: Dict[str, HostChannel] = {}
+        default = self._channel(self.region_urls["west"])
+        self.rate_limiter = default.rate_limiter
+        self.lanes = default.lanes
+        self.adaptive = default.adaptive
+        self.breaker = default.breaker
+    
+    def _channel(self, url: str) -> HostChannel:
+        """Get (or create) the request budget for the host serving `url`"""
+        host = httpx.URL(url).host
+        channel = self.hosts.get(host)
+        if channel is None:
+            adaptive_rate = self.adaptive_rate
+            if adaptive_rate and adaptive_rate.get("state_path") and self.hosts:
+                # Learned rates are per host; the default host keeps the configured file
+                root, ext = os.path.splitext(adaptive_rate["state_path"])
+                adaptive_rate = {**adaptive_rate, "state_path": f"{root}.{host}{ext}"}
+            channel = HostChannel(
+                host,
+                self.rate_limit_per_min,
+                self.rate_limit_burst,
+                self.priority_weights,
+                adaptive_rate,
+                self.circuit_failure_threshold,
+                self.circuit_reset_seconds
+            )
+            self.hosts[host] = channel
+        return channel
+    
+    def _http_client(self, channel: HostChannel) -> httpx.AsyncClient:
+        """Get (or create) the connection pool of a host"""
+        if channel.client is None:
+            settings = self.http_settings
+            channel.client = httpx.AsyncClient(
+                transport=self.transport,
+                http2=settings["http2"],
+                headers={"Accept-Encoding": settings["accept_encoding"]},
+                timeout=httpx.Timeout(
+                    connect=settings["connect_timeout"],
+                    read=settings["read_timeout"],
+                    write=settings["write_timeout"],
+                    pool=settings["pool_timeout"]
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_keepalive_connections"],
+                    keepalive_expiry=settings["keepalive_expiry"]
+                )
+            )
+        return channel.client
     
     async def initialize(self):
-        """Initialize the HTTP client"""
-        self.client = httpx.AsyncClient(
-            timeout=30.0,
-            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
-        )
+        """Initialize one HTTP connection pool per region host"""
+        for url in self.region_urls.values():
+            self._http_client(self._channel(url))
+    
+    async def warm_up(self) -> Dict[str, int]:
+        """
+        Pre-open connections to every region host
+        
+        Sends warmup_connections concurrent HEAD requests per host so the
+        first real requests skip DNS, TCP and TLS setup. These are not AODP
+        API calls, so they bypass the rate limit; failures are ignored.
+        
+        Returns:
+            Dict of host -> connections that answered
+        """
+        if self.offline:
+            return {}
+        
+        async def probe(client: httpx.AsyncClient, url: str) -> bool:
+            try:
+                await client.head(url)
+                return True
+            except Exception as e:
+                print(f"AODP warm-up of {url} failed: {e}")
+                return False
+        
+        # All hosts at once, so startup waits for at most one connect timeout
+        urls = {self._channel(url).host: url for url in self.region_urls.values()}
+        probes = [
+            (host, probe(self._http_client(self.hosts[host]), url))
+            for host, url in urls.items()
+            for _ in range(self.http_settings["warmup_connections"])
+        ]
+        answered = await asyncio.gather(*(coro for _, coro in probes))
+        
+        results = {host: 0 for host in urls}
+        for (host, _), ok in zip(probes, answered):
+            results[host] += ok
+        return results
+    
+    def save_rate_state(self):
+        """Persist the learned rate of every host"""
+        for channel in self.hosts.values():
+            if channel.adaptive:
+                channel.adaptive.save()
+    
+    def region_rate_limiter(self, region: str) -> RateLimiter:
+        """Token bucket of the host serving a region"""
+        return self._channel(self._get_region_url(region)).rate_limiter
+    
+    def get_region_rates(self) -> Dict[str, float]:
+        """Current requests/min of the host serving each region"""
+        return {
+            region: round(self.region_rate_limiter(region).max_requests, 2)
+            for region in self.region_urls
+        }
     
     async def close(self):
-        """Close the HTTP client"""
-        if self.client:
-            await self.client.aclose()
+        """Close the HTTP clients"""
+        for channel in self.hosts.values():
+            await channel.lanes.close()
+            if channel.client:
+                await channel.client.aclose()
+                channel.client = None
     
     def _get_cache_key(self, endpoint: str, params: Dict[str, Any]) -> str:
         """Generate a cache key for the request"""
         key_data = f"{endpoint}:{json.dumps(params, sort_keys=True)}"
-        return hashlib.md5(key_data.encode()).hexdigest()
+        return f"{endpoint}:{hashlib.md5(key_data.encode()).hexdigest()}"
     
     def _get_region_url(self, region: str) -> str:
         """Get the appropriate URL for the region"""
         return self.region_urls.get(region, self.region_urls["west"])
     
-    async def _make_request(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _parse_retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+    
+    async def _make_request(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """
+        Make an HTTP request, sharing one in-flight call between concurrent
+        callers asking for the same URL and parameters
+        
+        Coalesced callers ride along at the priority of the first caller.
+        """
+        key = f"{url}?{json.dumps(params, sort_keys=True, default=str)}"
+        task = self._inflight.get(key)
+        if task is not None:
+            self.metrics["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._send_request(url, params, priority))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        
+        # Shield so one caller being cancelled does not cancel the others
+        return await asyncio.shield(task)
+    
+    def _request_done(self, key: str, task: asyncio.Future) -> None:
+        """Drop a finished request from the in-flight registry"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller went away
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get request counters"""
+        return {
+            **self.metrics,
+            "in_flight": len(self._inflight),
+            "lanes": self.lanes.get_metrics(),
+            "adaptive_rate": self.adaptive.get_metrics() if self.adaptive else None,
+            "circuit": "offline" if self.offline else self.breaker.state,
+            "hosts": {host: channel.get_metrics() for host, channel in self.hosts.items()}
+        }
+    
+    async def _send_request(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
         """Make an HTTP request with rate limiting and retries"""
-        await self.rate_limiter.acquire()
+        if self.offline:
+            raise AODPUnavailableError("AODP offline mode is enabled")
         
+        channel = self._channel(url)
+        self.metrics["requests"] += 1
         max_retries = 3
         retry_delay = 1
         
         for attempt in range(max_retries):
+            if not channel.breaker.allow_request():
+                self.metrics["short_circuited"] += 1
+                raise AODPUnavailableError(f"AODP circuit for {channel.host} is open after repeated failures")
+            await channel.lanes.acquire(priority)
             try:
-                response = await self.client.get(url, params=params)
+                response = await self._http_client(channel).get(url, params=params)
+                channel.http_version = response.http_version
                 response.raise_for_status()
-                return response.json()
+                channel.breaker.record_success()
+                if channel.adaptive:
+                    channel.adaptive.on_success()
+                return fastjson.loads(response.content)
             except httpx.HTTPStatusError as e:
+                if e.response.status_code >= 500:
+                    channel.breaker.record_failure()
+                    if channel.breaker.state == "open":
+                        raise AODPUnavailableError(f"AODP circuit opened: {e}") from e
+                else:
+                    channel.breaker.record_success()  # AODP answered, so it is up
+                if channel.adaptive and (e.response.status_code == 429 or e.response.status_code >= 500):
+                    channel.adaptive.on_throttle()
                 if e.response.status_code == 429:  # Rate limited
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
+                    retry_after = self._parse_retry_after(e.response)
+                    if retry_after is not None:
+                        channel.rate_limiter.defer(retry_after)
+                    else:
+                        await asyncio.sleep(retry_delay * (2 ** attempt))
                     continue
                 raise
             except Exception as e:
+                if isinstance(e, httpx.TransportError):
+                    channel.breaker.record_failure()
+                    if channel.breaker.state == "open":
+                        raise AODPUnavailableError(f"AODP circuit opened: {e}") from e
                 if attempt == max_retries - 1:
                     raise
                 await asyncio.sleep(retry_delay * (2 ** attempt))
         
         return {}
     
+    def _chunk_items(self, url_prefix: str, url_suffix: str, items: List[str], params: Dict[str, Any]) -> List[List[str]]:
+        """Split item IDs into groups whose request URL stays under max_url_length"""
+        overhead = len(url_prefix) + len(url_suffix) + len(urlencode(params, quote_via=quote)) + 1
+        budget = max(self.max_url_length - overhead, 1)
+        
+        chunks = []
+        current: List[str] = []
+        length = 0
+        for item in items:
+            item_length = len(quote(item, safe="@"))
+            separator = 1 if current else 0  # ","
+            if current and length + separator + item_length > budget:
+                chunks.append(current)
+                current = []
+                length = 0
+                separator = 0
+            current.append(item)
+            length += separator + item_length
+        
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def plan_price_chunks(self, region: str, items: List[str], cities: List[str], qualities: List[int]) -> List[List[str]]:
+        """Get the item groups get_prices would request for these parameters"""
+        base_url = self._get_region_url(region)
+        params = {
+            "locations": ",".join(cities),
+            "qualities": ",".join(map(str, qualities))
+        }
+        return self._chunk_items(f"{base_url}/api/v2/stats/prices/", ".json", items, params)
+    
+    async def _fetch_chunks(
+        self,
+        url_prefix: str,
+        items: List[str],
+        params: Dict[str, Any],
+        priority: str = "interactive"
+    ) -> List[Tuple[List[str], Any]]:
+        """
+        Fetch a multi-item endpoint for a large item list as concurrent
+        URL-length-safe chunks
+        
+        Returns:
+            List of (chunk items, response data or raised exception)
+        """
+        chunks = self._chunk_items(url_prefix, ".json", items, params)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def fetch_chunk(chunk: List[str]) -> Any:
+            url = f"{url_prefix}{','.join(chunk)}.json"
+            async with semaphore:
+                return await self._make_request(url, params, priority)
+        
+        results = await asyncio.gather(
+            *(fetch_chunk(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+        
+        return list(zip(chunks, results))
+    
+    async def _fetch_price_chunks(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int],
+        priority: str = "interactive"
+    ) -> List[Tuple[List[str], Any]]:
+        """Fetch prices for a large item list in chunks"""
+        base_url = self._get_region_url(region)
+        params = {
+            "locations": ",".join(cities),
+            "qualities": ",".join(map(str, qualities))
+        }
+        return await self._fetch_chunks(f"{base_url}/api/v2/stats/prices/", items, params, priority)
+    
+    def _price_cache_key(self, region: str, item_id: str, city: str, quality: int) -> str:
+        """Cache key for a single (region, item, city, quality) price row"""
+        return f"prices:{region}:{item_id}:{city}:{quality}"
+    
+    async def _get_prices(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int],
+        priority: str = "interactive"
+    ) -> Tuple[List[Dict[str, Any]], List[Tuple[List[str], Exception]]]:
+        """
+        Get prices from cache or AODP as (rows, failed chunks)
+        
+        Every (item, city, quality) row is cached on its own, so only the
+        combinations missing from the cache are requested from AODP.
+        Stale rows are returned as-is and refreshed in the background.
+        
+        Rows AODP labels with a quality that was not requested (e.g. real
+        qualities for the quality 0 default) are cached under their own
+        quality and, as a list, under the requested one, so such requests
+        are served from the cache like any other.
+        """
+        rows: Dict[Tuple[str, str, int], Any] = {}
+        missing_items: List[str] = []
+        missing_cities = set()
+        missing_qualities = set()
+        stale_items: List[str] = []
+        
+        # Assemble what we can from the cache, read in one batch
+        cached_rows = self.cache.get_many(
+            self._price_cache_key(region, item_id, city, quality)
+            for item_id in items for city in cities for quality in qualities
+        )
+        for item_id in items:
+            for city in cities:
+                for quality in qualities:
+                    key = self._price_cache_key(region, item_id, city, quality)
+                    cached, is_stale = cached_rows[key]
+                    if cached is None:
+                        if not missing_items or missing_items[-1] != item_id:
+                            missing_items.append(item_id)
+                        missing_cities.add(city)
+                        missing_qualities.add(quality)
+                        continue
+                    
+                    if is_stale and key not in self._refreshing:
+                        if not stale_items or stale_items[-1] != item_id:
+                            stale_items.append(item_id)
+                    if cached:  # Empty dict marks a combination AODP has no row for
+                        rows[(item_id, city, quality)] = cached  # A row, or a list of relabelled rows
+        
+        if stale_items:
+            self._schedule_price_refresh(region, stale_items, cities, qualities)
+        
+        failures: List[Tuple[List[str], Exception]] = []
+        if missing_items:
+            fetch_cities = [city for city in cities if city in missing_cities]
+            fetch_qualities = [quality for quality in qualities if quality in missing_qualities]
+            fetched, failures = await self._fetch_and_cache_prices(
+                region, missing_items, fetch_cities, fetch_qualities, priority
+            )
+            rows.update(fetched)
+        
+        data = []
+        for item_id in items:
+            for city in cities:
+                for quality in qualities:
+                    found = rows.get((item_id, city, quality))
+                    if isinstance(found, list):
+                        data.extend(found)
+                    elif found:
+                        data.append(found)
+        return data, failures
+    
+    async def _fetch_and_cache_prices(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int],
+        priority: str = "interactive"
+    ) -> Tuple[Dict[Tuple[str, str, int], Any], List[Tuple[List[str], Exception]]]:
+        """
+        Fetch prices from AODP and cache every returned row
+        
+        Returns:
+            Tuple of (rows by (item, city, quality), failed chunks). A
+            requested key AODP answered under other qualities maps to the
+            list of those rows.
+        """
+        rows: Dict[Tuple[str, str, int], Any] = {}
+        failures: List[Tuple[List[str], Exception]] = []
+        
+        start = time.perf_counter()
+        chunks = await self._fetch_price_chunks(region, items, cities, qualities, priority)
+        self.cache.record_load("prices", time.perf_counter() - start)
+        
+        for chunk, result in chunks:
+            if not isinstance(result, list):
+                if not isinstance(result, Exception):
+                    result = RuntimeError("AODP returned no price data (rate limit retries exhausted?)")
+                print(f"AODP prices chunk failed ({len(chunk)} items): {result}")
+                failures.append((chunk, result))
+                continue
+            
+            chunk_rows: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+            relabeled: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            entries = []  # Written to the cache in one batch per chunk
+            for row in result:
+                key = (row.get("item_id"), row.get("city"), row.get("quality", 0))
+                chunk_rows[key] = row
+                if key[2] not in qualities:
+                    relabeled.setdefault(key[:2], []).append(row)
+                entries.append((
+                    self._price_cache_key(region, *key), row,
+                    (item_tag(region, key[0]), city_tag(region, key[1]))
+                ))
+            rows.update(chunk_rows)
+            
+            # Requested combinations without a row of their own keep the rows
+            # AODP relabelled (e.g. quality 0 answered with real qualities),
+            # or an empty dict marking that AODP has no data for them
+            for item_id in chunk:
+                for city in cities:
+                    for quality in qualities:
+                        key = (item_id, city, quality)
+                        if key in chunk_rows:
+                            continue
+                        value = relabeled.get((item_id, city), {})
+                        if value:
+                            rows[key] = value
+                        entries.append((
+                            self._price_cache_key(region, *key), value,
+                            (item_tag(region, item_id), city_tag(region, city))
+                        ))
+            self.cache.set_many(entries)
+        
+        if rows:
+            self._observe_prices(region, [row for row in rows.values() if isinstance(row, dict)])
+        
+        return rows, failures
+    
+    def _schedule_price_refresh(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int]
+    ) -> None:
+        """Refresh stale price rows in the background, once per cache key"""
+        keys = [
+            self._price_cache_key(region, item_id, city, quality)
+            for item_id in items
+            for city in cities
+            for quality in qualities
+        ]
+        keys = [key for key in keys if key not in self._refreshing]
+        if not keys:
+            return
+        self._refreshing.update(keys)
+        
+        async def refresh():
+            try:
+                await self._fetch_and_cache_prices(region, items, cities, qualities, "background")
+            except Exception as e:
+                print(f"Background price refresh failed: {e}")
+            finally:
+                self._refreshing.difference_update(keys)
+        
+        self._track_background(refresh())
+    
+    def _track_background(self, coro) -> None:
+        """Run a coroutine as a background task, keeping a reference to it"""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def fetch_prices(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int] = [0],
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """
+        Get current market prices, reporting failures per chunk
+        
+        Large item lists are split into several AODP requests that run
+        concurrently. A failing chunk does not discard the others.
+        
+        Args:
+            region: Server region (west, europe, east)
+            items: List of item IDs
+            cities: List of city names
+            qualities: List of quality levels (0-5)
+            priority: Traffic class (interactive, breeding, background, backfill)
+        
+        Returns:
+            Dict with "data" (merged price rows) and "errors" (one entry
+            per failed chunk with its items and error message)
+        """
+        data, failures = await self._get_prices(region, items, cities, qualities, priority)
+        return {
+            "data": data,
+            "errors": [{"items": chunk, "error": str(error)} for chunk, error in failures]
+        }
+    
+    async def refresh_prices(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        qualities: List[int] = [0],
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """
+        Fetch prices from AODP bypassing the cache and store the result
+        
+        Returns:
+            Dict with "rows" (number of rows fetched) and "errors"
+        """
+        rows, failures = await self._fetch_and_cache_prices(region, items, cities, qualities, priority)
+        return {
+            "rows": sum(1 for row in rows.values() if isinstance(row, dict)),
+            "errors": [{"items": chunk, "error": str(error)} for chunk, error in failures]
+        }
+    
+    def is_available(self, region: str = "west") -> bool:
+        """False while offline or while the region host's circuit is open"""
+        return not self.offline and self._channel(self._get_region_url(region)).breaker.state != "open"
+    
     async def get_prices(
         self,
         region: str,
         items: List[str],
         cities: List[str],
-        qualities: List[int] = [0]
+        qualities: List[int] = [0],
+        priority: str = "interactive"
     ) -> List[Dict[str, Any]]:
         """
         Get current market prices for items in specified cities
@@ -114,47 +1014,42 @@ class AODPClient:
             items: List of item IDs
             cities: List of city names
             qualities: List of quality levels (0-5)
+            priority: Traffic class (interactive, breeding, background, backfill)
         
         Returns:
-            List of price data dictionaries
+            List of price data dictionaries (partial if some chunks failed)
         """
-        # Build request parameters
-        items_str = ",".join(items)
-        cities_str = ",".join(cities)
-        qualities_str = ",".join(map(str, qualities))
-        
-        # Check cache
-        cache_key = self._get_cache_key(
-            f"prices_{region}",
-            {"items": items_str, "cities": cities_str, "qualities": qualities_str}
-        )
-        cached_data = self.cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        data, failures = await self._get_prices(region, items, cities, qualities, priority)
         
-        # Build URL
-        base_url = self._get_region_url(region)
-        url = f"{base_url}/api/v2/stats/prices/{items_str}.json"
-        params = {
-            "locations": cities_str,
-            "qualities": qualities_str
-        }
+        # Only fail outright if nothing could be fetched; callers fall back
+        # to local data on AODPUnavailableError whatever the chunks raised
+        if failures and not data:
+            error = failures[0][1]
+            if isinstance(error, AODPUnavailableError):
+                raise error
+            raise AODPUnavailableError(f"All AODP price requests failed: {error}") from error
         
-        # Make request
-        data = await self._make_request(url, params)
+        return data
+    
+    def _observe_prices(self, region: str, data: List[Dict[str, Any]]) -> None:
+        """Bump price epochs for items whose AODP rows changed"""
+        if self.epochs is None:
+            return
         
-        # Process and cache the data
-        if data:
-            self.cache.set(cache_key, data)
+        rows_by_item: Dict[str, List[Dict[str, Any]]] = {}
+        for row in data:
+            rows_by_item.setdefault(row.get("item_id"), []).append(row)
         
-        return data if isinstance(data, list) else []
+        for item_id, rows in rows_by_item.items():
+            self.epochs.observe(region, item_id, rows)
     
     async def get_history(
         self,
         region: str,
         item: str,
         city: str,
-        timescale: int = 24
+        timescale: int = 24,
+        priority: str = "interactive"
     ) -> List[Dict[str, Any]]:
         """
         Get historical price data for an item in a specific city
@@ -164,19 +1059,44 @@ class AODPClient:
             item: Item ID
             city: City name
             timescale: Time scale (1=hourly, 24=daily)
+            priority: Traffic class (interactive, breeding, background, backfill)
         
         Returns:
             List of historical data points
         """
         # Check cache
         cache_key = self._get_cache_key(
-            f"history_{region}",
-            {"item": item, "city": city, "timescale": timescale}
+            "history",
+            {"region": region, "item": item, "city": city, "timescale": timescale}
         )
-        cached_data = self.cache.get(cache_key)
+        cached_data, is_stale = self.cache.get_with_status(cache_key)
         if cached_data:
+            if is_stale and cache_key not in self._refreshing:
+                self._refreshing.add(cache_key)
+                
+                async def refresh():
+                    try:
+                        await self._fetch_history(region, item, city, timescale, cache_key, "background")
+                    except Exception as e:
+                        print(f"Background history refresh failed: {e}")
+                    finally:
+                        self._refreshing.discard(cache_key)
+                
+                self._track_background(refresh())
             return cached_data
         
+        return await self._fetch_history(region, item, city, timescale, cache_key, priority)
+    
+    async def _fetch_history(
+        self,
+        region: str,
+        item: str,
+        city: str,
+        timescale: int,
+        cache_key: str,
+        priority: str = "interactive"
+    ) -> List[Dict[str, Any]]:
+        """Fetch history from AODP and cache it"""
         # Build URL
         base_url = self._get_region_url(region)
         url = f"{base_url}/api/v2/stats/history/{item}.json"
@@ -186,18 +1106,68 @@ class AODPClient:
         }
         
         # Make request
-        data = await self._make_request(url, params)
+        start = time.perf_counter()
+        data = await self._make_request(url, params, priority)
+        self.cache.record_load("history", time.perf_counter() - start)
         
         # Process and cache the data
         if data:
             # The response is usually a list with one item per location
             if isinstance(data, list) and len(data) > 0:
                 history_data = data[0].get("data", [])
-                self.cache.set(cache_key, history_data, ttl=1800)  # Cache for 30 minutes
+                self.cache.set(
+                    cache_key, history_data, ttl=1800,  # Cache for 30 minutes
+                    tags=(item_tag(region, item), city_tag(region, city))
+                )
                 return history_data
         
         return []
     
+    async def fetch_history_batch(
+        self,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        timescale: int = 24,
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """
+        Get history series for many items and cities in as few calls as possible
+        
+        Uses AODP's multi-item/multi-location history endpoint, split into
+        URL-length-safe chunks fetched concurrently. Results are not cached
+        here; callers persist them (see HistoryService).
+        
+        Args:
+            region: Server region
+            items: List of item IDs
+            cities: List of city names
+            timescale: Time scale (1=hourly, 6=6-hourly, 24=daily)
+            priority: Traffic class (interactive, breeding, background, backfill)
+        
+        Returns:
+            Dict with "data" (AODP series, one per item/location/quality)
+            and "errors" (one entry per failed chunk)
+        """
+        base_url = self._get_region_url(region)
+        params = {
+            "locations": ",".join(cities),
+            "time-scale": timescale
+        }
+        
+        data: List[Dict[str, Any]] = []
+        errors: List[Dict[str, Any]] = []
+        for chunk, result in await self._fetch_chunks(
+            f"{base_url}/api/v2/stats/history/", items, params, priority
+        ):
+            if isinstance(result, list):
+                data.extend(result)
+            else:
+                print(f"AODP history chunk failed ({len(chunk)} items): {result}")
+                errors.append({"items": chunk, "error": str(result or "no data returned")})
+        
+        return {"data": data, "errors": errors}
+    
     async def get_item_data(self, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
         """
         Get item metadata (names, tiers, etc.)
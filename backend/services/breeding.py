@@ -260,7 +260,7 @@ class BreedingCalculator:
         if feed_mode == "buy":
             # Get food prices
             food_prices = await self.aodp_client.get_prices(
-                region, [feed_item], cities, [0]
+                region, [feed_item], cities, [0], priority="breeding"
             )
             
             # Filter by age
@@ -316,7 +316,7 @@ class BreedingCalculator:
         for material_id, quantity in materials:
             # Get prices for this material
             prices = await self.aodp_client.get_prices(
-                region, [material_id], cities, [0]
+                region, [material_id], cities, [0], priority="breeding"
             )
             
             # Filter by age
@@ -382,7 +382,7 @@ class BreedingCalculator:
         """Get mount prices across cities"""
         
         prices = await self.aodp_client.get_prices(
-            region, [mount_id], cities, [0]
+            region, [mount_id], cities, [0], priority="breeding"
         )
         
         return self.pricing.filter_by_age(prices, max_age_hours)
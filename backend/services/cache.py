@@ -1,122 +1,570 @@
 """
 Cache manager for storing API responses
-Simple in-memory implementation with TTL support
+Bounded in-memory implementation with TTL support
 """
 
+import asyncio
+import heapq
+import os
+import sqlite3
+import struct
+import sys
 import time
-from typing import Any, Optional, Dict
+import uuid
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Dict, List, Set, Tuple
 from threading import Lock
 
+from services import fastjson
+from services.codec import Codec, CodecUnavailableError, codec_for, decodable, decode
+
+NAMESPACE_COUNTERS = ("hits", "stale_hits", "misses", "evictions", "expirations", "invalidations")
+
+def namespace_of(key: str) -> str:
+    """Cache namespace of a key (the part before the first ":")"""
+    return key.split(":", 1)[0]
+
+def namespace_summary(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Counters plus derived hit ratio, average entry size and load latency"""
+    lookups = counters["hits"] + counters["stale_hits"] + counters["misses"]
+    return {
+        **{name: value for name, value in counters.items() if name != "load_seconds"},
+        "hit_ratio": round((counters["hits"] + counters["stale_hits"]) / lookups, 4) if lookups else 0.0,
+        "avg_entry_bytes": round(counters["bytes"] / counters["entries"]) if counters["entries"] else 0,
+        "avg_load_ms": round(counters["load_seconds"] / counters["loads"] * 1000, 2) if counters["loads"] else 0.0,
+        "max_load_ms": round(counters["max_load_seconds"] * 1000, 2)
+    }
+
+def decode_entries(
+    keys: Iterable[str], entries: Dict[str, Tuple[bytes, float, float]]
+) -> Dict[str, Tuple[Optional[Any], bool]]:
+    """(value, is_stale) of every key from its shared-tier entry; undecodable entries miss"""
+    current_time = time.time()
+    results = {}
+    for key in keys:
+        entry = entries.get(key)
+        if entry is None or not decodable(entry[0]):
+            results[key] = (None, False)
+        else:
+            results[key] = (decode(entry[0]), current_time >= entry[1])
+    return results
+
+def item_tag(region: str, item_id: str) -> str:
+    """Tag for every entry holding data about an item in a region"""
+    return f"item:{region}:{item_id}"
+
+def city_tag(region: str, city: str) -> str:
+    """Tag for every entry holding data about a city in a region"""
+    return f"city:{region}:{city}"
+
 class CacheManager:
-    """Simple in-memory cache with TTL support"""
+    """
+    Bounded in-memory cache with TTL support and LRU eviction
+    
+    Entries have a soft TTL (after which they are stale) and a hard TTL
+    (after which they are gone). Between the two, get() misses but
+    get_with_status() still returns the value flagged as stale, so callers
+    can serve it while refreshing in the background.
+    
+    When max_entries or max_bytes is exceeded, the least recently used
+    entries are evicted. Entry sizes are approximated by their JSON length.
+    
+    Hard-expired entries are removed by an incremental sweeper driven by an
+    expiry heap, so no operation ever scans the whole cache.
+    
+    Entries can carry tags (see item_tag/city_tag); invalidate_tags() drops
+    every entry carrying any of the given tags.
+    
+    Values in namespaces with a codec (see services.codec) are kept encoded
+    and only decoded when read; other values are kept as Python objects.
     
-    def __init__(self, ttl_seconds: int = 600):
+    Counters are also kept per key namespace ("prices", "history", ...),
+    together with entry sizes and the load latency callers report through
+    record_load().
+    """
+    
+    def __init__(
+        self,
+        ttl_seconds: int = 600,
+        stale_ttl_seconds: int = 0,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        codecs: Optional[Dict[str, Codec]] = None
+    ):
         self.ttl_seconds = ttl_seconds
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.codecs = codecs or {}
+        self.cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # Least recently used first
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self.tag_index: Dict[str, Set[str]] = {}
+        self.namespaces: Dict[str, Dict[str, Any]] = {}
+        # (stale_until, key); entries overwritten or removed since are skipped when popped
+        self.expiry_heap: List[Tuple[float, str]] = []
+        self.sweeper: Optional[asyncio.Task] = None
         self.lock = Lock()
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache if not expired"""
+        value, is_stale = self.get_with_status(key)
+        return None if is_stale else value
+    
+    def get_with_status(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Get value from cache including stale entries
+        
+        Returns:
+            Tuple of (value, is_stale); value is None on a miss
+        """
         with self.lock:
-            if key in self.cache:
-                entry = self.cache[key]
-                if time.time() < entry["expires_at"]:
-                    return entry["value"]
-                else:
-                    # Remove expired entry
-                    del self.cache[key]
-        return None
+            entry, is_stale = self._lookup(key, time.time())
+        # Decode outside the lock
+        return self._entry_value(key, entry, is_stale)
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Set value in cache with TTL"""
-        ttl = ttl or self.ttl_seconds
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Optional[Any], bool]]:
+        """
+        Get several values including stale entries, taking the lock once
+        
+        Returns:
+            Dict of key -> (value, is_stale); value is None on a miss
+        """
         with self.lock:
+            current_time = time.time()
+            entries = {key: self._lookup(key, current_time) for key in keys}
+        return {key: self._entry_value(key, entry, is_stale) for key, (entry, is_stale) in entries.items()}
+    
+    def _lookup(self, key: str, current_time: float) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Find a live entry as (entry, is_stale), counting the outcome (lock must be held)"""
+        entry = self.cache.get(key)
+        if entry is not None:
+            if current_time < entry["expires_at"]:
+                self.cache.move_to_end(key)
+                self._count(key, "hits")
+                return entry, False
+            if current_time < entry["stale_until"]:
+                self.cache.move_to_end(key)
+                self._count(key, "stale_hits")
+                return entry, True
+            # Remove expired entry
+            self._remove(key)
+            self._count(key, "expirations")
+        self._count(key, "misses")
+        return None, False
+    
+    def _entry_value(self, key: str, entry: Optional[Dict[str, Any]], is_stale: bool) -> Tuple[Optional[Any], bool]:
+        """Decode an entry found by _lookup() as (value, is_stale)"""
+        if entry is None:
+            return None, False
+        if entry["encoded"]:
+            try:
+                return decode(entry["value"]), is_stale
+            except CodecUnavailableError as e:
+                print(f"Dropping cache entry {key}: {e}")
+                self.delete(key)
+                return None, False
+        return entry["value"], is_stale
+    
+    def codec_for(self, key: str) -> Optional[Codec]:
+        """Codec configured for a key's namespace, if any"""
+        return codec_for(self.codecs, key)
+    
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until the entry goes stale (negative once stale, None if missing)"""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            current_time = time.time()
+            if current_time >= entry["stale_until"]:
+                return None
+            return entry["expires_at"] - current_time
+    
+    def _estimate_size(self, key: str, value: Any) -> int:
+        """Approximate bytes held by an entry"""
+        try:
+            return len(key) + len(fastjson.dumps(value))
+        except Exception:
+            return len(key) + sys.getsizeof(value)
+    
+    def _namespace(self, key: str) -> Dict[str, Any]:
+        """Counters of a key's namespace (lock must be held)"""
+        namespace = namespace_of(key)
+        counters = self.namespaces.get(namespace)
+        if counters is None:
+            counters = dict.fromkeys(NAMESPACE_COUNTERS, 0)
+            counters.update(entries=0, bytes=0, loads=0, load_seconds=0.0, max_load_seconds=0.0)
+            self.namespaces[namespace] = counters
+        return counters
+    
+    def _count(self, key: str, counter: str) -> None:
+        """Bump a counter globally and for the key's namespace (lock must be held)"""
+        self.stats[counter] += 1
+        self._namespace(key)[counter] += 1
+    
+    def _remove(self, key: str) -> None:
+        """Drop an entry (lock must be held)"""
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry["size"]
+        counters = self._namespace(key)
+        counters["entries"] -= 1
+        counters["bytes"] -= entry["size"]
+        for tag in entry["tags"]:
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+    
+    def _schedule_expiry(self, key: str, stale_until: float) -> None:
+        """Track an entry's hard expiry (lock must be held)"""
+        heapq.heappush(self.expiry_heap, (stale_until, key))
+        # Overwrites and evictions leave outdated heap items; rebuild once they dominate
+        if len(self.expiry_heap) > 2 * len(self.cache) + 1024:
+            self.expiry_heap = [(entry["stale_until"], k) for k, entry in self.cache.items()]
+            heapq.heapify(self.expiry_heap)
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Set value in cache with TTL, optional stale window and invalidation tags"""
+        codec = self.codec_for(key)
+        if codec is not None:
+            data = codec.encode(value)
+            self._store(key, data, True, len(key) + len(data), ttl, stale_ttl, tags)
+        else:
+            self._store(key, value, False, self._estimate_size(key, value), ttl, stale_ttl, tags)
+    
+    def set_many(
+        self,
+        entries: Iterable[Tuple[str, Any, Optional[Iterable[str]]]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> None:
+        """Set several (key, value, tags) entries with the same TTL and stale window"""
+        for key, value, tags in entries:
+            self.set(key, value, ttl, stale_ttl, tags)
+    
+    def set_encoded(
+        self,
+        key: str,
+        data: bytes,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Set a value already encoded by a codec (e.g. read from a shared tier)"""
+        if not decodable(data):
+            return  # Written by a worker with a codec library this one lacks
+        if self.codec_for(key) is not None:
+            self._store(key, data, True, len(key) + len(data), ttl, stale_ttl, tags)
+        else:
+            self.set(key, decode(data), ttl, stale_ttl, tags)
+    
+    def _store(
+        self,
+        key: str,
+        value: Any,
+        encoded: bool,
+        size: int,
+        ttl: Optional[int],
+        stale_ttl: Optional[int],
+        tags: Optional[Iterable[str]]
+    ) -> None:
+        ttl = self.ttl_seconds if ttl is None else ttl
+        stale_ttl = self.stale_ttl_seconds if stale_ttl is None else stale_ttl
+        expires_at = time.time() + ttl
+        tags = tuple(tags) if tags else ()
+        with self.lock:
+            if key in self.cache:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Would evict everything else and still not fit
+            
             self.cache[key] = {
                 "value": value,
-                "expires_at": time.time() + ttl
+                "expires_at": expires_at,
+                "stale_until": expires_at + stale_ttl,
+                "size": size,
+                "tags": tags,
+                "encoded": encoded
             }
+            self.total_bytes += size
+            counters = self._namespace(key)
+            counters["entries"] += 1
+            counters["bytes"] += size
+            for tag in tags:
+                self.tag_index.setdefault(tag, set()).add(key)
+            self._schedule_expiry(key, expires_at + stale_ttl)
+            
+            # Evict least recently used entries beyond the caps
+            while (
+                (self.max_entries is not None and len(self.cache) > self.max_entries)
+                or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+            ):
+                victim = next(iter(self.cache))
+                self._remove(victim)
+                self._count(victim, "evictions")
     
     def delete(self, key: str) -> None:
         """Delete key from cache"""
         with self.lock:
             if key in self.cache:
-                del self.cache[key]
+                self._remove(key)
     
     def clear(self) -> None:
         """Clear all cache entries"""
         with self.lock:
             self.cache.clear()
+            self.expiry_heap = []
+            self.tag_index = {}
+            self.total_bytes = 0
+            for counters in self.namespaces.values():
+                counters["entries"] = counters["bytes"] = 0
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """
+        Delete every entry carrying any of the given tags
+        
+        Returns:
+            Keys that were removed
+        """
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self.tag_index.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+                self._count(key, "invalidations")
+            return list(keys)
     
     def size(self) -> int:
-        """Get number of cached entries"""
+        """Get number of cached entries (hard-expired ones linger until swept)"""
+        return len(self.cache)
+    
+    def cleanup_expired(self, max_entries: Optional[int] = 1000) -> int:
+        """
+        Remove hard-expired entries, soonest expiry first
+        
+        Args:
+            max_entries: Most heap items to process in this call (None for all),
+                so the lock is never held for a full sweep
+        
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        processed = 0
         with self.lock:
-            # Clean expired entries first
             current_time = time.time()
-            expired_keys = [
-                key for key, entry in self.cache.items()
-                if current_time >= entry["expires_at"]
-            ]
-            for key in expired_keys:
-                del self.cache[key]
-            
-            return len(self.cache)
+            while self.expiry_heap and self.expiry_heap[0][0] <= current_time:
+                if max_entries is not None and processed >= max_entries:
+                    break
+                stale_until, key = heapq.heappop(self.expiry_heap)
+                processed += 1
+                entry = self.cache.get(key)
+                if entry is not None and entry["stale_until"] == stale_until:
+                    self._remove(key)
+                    self._count(key, "expirations")
+                    removed += 1
+        return removed
     
-    def cleanup_expired(self) -> None:
-        """Remove all expired entries"""
+    async def _sweep(self, interval_seconds: float, batch: int) -> None:
+        while True:
+            # Keep going while batches come back full, yielding between them
+            while self.cleanup_expired(batch) >= batch:
+                await asyncio.sleep(0)
+            await asyncio.sleep(interval_seconds)
+    
+    def start_sweeper(self, interval_seconds: float = 1.0, batch: int = 1000) -> None:
+        """Start the background expiry sweeper"""
+        if self.sweeper is None:
+            self.sweeper = asyncio.create_task(self._sweep(interval_seconds, batch))
+    
+    async def stop_sweeper(self) -> None:
+        """Stop the background expiry sweeper"""
+        if self.sweeper is not None:
+            self.sweeper.cancel()
+            try:
+                await self.sweeper
+            except asyncio.CancelledError:
+                pass
+            self.sweeper = None
+    
+    def get_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """Get cache counters, occupancy and limits (always exact; kept in memory)"""
         with self.lock:
-            current_time = time.time()
-            expired_keys = [
-                key for key, entry in self.cache.items()
-                if current_time >= entry["expires_at"]
-            ]
-            for key in expired_keys:
-                del self.cache[key]
+            lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": round((self.stats["hits"] + self.stats["stale_hits"]) / lookups, 4) if lookups else 0.0,
+                "entries": len(self.cache),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+    
+    def record_load(self, namespace: str, seconds: float) -> None:
+        """Record how long loading values for a namespace took (e.g. an AODP fetch)"""
+        with self.lock:
+            counters = self._namespace(namespace)
+            counters["loads"] += 1
+            counters["load_seconds"] += seconds
+            counters["max_load_seconds"] = max(counters["max_load_seconds"], seconds)
+    
+    def get_namespace_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-namespace counters, hit ratio, average entry bytes and load latency"""
+        with self.lock:
+            return {namespace: namespace_summary(counters) for namespace, counters in sorted(self.namespaces.items())}
 
 
 class RedisCache:
     """
     Redis cache implementation (optional, for production)
     Requires redis package: pip install redis
+    
+    Usable on its own or as the shared L2 of a TieredCache. Values are
+    stored with their soft expiry so stale reads work like CacheManager's,
+    and invalidations are broadcast to other workers over pub/sub.
+    Values are encoded with the namespace's codec (JSON otherwise).
     """
     
-    def __init__(self, redis_url: str = "redis://localhost:6379", ttl_seconds: int = 600):
+    CHANNEL = "market-helper:cache-invalidate"
+    FRAME = b"\xff"  # Marks (expires_at, payload) frames
+    MAX_POLL_BACKOFF_SECONDS = 60.0
+    
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379",
+        ttl_seconds: int = 600,
+        stale_ttl_seconds: int = 0,
+        codecs: Optional[Dict[str, Codec]] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.codecs = codecs or {}
+        self.pubsub = None
+        self.poll_backoff = 0.0
+        self.poll_retry_at = 0.0
         try:
             import redis
             self.redis_client = redis.from_url(redis_url)
-            self.ttl_seconds = ttl_seconds
+            self.redis_client.ping()
             self.enabled = True
         except ImportError:
             print("Redis not installed. Using in-memory cache instead.")
             self.enabled = False
-            self.fallback = CacheManager(ttl_seconds)
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from Redis cache"""
+        except Exception as e:
+            print(f"Redis unreachable ({e}). Using in-memory cache instead.")
+            self.enabled = False
         if not self.enabled:
-            return self.fallback.get(key)
-        
+            self.fallback = CacheManager(ttl_seconds, stale_ttl_seconds, codecs=codecs)
+    
+    def get_encoded_entry(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        """Get (encoded value, expires_at, stale_until) or None on a miss"""
+        return self.get_encoded_entries([key]).get(key)
+    
+    def get_encoded_entries(self, keys: List[str]) -> Dict[str, Tuple[bytes, float, float]]:
+        """(encoded value, expires_at, stale_until) of the keys found, in one round trip"""
+        if not keys:
+            return {}
         try:
-            import json
-            value = self.redis_client.get(key)
-            if value:
-                return json.loads(value)
+            pipe = self.redis_client.pipeline()
+            for key in keys:
+                pipe.get(key)
+                pipe.pttl(key)
+            results = pipe.execute()
+            current_time = time.time()
+            entries = {}
+            for key, payload, pttl in zip(keys, results[::2], results[1::2]):
+                if payload is None or pttl is None or pttl < 0 or payload[:1] != self.FRAME:
+                    continue
+                (expires_at,) = struct.unpack_from("<d", payload, 1)
+                entries[key] = (payload[9:], expires_at, current_time + pttl / 1000)
+            return entries
         except Exception as e:
             print(f"Redis get error: {e}")
-        return None
+            return {}
+    
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Get (value, expires_at, stale_until) or None on a miss"""
+        entry = self.get_encoded_entry(key)
+        if entry is None:
+            return None
+        data, expires_at, stale_until = entry
+        if not decodable(data):
+            return None
+        return decode(data), expires_at, stale_until
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from Redis cache if not expired"""
+        value, is_stale = self.get_with_status(key)
+        return None if is_stale else value
+    
+    def get_with_status(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Get value as (value, is_stale)"""
+        if not self.enabled:
+            return self.fallback.get_with_status(key)
+        entry = self.get_entry(key)
+        if entry is None:
+            return None, False
+        value, expires_at, _ = entry
+        return value, time.time() >= expires_at
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Set value in Redis cache with TTL"""
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Optional[Any], bool]]:
+        """Get several values as {key: (value, is_stale)} in one round trip"""
         if not self.enabled:
-            return self.fallback.set(key, value, ttl)
+            return self.fallback.get_many(keys)
+        keys = list(keys)
+        return decode_entries(keys, self.get_encoded_entries(keys))
+    
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until the entry goes stale (negative once stale, None if missing)"""
+        if not self.enabled:
+            return self.fallback.ttl_remaining(key)
+        entry = self.get_entry(key)
+        return entry[1] - time.time() if entry else None
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Set value in Redis cache with TTL, optional stale window and invalidation tags"""
+        self.set_many([(key, value, tags)], ttl, stale_ttl)
+    
+    def set_many(
+        self,
+        entries: Iterable[Tuple[str, Any, Optional[Iterable[str]]]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> None:
+        """Set several (key, value, tags) entries in one pipeline"""
+        if not self.enabled:
+            return self.fallback.set_many(entries, ttl, stale_ttl)
         
         try:
-            import json
             ttl = ttl or self.ttl_seconds
-            self.redis_client.setex(
-                key,
-                ttl,
-                json.dumps(value)
-            )
+            stale_ttl = self.stale_ttl_seconds if stale_ttl is None else stale_ttl
+            frame = self.FRAME + struct.pack("<d", time.time() + ttl)
+            pipe = self.redis_client.pipeline()
+            for key, value, tags in entries:
+                codec = codec_for(self.codecs, key)
+                data = codec.encode(value) if codec else fastjson.dumps(value)
+                pipe.psetex(key, max(1, int((ttl + stale_ttl) * 1000)), frame + data)
+                # Tag sets hold keys, not values, so they stay small; dead members are harmless
+                for tag in tags or ():
+                    pipe.sadd(f"tag:{tag}", key)
+            pipe.execute()
         except Exception as e:
             print(f"Redis set error: {e}")
     
@@ -140,6 +588,24 @@ class RedisCache:
         except Exception as e:
             print(f"Redis clear error: {e}")
     
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Delete every entry carrying any of the given tags, returning their keys"""
+        if not self.enabled:
+            return self.fallback.invalidate_tags(tags)
+        
+        try:
+            tag_keys = [f"tag:{tag}" for tag in tags]
+            if not tag_keys:
+                return []
+            keys = list({key.decode() for key in self.redis_client.sunion(tag_keys)})
+            if keys:
+                self.redis_client.delete(*keys)
+            self.redis_client.delete(*tag_keys)
+            return keys
+        except Exception as e:
+            print(f"Redis invalidate error: {e}")
+            return []
+    
     def size(self) -> int:
         """Get number of cached entries"""
         if not self.enabled:
@@ -149,4 +615,605 @@ class RedisCache:
             return self.redis_client.dbsize()
         except Exception as e:
             print(f"Redis size error: {e}")
-            return 0
\ No newline at end of file
+            return 0
+    
+    def publish_invalidation(self, origin: str, keys: Optional[List[str]]) -> None:
+        """Tell other workers to drop keys from their L1 (None drops everything)"""
+        try:
+            self.redis_client.publish(self.CHANNEL, fastjson.dumps({"origin": origin, "keys": keys}))
+        except Exception as e:
+            print(f"Redis publish error: {e}")
+    
+    def poll_invalidations(self, origin: str) -> List[Optional[List[str]]]:
+        """
+        Invalidations published by other workers since the last poll
+
+        While Redis is unreachable, polls back off exponentially (up to
+        MAX_POLL_BACKOFF_SECONDS) and the error is printed once per outage.
+        """
+        if time.monotonic() < self.poll_retry_at:
+            return []
+        try:
+            if self.pubsub is None:
+                self.pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                self.pubsub.subscribe(self.CHANNEL)
+            invalidations = []
+            while True:
+                message = self.pubsub.get_message()
+                if message is None:
+                    break
+                event = fastjson.loads(message["data"])
+                if event["origin"] != origin:
+                    invalidations.append(event["keys"])
+            if self.poll_backoff:
+                print("Redis reachable again, invalidation polling resumed")
+                self.poll_backoff = 0.0
+            return invalidations
+        except Exception as e:
+            if not self.poll_backoff:
+                print(f"Redis subscribe error: {e}")
+            self.pubsub = None  # Resubscribe on the next attempt
+            self.poll_backoff = min(self.MAX_POLL_BACKOFF_SECONDS, max(1.0, self.poll_backoff * 2))
+            self.poll_retry_at = time.monotonic() + self.poll_backoff
+            return []
+    
+    def start_sweeper(self, interval_seconds: float = 1.0, batch: int = 1000) -> None:
+        """Redis expires keys itself; only the fallback needs sweeping"""
+        if not self.enabled:
+            self.fallback.start_sweeper(interval_seconds, batch)
+    
+    async def stop_sweeper(self) -> None:
+        if not self.enabled:
+            await self.fallback.stop_sweeper()
+    
+    def get_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """Get cache counters (entry count only for Redis, which keeps it in O(1))"""
+        if not self.enabled:
+            return self.fallback.get_stats()
+        return {"backend": "redis", "entries": self.size()}
+    
+    def record_load(self, namespace: str, seconds: float) -> None:
+        """Load latency is tracked by the in-process tier only"""
+        if not self.enabled:
+            self.fallback.record_load(namespace, seconds)
+    
+    def get_namespace_stats(self) -> Dict[str, Dict[str, Any]]:
+        if not self.enabled:
+            return self.fallback.get_namespace_stats()
+        return {}
+
+
+class SQLiteCache:
+    """
+    Shared, persistent cache in a local SQLite file
+    
+    Stand-in for Redis as the L2 of a TieredCache: every uvicorn worker on
+    the machine opens the same file, so they share entries without running
+    a Redis server. Invalidations go through a small log table that the
+    workers poll. Entries survive restarts, so a restarted server can warm
+    its L1 from the file instead of asking AODP again.
+    
+    max_bytes caps the stored values; it is enforced by compact(), which
+    drops expired entries and then the ones closest to expiry. Values are
+    encoded with the namespace's codec (JSON otherwise).
+    
+    Counting the table is a full scan, so entry and byte counts are taken
+    at startup and by each compact(); get_stats() reports that snapshot
+    unless asked for exact counts.
+    """
+    
+    MAX_VARIABLES = 500  # Per statement; old SQLite builds allow 999
+    
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: int = 600,
+        stale_ttl_seconds: int = 0,
+        max_bytes: Optional[int] = None,
+        codecs: Optional[Dict[str, Codec]] = None
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self.max_bytes = max_bytes
+        self.codecs = codecs or {}
+        self.stats = {"compactions": 0, "compaction_evictions": 0}
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on new files
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, stale_until REAL NOT NULL, "
+            "size INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cache_entries)")}
+        if "size" not in columns:
+            self.conn.execute("ALTER TABLE cache_entries ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE cache_entries SET size = length(value) + length(key)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_stale_until ON cache_entries (stale_until)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache_entries (expires_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags (key)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, keys TEXT, created_at REAL NOT NULL)"
+        )
+        row = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidations").fetchone()
+        self.last_invalidation = row[0]
+        self.counts = {"entries": 0, "bytes": 0, "counted_at": 0.0}
+        self.count_entries()
+    
+    def get_encoded_entry(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        """Get (encoded value, expires_at, stale_until) or None on a miss"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at, stale_until FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() >= row[2]:
+            return None
+        return row[0], row[1], row[2]
+    
+    def get_encoded_entries(self, keys: List[str]) -> Dict[str, Tuple[bytes, float, float]]:
+        """(encoded value, expires_at, stale_until) of the live keys found, in one read transaction"""
+        rows = []
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for start in range(0, len(keys), self.MAX_VARIABLES):
+                    chunk = keys[start:start + self.MAX_VARIABLES]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows.extend(self.conn.execute(
+                        f"SELECT key, value, expires_at, stale_until FROM cache_entries WHERE key IN ({placeholders})",
+                        chunk
+                    ))
+            finally:
+                self.conn.execute("COMMIT")
+        current_time = time.time()
+        return {key: (value, expires_at, stale_until) for key, value, expires_at, stale_until in rows if current_time < stale_until}
+    
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Get (value, expires_at, stale_until) or None on a miss"""
+        entry = self.get_encoded_entry(key)
+        if entry is None:
+            return None
+        data, expires_at, stale_until = entry
+        if not decodable(data):
+            return None
+        return decode(data), expires_at, stale_until
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache if not expired"""
+        value, is_stale = self.get_with_status(key)
+        return None if is_stale else value
+    
+    def get_with_status(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Get value as (value, is_stale)"""
+        entry = self.get_entry(key)
+        if entry is None:
+            return None, False
+        value, expires_at, _ = entry
+        return value, time.time() >= expires_at
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Optional[Any], bool]]:
+        """Get several values as {key: (value, is_stale)}"""
+        keys = list(keys)
+        return decode_entries(keys, self.get_encoded_entries(keys))
+    
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until the entry goes stale (negative once stale, None if missing)"""
+        entry = self.get_entry(key)
+        return entry[1] - time.time() if entry else None
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Set value in cache with TTL, optional stale window and invalidation tags"""
+        self.set_many([(key, value, tags)], ttl, stale_ttl)
+    
+    def set_many(
+        self,
+        entries: Iterable[Tuple[str, Any, Optional[Iterable[str]]]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> None:
+        """Set several (key, value, tags) entries in one transaction"""
+        ttl = self.ttl_seconds if ttl is None else ttl
+        stale_ttl = self.stale_ttl_seconds if stale_ttl is None else stale_ttl
+        expires_at = time.time() + ttl
+        rows = []
+        tag_rows = []
+        for key, value, tags in entries:
+            codec = codec_for(self.codecs, key)
+            payload = codec.encode(value) if codec else fastjson.dumps(value)
+            rows.append((key, payload, expires_at, expires_at + stale_ttl, len(key) + len(payload)))
+            tag_rows.extend((tag, key) for tag in tags or ())
+        if not rows:
+            return
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, stale_until, size) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.conn.executemany("DELETE FROM cache_tags WHERE key = ?", [(row[0],) for row in rows])
+                if tag_rows:
+                    self.conn.executemany("INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", tag_rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def delete(self, key: str) -> None:
+        """Delete key from cache"""
+        with self.lock:
+            self.conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self.conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+    
+    def clear(self) -> None:
+        """Clear all cache entries"""
+        with self.lock:
+            self.conn.execute("DELETE FROM cache_entries")
+            self.conn.execute("DELETE FROM cache_tags")
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Delete every entry carrying any of the given tags, returning their keys"""
+        tags = list(tags)
+        if not tags:
+            return []
+        with self.lock:
+            keys: Dict[str, None] = {}
+            # Bulk ingest invalidations can exceed SQLite's bound-variable limit
+            for start in range(0, len(tags), self.MAX_VARIABLES):
+                chunk = tags[start:start + self.MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                keys.update((row[0], None) for row in self.conn.execute(
+                    f"SELECT DISTINCT key FROM cache_tags WHERE tag IN ({placeholders})", chunk
+                ))
+            keys = list(keys)
+            self.conn.execute("BEGIN")
+            self.conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(key,) for key in keys])
+            self.conn.executemany("DELETE FROM cache_tags WHERE key = ?", [(key,) for key in keys])
+            self.conn.execute("COMMIT")
+        return keys
+    
+    def size(self) -> int:
+        """Get number of cached entries"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+    
+    def cleanup_expired(self, max_entries: Optional[int] = 1000) -> int:
+        """Remove hard-expired entries (at most max_entries per call)"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries WHERE stale_until <= ? ORDER BY stale_until LIMIT ?)",
+                (time.time(), -1 if max_entries is None else max_entries)
+            )
+            # Other workers have had plenty of time to see old invalidations
+            self.conn.execute("DELETE FROM cache_invalidations WHERE created_at < ?", (time.time() - 3600,))
+            return cursor.rowcount
+    
+    def total_bytes(self) -> int:
+        """Bytes held by stored keys and values"""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+    
+    def count_entries(self) -> Dict[str, Any]:
+        """Refresh the entry and byte count snapshot with a single scan"""
+        with self.lock:
+            entries, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+        self.counts = {"entries": entries, "bytes": total, "counted_at": time.time()}
+        return self.counts
+    
+    def compact(self) -> int:
+        """
+        Enforce max_bytes and give freed pages back to the file system
+        
+        Expired entries go first, then the entries closest to expiry
+        (the least valuable to keep) until the store fits under max_bytes.
+        
+        Returns:
+            Number of entries removed
+        """
+        removed = self.cleanup_expired(None)
+        counts = self.count_entries()
+        if self.max_bytes is not None:
+            excess = counts["bytes"] - self.max_bytes
+            if excess > 0:
+                with self.lock:
+                    rows = self.conn.execute(
+                        "SELECT key, size FROM cache_entries ORDER BY expires_at"
+                    ).fetchall()
+                    victims = []
+                    for key, size in rows:
+                        if excess <= 0:
+                            break
+                        victims.append((key,))
+                        excess -= size
+                    self.conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+                self.stats["compaction_evictions"] += len(victims)
+                removed += len(victims)
+                self.counts["entries"] -= len(victims)
+                self.counts["bytes"] = self.max_bytes + excess
+        with self.lock:
+            # Tags of entries removed by expiry or eviction
+            self.conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+            self.conn.execute("PRAGMA incremental_vacuum")
+        self.stats["compactions"] += 1
+        return removed
+    
+    def load_entries(self, limit: int) -> List[Tuple[str, bytes, float, float]]:
+        """Live (key, encoded value, expires_at, stale_until) entries, freshest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value, expires_at, stale_until FROM cache_entries "
+                "WHERE stale_until > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        return rows
+    
+    def publish_invalidation(self, origin: str, keys: Optional[List[str]]) -> None:
+        """Tell other workers to drop keys from their L1 (None drops everything)"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO cache_invalidations (origin, keys, created_at) VALUES (?, ?, ?)",
+                (origin, None if keys is None else fastjson.dumps(keys), time.time())
+            )
+    
+    def poll_invalidations(self, origin: str) -> List[Optional[List[str]]]:
+        """Invalidations published by other workers since the last poll"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, origin, keys FROM cache_invalidations WHERE id > ? ORDER BY id",
+                (self.last_invalidation,)
+            ).fetchall()
+        if rows:
+            self.last_invalidation = rows[-1][0]
+        return [
+            None if keys is None else fastjson.loads(keys)
+            for _, event_origin, keys in rows
+            if event_origin != origin
+        ]
+    
+    def get_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """
+        Get entry count and file size
+        
+        Args:
+            exact: Count the table now instead of reporting the counts
+                taken by the last compaction (a full scan)
+        """
+        counts = self.count_entries() if exact else self.counts
+        return {
+            **self.stats,
+            "backend": "sqlite",
+            "entries": counts["entries"],
+            "bytes": counts["bytes"],
+            "counted_seconds_ago": round(time.time() - counts["counted_at"], 1),
+            "max_bytes": self.max_bytes,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+    
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+class TieredCache:
+    """
+    Two-tier cache: in-process L1 (CacheManager) over a shared L2
+    
+    Reads go to L1 first and fall through to L2 (RedisCache or SQLiteCache),
+    copying hits into L1 with the L2 entry's remaining lifetime. Writes go
+    to both tiers. Deletes and clears are also broadcast so the other
+    workers drop their L1 copies; plain writes are not, so another worker
+    may serve its older L1 copy until that expires. Tag invalidations are
+    resolved against L2 and broadcast as the affected keys.
+    """
+    
+    def __init__(self, l1: CacheManager, l2, poll_interval_seconds: float = 1.0, compact_interval_seconds: float = 300.0):
+        self.l1 = l1
+        self.l2 = l2
+        self.ttl_seconds = l1.ttl_seconds
+        self.stale_ttl_seconds = l1.stale_ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.compact_interval_seconds = compact_interval_seconds
+        self.last_compact = time.monotonic()
+        self.origin = uuid.uuid4().hex
+        self.listener: Optional[asyncio.Task] = None
+        self.stats = {"l2_hits": 0, "l2_misses": 0, "invalidations_received": 0}
+        self.l2_namespaces: Dict[str, Dict[str, int]] = {}
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get value if not expired"""
+        value, is_stale = self.get_with_status(key)
+        return None if is_stale else value
+    
+    def get_with_status(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Get value as (value, is_stale), trying L1 then L2"""
+        return self.get_many([key])[key]
+    
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Tuple[Optional[Any], bool]]:
+        """
+        Get several values as {key: (value, is_stale)}, trying L1 then L2
+        
+        Keys L1 cannot answer fresh are read from L2 in a single batch
+        (one SQLite transaction or Redis pipeline).
+        """
+        results = self.l1.get_many(keys)
+        # Another worker may have stored a fresher copy
+        pending = [key for key, (value, is_stale) in results.items() if value is None or is_stale]
+        if not pending:
+            return results
+        
+        entries = self.l2.get_encoded_entries(pending)
+        current_time = time.time()
+        for key in pending:
+            entry = entries.get(key)
+            counters = self.l2_namespaces.setdefault(namespace_of(key), {"l2_hits": 0, "l2_misses": 0})
+            if entry is None or not decodable(entry[0]):
+                self.stats["l2_misses"] += 1
+                counters["l2_misses"] += 1
+                continue
+            self.stats["l2_hits"] += 1
+            counters["l2_hits"] += 1
+            data, expires_at, stale_until = entry
+            l2_value = decode(data)
+            if stale_until > current_time:
+                ttl = max(expires_at - current_time, 0)
+                stale_ttl = stale_until - max(expires_at, current_time)
+                # Encoded namespaces are copied as-is; the rest as the decoded value
+                if self.l1.codec_for(key) is not None:
+                    self.l1.set_encoded(key, data, ttl=ttl, stale_ttl=stale_ttl)
+                else:
+                    self.l1.set(key, l2_value, ttl=ttl, stale_ttl=stale_ttl)
+            results[key] = (l2_value, current_time >= expires_at)
+        return results
+    
+    def ttl_remaining(self, key: str) -> Optional[float]:
+        """Seconds until the entry goes stale (negative once stale, None if missing)"""
+        remaining = self.l1.ttl_remaining(key)
+        if remaining is not None and remaining > 0:
+            return remaining
+        l2_remaining = self.l2.ttl_remaining(key)
+        if l2_remaining is None:
+            return remaining
+        return l2_remaining if remaining is None else max(remaining, l2_remaining)
+    
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> None:
+        """Write through to both tiers"""
+        self.l1.set(key, value, ttl, stale_ttl, tags)
+        self.l2.set(key, value, ttl, stale_ttl, tags)
+    
+    def set_many(
+        self,
+        entries: Iterable[Tuple[str, Any, Optional[Iterable[str]]]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> None:
+        """Write several (key, value, tags) entries through to both tiers, one L2 batch"""
+        entries = list(entries)
+        self.l1.set_many(entries, ttl, stale_ttl)
+        self.l2.set_many(entries, ttl, stale_ttl)
+    
+    def delete(self, key: str) -> None:
+        """Delete from both tiers and from the other workers' L1"""
+        self.l1.delete(key)
+        self.l2.delete(key)
+        self.l2.publish_invalidation(self.origin, [key])
+    
+    def clear(self) -> None:
+        """Clear both tiers and the other workers' L1"""
+        self.l1.clear()
+        self.l2.clear()
+        self.l2.publish_invalidation(self.origin, None)
+    
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Delete tagged entries from both tiers and from the other workers' L1"""
+        tags = list(tags)
+        # L1 copies made by read-through or warm() carry no tags, so drop L2's keys too
+        keys = set(self.l1.invalidate_tags(tags)) | set(self.l2.invalidate_tags(tags))
+        for key in keys:
+            self.l1.delete(key)
+        if keys:
+            self.l2.publish_invalidation(self.origin, list(keys))
+        return list(keys)
+    
+    def size(self) -> int:
+        """Get number of entries in this worker's L1 (O(1); L2 counts are in get_stats())"""
+        return self.l1.size()
+    
+    def apply_invalidations(self) -> int:
+        """Drop L1 entries invalidated by other workers"""
+        invalidations = self.l2.poll_invalidations(self.origin)
+        for keys in invalidations:
+            if keys is None:
+                self.l1.clear()
+            else:
+                for key in keys:
+                    self.l1.delete(key)
+        self.stats["invalidations_received"] += len(invalidations)
+        return len(invalidations)
+    
+    def warm(self, limit: int) -> int:
+        """
+        Load the freshest shared entries into L1 (e.g. at startup)
+        
+        Returns:
+            Number of entries loaded
+        """
+        if not hasattr(self.l2, "load_entries"):
+            return 0
+        current_time = time.time()
+        entries = [entry for entry in self.l2.load_entries(limit) if decodable(entry[1])]
+        # Oldest first, so the freshest end up most recently used
+        for key, data, expires_at, stale_until in reversed(entries):
+            self.l1.set_encoded(
+                key, data,
+                ttl=max(expires_at - current_time, 0),
+                stale_ttl=stale_until - max(expires_at, current_time)
+            )
+        return len(entries)
+    
+    async def _listen(self) -> None:
+        while True:
+            try:
+                self.apply_invalidations()
+                if hasattr(self.l2, "compact") and time.monotonic() - self.last_compact >= self.compact_interval_seconds:
+                    self.last_compact = time.monotonic()
+                    self.l2.compact()
+                elif hasattr(self.l2, "cleanup_expired"):
+                    self.l2.cleanup_expired()
+            except Exception as e:
+                print(f"Cache invalidation poll failed: {e}")
+            await asyncio.sleep(self.poll_interval_seconds)
+    
+    def start_sweeper(self, interval_seconds: float = 1.0, batch: int = 1000) -> None:
+        """Start the L1 sweeper and the invalidation listener"""
+        self.l1.start_sweeper(interval_seconds, batch)
+        if self.listener is None:
+            self.listener = asyncio.create_task(self._listen())
+    
+    async def stop_sweeper(self) -> None:
+        """Stop the L1 sweeper and the invalidation listener"""
+        await self.l1.stop_sweeper()
+        if self.listener is not None:
+            self.listener.cancel()
+            try:
+                await self.listener
+            except asyncio.CancelledError:
+                pass
+            self.listener = None
+    
+    def get_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """Get L1 counters, L2 occupancy (counted now if exact) and tiering counters"""
+        return {**self.stats, "l1": self.l1.get_stats(), "l2": self.l2.get_stats(exact)}
+    
+    def record_load(self, namespace: str, seconds: float) -> None:
+        self.l1.record_load(namespace, seconds)
+    
+    def get_namespace_stats(self) -> Dict[str, Dict[str, Any]]:
+        """L1 namespace stats plus how often L1 misses were served from L2"""
+        stats = self.l1.get_namespace_stats()
+        for namespace, counters in self.l2_namespaces.items():
+            stats.setdefault(namespace, {}).update(counters)
+        return stats
@@ -0,0 +1,203 @@
+"""
+Cache value codecs
+Compact binary encodings for cached values, chosen per cache namespace
+
+msgpack, zstandard and lz4 are optional; without them a codec falls back
+to JSON and zlib. Encoded values carry a header byte describing how they
+were encoded, so decode() needs no configuration and also accepts plain
+JSON written before codecs existed. Values another worker encoded with a
+library this one lacks raise CodecUnavailableError; caches treat them as
+misses.
+"""
+
+import zlib
+from typing import Any, Dict, List, Optional
+
+from services import fastjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Header byte: 0b1000CCLM (C = compression, L = columnar, M = msgpack).
+# 0x80-0x8F never start UTF-8 text, so legacy JSON values are told apart.
+HEADER = 0x80
+MSGPACK = 0x01
+COLUMNAR = 0x02
+COMPRESSIONS = {"zlib": 1, "zstd": 2, "lz4": 3}
+
+class CodecUnavailableError(ValueError):
+    """A value needs msgpack, zstandard or lz4, which is not installed here"""
+    pass
+
+def _compress(name: str, data: bytes) -> bytes:
+    if name == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if name == "lz4":
+        return lz4_frame.compress(data)
+    return zlib.compress(data, 3)
+
+def _decompress(code: int, data: bytes) -> bytes:
+    if code == COMPRESSIONS["zstd"]:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if code == COMPRESSIONS["lz4"]:
+        return lz4_frame.decompress(data)
+    return zlib.decompress(data)
+
+def _to_columns(value: Any) -> Optional[Dict[str, Any]]:
+    """{"c": keys, "r": value rows} for a list of same-shaped dicts, else None"""
+    if not isinstance(value, list) or not value or not isinstance(value[0], dict):
+        return None
+    columns = list(value[0])
+    for row in value:
+        if not isinstance(row, dict) or list(row) != columns:
+            return None
+    return {"c": columns, "r": [list(row.values()) for row in value]}
+
+class Codec:
+    """
+    Encoding for the values of one cache namespace
+
+    Args:
+        format: "json" or "msgpack"
+        compression: None, "zlib", "zstd" or "lz4"
+        columnar: Store lists of same-shaped dicts (e.g. history series)
+            as one key list plus value rows
+        min_compress_bytes: Smaller payloads are stored uncompressed
+    """
+
+    def __init__(
+        self,
+        format: str = "json",
+        compression: Optional[str] = None,
+        columnar: bool = False,
+        min_compress_bytes: int = 256
+    ):
+        if format not in ("json", "msgpack"):
+            raise ValueError(f"Unknown cache codec format: {format}")
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+
+        if format == "msgpack" and msgpack is None:
+            print("msgpack not installed. Cache codec uses JSON instead.")
+            format = "json"
+        if (compression == "zstd" and zstandard is None) or (compression == "lz4" and lz4_frame is None):
+            print(f"{compression} not installed. Cache codec uses zlib instead.")
+            compression = "zlib"
+
+        self.format = format
+        self.compression = compression
+        self.columnar = columnar
+        self.min_compress_bytes = min_compress_bytes
+
+    def encode(self, value: Any) -> bytes:
+        """Encode a value to header-prefixed bytes"""
+        header = HEADER
+        if self.columnar:
+            columns = _to_columns(value)
+            if columns is not None:
+                value = columns
+                header |= COLUMNAR
+
+        if self.format == "msgpack":
+            data = msgpack.packb(value, default=str, use_bin_type=True)
+            header |= MSGPACK
+        else:
+            data = fastjson.dumps(value)
+
+        if self.compression and len(data) >= self.min_compress_bytes:
+            data = _compress(self.compression, data)
+            header |= COMPRESSIONS[self.compression] << 2
+
+        return bytes((header,)) + data
+
+    def __repr__(self) -> str:
+        parts = [self.format] + (["columnar"] if self.columnar else []) + ([self.compression] if self.compression else [])
+        return "+".join(parts)
+
+def _missing_library(header: int) -> Optional[str]:
+    """Optional library a header needs but this process lacks, if any"""
+    compression = (header >> 2) & 0x03
+    if header & MSGPACK and msgpack is None:
+        return "msgpack"
+    if compression == COMPRESSIONS["zstd"] and zstandard is None:
+        return "zstandard"
+    if compression == COMPRESSIONS["lz4"] and lz4_frame is None:
+        return "lz4"
+    return None
+
+def decodable(data: bytes) -> bool:
+    """Whether decode() can read these bytes in this process"""
+    return not data or data[0] & 0xF0 != HEADER or _missing_library(data[0]) is None
+
+def decode(data: bytes) -> Any:
+    """
+    Decode bytes written by any Codec (or plain JSON)
+
+    Raises:
+        CodecUnavailableError: The value needs a library that is not installed
+    """
+    if not data or data[0] & 0xF0 != HEADER:
+        return fastjson.loads(data)
+
+    header = data[0]
+    missing = _missing_library(header)
+    if missing:
+        raise CodecUnavailableError(f"Cached value needs {missing}, which is not installed")
+    body = memoryview(data)[1:]
+    compression = (header >> 2) & 0x03
+    if compression:
+        body = _decompress(compression, body)
+
+    if header & MSGPACK:
+        value = msgpack.unpackb(body, raw=False)
+    else:
+        value = fastjson.loads(bytes(body))
+
+    if header & COLUMNAR:
+        columns = value["c"]
+        return [dict(zip(columns, row)) for row in value["r"]]
+    return value
+
+def codec_for(codecs: Optional[Dict[str, Codec]], key: str) -> Optional[Codec]:
+    """Codec for a key's namespace (the part before the first ":")"""
+    if not codecs:
+        return None
+    return codecs.get(key.split(":", 1)[0])
+
+def parse_codecs(spec: str) -> Dict[str, Codec]:
+    """
+    Parse a per-namespace codec spec
+
+    Example: "history=msgpack+columnar+zstd;prices=msgpack"
+
+    Returns:
+        Dict mapping namespace to Codec
+    """
+    codecs: Dict[str, Codec] = {}
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        namespace, _, options = part.partition("=")
+        tokens: List[str] = [t.strip().lower() for t in options.split("+") if t.strip()]
+        compression = next((t for t in tokens if t in COMPRESSIONS), None)
+        unknown = [t for t in tokens if t not in ("json", "msgpack", "columnar") and t not in COMPRESSIONS]
+        if unknown:
+            raise ValueError(f"Unknown cache codec option(s) for {namespace.strip()}: {', '.join(unknown)}")
+        codecs[namespace.strip()] = Codec(
+            format="msgpack" if "msgpack" in tokens else "json",
+            compression=compression,
+            columnar="columnar" in tokens
+        )
+    return codecs
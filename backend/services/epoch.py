@@ -0,0 +1,88 @@
+"""
+Price epoch tracker
+Records when the underlying price data for a (region, item) pair changed
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+from threading import Lock
+
+from services import fastjson
+
+class PriceEpochs:
+    """
+    Monotonically increasing price version per (region, item)
+
+    Args:
+        max_fingerprints: Row fingerprints kept (least recently observed
+            are dropped; a dropped row bumps its item once when seen again)
+    """
+
+    def __init__(self, max_fingerprints: int = 200000):
+        self.epochs: Dict[Tuple[str, str], int] = {}
+        self.fingerprints: "OrderedDict[Tuple[str, str, Any, Any], str]" = OrderedDict()
+        self.max_fingerprints = max_fingerprints
+        self.global_epoch = 0
+        self.lock = Lock()
+
+    def get(self, region: str, item_id: str) -> int:
+        """Get current epoch for an item (0 if never seen)"""
+        with self.lock:
+            return self.epochs.get((region, item_id), 0)
+
+    def bump(self, region: str, item_ids: Iterable[str]) -> None:
+        """Mark the price data of the given items as changed"""
+        with self.lock:
+            for item_id in set(item_ids):
+                self.global_epoch += 1
+                self.epochs[(region, item_id)] = self.global_epoch
+
+    def observe(self, region: str, item_id: str, rows: List[Dict[str, Any]]) -> bool:
+        """
+        Record freshly fetched rows for an item, bumping its epoch only
+        if one of the rows differs from its last observation
+
+        Rows are fingerprinted per (city, quality), so fetches covering
+        different cities or qualities of the same item do not bump it.
+
+        Returns:
+            True if the epoch was bumped
+        """
+        fingerprints = [
+            (
+                (region, item_id, row.get("city"), row.get("quality")),
+                hashlib.md5(fastjson.dumps(row, sort_keys=True)).hexdigest()
+            )
+            for row in rows
+        ]
+
+        with self.lock:
+            changed = False
+            for key, fingerprint in fingerprints:
+                if self.fingerprints.get(key) != fingerprint:
+                    changed = True
+                    self.fingerprints[key] = fingerprint
+                self.fingerprints.move_to_end(key)
+            while len(self.fingerprints) > self.max_fingerprints:
+                self.fingerprints.popitem(last=False)
+            if not changed:
+                return False
+            self.global_epoch += 1
+            self.epochs[(region, item_id)] = self.global_epoch
+            return True
+
+    def signature(self, region: str, item_ids: Iterable[str]) -> str:
+        """
+        Get a version string covering a set of items
+
+        The signature changes whenever any of the items' epochs changes,
+        so it can be used as part of a derived-result cache key or ETag.
+        """
+        with self.lock:
+            versions = [
+                f"{item_id}={self.epochs.get((region, item_id), 0)}"
+                for item_id in sorted(set(item_ids))
+            ]
+        return hashlib.md5(f"{region}|{','.join(versions)}".encode()).hexdigest()
+
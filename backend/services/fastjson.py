@@ -0,0 +1,48 @@
+"""
+Fast JSON layer
+Uses orjson when it is installed and falls back to the stdlib json module
+"""
+
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON from bytes or str"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    Encode a value as compact UTF-8 JSON
+
+    Values JSON cannot represent natively (datetimes with the stdlib
+    backend, Decimals, ...) are encoded as strings.
+    """
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(value, default=str, option=option)
+    return json.dumps(
+        value,
+        default=str,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the fast JSON layer"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
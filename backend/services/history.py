@@ -0,0 +1,242 @@
+"""
+Market history service
+Fetches history for many items/cities at once and keeps completed buckets
+in the local market_history table
+"""
+
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_
+from database import MarketHistory
+from services.cache import city_tag, item_tag
+
+EPOCH = datetime(1970, 1, 1)
+
+class HistoryService:
+    """Batch market history with local persistence"""
+
+    def __init__(self, aodp_client, cache_manager):
+        self.aodp_client = aodp_client
+        self.cache = cache_manager
+
+    def _bucket_start(self, moment: datetime, timescale: int) -> datetime:
+        """Start of the UTC bucket containing `moment`"""
+        hours = int((moment - EPOCH).total_seconds() // 3600)
+        return EPOCH + timedelta(hours=hours - hours % timescale)
+
+    def _checked_key(self, region: str, item_id: str, city: str, timescale: int) -> str:
+        """Cache key marking that AODP has nothing newer for the current bucket"""
+        return f"history_checked:{region}:{item_id}:{city}:{timescale}"
+
+    async def get_history_batch(
+        self,
+        db: Session,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        timescales: List[int],
+        priority: str = "interactive"
+    ) -> Dict[str, Any]:
+        """
+        Get history for items x cities x timescales
+
+        Only (item, city, timescale) series missing their last completed
+        bucket are requested from AODP, so a completed bucket is never
+        fetched twice. Series AODP has nothing newer for are not asked
+        again until the current bucket completes.
+
+        Args:
+            db: Database session
+            region: Server region
+            items: List of item IDs
+            cities: List of city names
+            timescales: Time scales in hours (1, 6, 24)
+            priority: Traffic class for AODP requests
+
+        Returns:
+            Dict with "series" (one per item/city/quality/timescale, with
+            completed buckets and total traded volume) and "errors"
+        """
+        now = datetime.utcnow()
+        errors: List[Dict[str, Any]] = []
+        fetched_series = 0
+
+        for timescale in timescales:
+            current_bucket = self._bucket_start(now, timescale)
+            last_completed = current_bucket - timedelta(hours=timescale)
+
+            # Newest stored bucket per (item, city)
+            latest = {
+                (row.item_id, row.city): row.latest
+                for row in db.query(
+                    MarketHistory.item_id,
+                    MarketHistory.city,
+                    func.max(MarketHistory.timestamp).label('latest')
+                ).filter(
+                    and_(
+                        MarketHistory.region == region,
+                        MarketHistory.timescale == timescale,
+                        MarketHistory.item_id.in_(items),
+                        MarketHistory.city.in_(cities)
+                    )
+                ).group_by(MarketHistory.item_id, MarketHistory.city).all()
+            }
+
+            pending = [
+                (item_id, city)
+                for item_id in items
+                for city in cities
+                if (latest.get((item_id, city)) is None or latest[(item_id, city)] < last_completed)
+                and self.cache.get(self._checked_key(region, item_id, city, timescale)) is None
+            ]
+            if not pending:
+                continue
+
+            fetch_items = list(dict.fromkeys(item_id for item_id, _ in pending))
+            fetch_cities = list(dict.fromkeys(city for _, city in pending))
+            result = await self.aodp_client.fetch_history_batch(
+                region, fetch_items, fetch_cities, timescale, priority
+            )
+            errors.extend({**error, "timescale": timescale} for error in result["errors"])
+            fetched_series += len(result["data"])
+            self._store(db, region, timescale, result["data"], current_bucket)
+
+            # Don't ask again for series AODP has nothing newer for until the bucket completes
+            failed_items = {item_id for error in result["errors"] for item_id in error["items"]}
+            ttl = max(1, int((current_bucket + timedelta(hours=timescale) - now).total_seconds()))
+            for item_id, city in pending:
+                if item_id not in failed_items:
+                    self.cache.set(
+                        self._checked_key(region, item_id, city, timescale), True, ttl=ttl, stale_ttl=0,
+                        tags=(item_tag(region, item_id), city_tag(region, city))
+                    )
+
+        return {
+            "series": self._load_series(db, region, items, cities, timescales),
+            "errors": errors,
+            "fetched_series": fetched_series
+        }
+
+    def get_stored_history(
+        self,
+        db: Session,
+        region: str,
+        item_id: str,
+        city: str,
+        timescale: int
+    ) -> List[Dict[str, Any]]:
+        """Stored buckets of one item/city series (lowest quality), for degraded mode"""
+        series = self._load_series(db, region, [item_id], [city], [timescale])
+        return series[0]['data'] if series else []
+
+    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value.replace('Z', ''))
+        except ValueError:
+            return None
+
+    def _store(
+        self,
+        db: Session,
+        region: str,
+        timescale: int,
+        series: List[Dict[str, Any]],
+        current_bucket: datetime
+    ) -> int:
+        """Insert completed buckets that are not stored yet"""
+        if not series:
+            return 0
+
+        items = list({entry.get('item_id') for entry in series})
+        existing = {
+            (row.item_id, row.city, row.quality, row.timestamp)
+            for row in db.query(
+                MarketHistory.item_id,
+                MarketHistory.city,
+                MarketHistory.quality,
+                MarketHistory.timestamp
+            ).filter(
+                and_(
+                    MarketHistory.region == region,
+                    MarketHistory.timescale == timescale,
+                    MarketHistory.item_id.in_(items)
+                )
+            ).all()
+        }
+
+        inserted = 0
+        for entry in series:
+            item_id = entry.get('item_id')
+            city = entry.get('location')
+            quality = entry.get('quality', 0)
+            for point in entry.get('data', []):
+                timestamp = self._parse_timestamp(point.get('timestamp'))
+                # The current bucket is still changing, keep only completed ones
+                if timestamp is None or timestamp >= current_bucket:
+                    continue
+                key = (item_id, city, quality, timestamp)
+                if key in existing:
+                    continue
+                existing.add(key)
+                db.add(MarketHistory(
+                    region=region,
+                    city=city,
+                    item_id=item_id,
+                    quality=quality,
+                    timescale=timescale,
+                    timestamp=timestamp,
+                    item_count=point.get('item_count', 0),
+                    avg_price=point.get('avg_price')
+                ))
+                inserted += 1
+
+        db.commit()
+        return inserted
+
+    def _load_series(
+        self,
+        db: Session,
+        region: str,
+        items: List[str],
+        cities: List[str],
+        timescales: List[int]
+    ) -> List[Dict[str, Any]]:
+        """Read stored buckets grouped into series"""
+        rows = db.query(MarketHistory).filter(
+            and_(
+                MarketHistory.region == region,
+                MarketHistory.item_id.in_(items),
+                MarketHistory.city.in_(cities),
+                MarketHistory.timescale.in_(timescales)
+            )
+        ).order_by(
+            MarketHistory.item_id,
+            MarketHistory.city,
+            MarketHistory.quality,
+            MarketHistory.timescale,
+            MarketHistory.timestamp
+        ).all()
+
+        series: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.item_id, row.city, row.quality, row.timescale)
+            if key not in series:
+                series[key] = {
+                    'item_id': row.item_id,
+                    'city': row.city,
+                    'quality': row.quality,
+                    'timescale': row.timescale,
+                    'total_item_count': 0,
+                    'data': []
+                }
+            series[key]['total_item_count'] += row.item_count or 0
+            series[key]['data'].append({
+                'timestamp': row.timestamp.isoformat(),
+                'item_count': row.item_count,
+                'avg_price': row.avg_price
+            })
+
+        return list(series.values())
@@ -7,13 +7,16 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_, or_
 from database import MarketTick, IngestStats
+from services.cache import item_tag
 import json
 
 class IngestService:
     """Service for handling private market data ingestion"""
     
-    def __init__(self):
+    def __init__(self, epochs=None, cache=None):
         self.source_priority = ['PRIVATE', 'AODP']  # Priority order
+        self.epochs = epochs
+        self.cache = cache
     
     def ingest_adc_data(self, db: Session, records: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -31,8 +34,10 @@ class IngestService:
             'inserted': 0,
             'updated': 0,
             'duplicates': 0,
+            'cache_invalidated': 0,
             'errors': []
         }
+        changed = set()
         
         for record in records:
             try:
@@ -59,12 +64,14 @@ class IngestService:
                         existing.buy_price_max = market_tick.buy_price_max
                         existing.ingested_at = datetime.utcnow()
                         stats['updated'] += 1
+                        changed.add((market_tick.region, market_tick.item_id))
                     else:
                         stats['duplicates'] += 1
                 else:
                     # Insert new record
                     db.add(market_tick)
                     stats['inserted'] += 1
+                    changed.add((market_tick.region, market_tick.item_id))
                     
             except Exception as e:
                 stats['errors'].append({
@@ -78,6 +85,16 @@ class IngestService:
         # Commit changes
         db.commit()
         
+        # Bump price epochs for everything that changed
+        if self.epochs is not None:
+            for region, item_id in changed:
+                self.epochs.bump(region, [item_id])
+        
+        # Drop cached responses for the changed items so fresh data shows up now
+        if self.cache is not None and changed:
+            invalidated = self.cache.invalidate_tags(item_tag(region, item_id) for region, item_id in changed)
+            stats['cache_invalidated'] = len(invalidated)
+        
         return stats
     
     def _parse_adc_record(self, record: Dict[str, Any]) -> MarketTick:
@@ -121,7 +138,7 @@ class IngestService:
         stats = db.query(IngestStats).filter(IngestStats.source == source).first()
         
         if not stats:
-            stats = IngestStats(source=source)
+            stats = IngestStats(source=source, total_records=0, daily_records=0)
             db.add(stats)
         
         stats.last_ingest_at = datetime.utcnow()
@@ -135,56 +152,144 @@ class IngestService:
         region: str,
         cities: List[str],
         items: List[str],
-        max_age_hours: int = 12
+        max_age_hours: int = 12,
+        qualities: Optional[List[int]] = None,
+        quality_mode: str = 'exact'
     ) -> List[Dict[str, Any]]:
         """
         Get best available market snapshot, preferring PRIVATE over AODP
         
+        All (item, city, quality) combinations are loaded in a single query
+        and resolved in memory.
+        
         Args:
             db: Database session
             region: Server region
             cities: List of cities
             items: List of item IDs
             max_age_hours: Maximum age of data
+            qualities: List of quality levels (defaults to [0])
+            quality_mode: 'exact' to match each quality exactly, 'at_least'
+                to resolve each quality Q to the best offer at quality >= Q
             
         Returns:
             List of best available price records
         """
+        qualities = qualities or [0]
         cutoff_time = datetime.utcnow() - timedelta(hours=max_age_hours)
-        results = []
         
+        filters = [
+            MarketTick.source.in_(self.source_priority),
+            MarketTick.region == region,
+            MarketTick.city.in_(cities),
+            MarketTick.item_id.in_(items),
+            MarketTick.timestamp >= cutoff_time
+        ]
+        if quality_mode == 'at_least':
+            filters.append(MarketTick.quality >= min(qualities))
+        else:
+            filters.append(MarketTick.quality.in_(qualities))
+        
+        ticks = db.query(MarketTick).filter(and_(*filters)).order_by(
+            MarketTick.timestamp.desc()
+        ).all()
+        
+        # Keep the newest tick of the highest priority source per key
+        best: Dict[tuple, MarketTick] = {}
+        for tick in ticks:
+            key = (tick.item_id, tick.city, tick.quality)
+            current = best.get(key)
+            if current is None or (
+                self.source_priority.index(tick.source) <
+                self.source_priority.index(current.source)
+            ):
+                best[key] = tick
+        
+        records: Dict[tuple, Dict[int, Dict[str, Any]]] = {}
+        for (item_id, city, quality), tick in best.items():
+            records.setdefault((item_id, city), {})[quality] = self._tick_to_dict(tick)
+        
+        results = []
         for city in cities:
             for item_id in items:
-                # Try to get PRIVATE data first
-                private_tick = db.query(MarketTick).filter(
-                    and_(
-                        MarketTick.source == 'PRIVATE',
-                        MarketTick.region == region,
-                        MarketTick.city == city,
-                        MarketTick.item_id == item_id,
-                        MarketTick.timestamp >= cutoff_time
-                    )
-                ).order_by(MarketTick.timestamp.desc()).first()
-                
-                if private_tick:
-                    results.append(self._tick_to_dict(private_tick))
-                else:
-                    # Fallback to AODP data
-                    aodp_tick = db.query(MarketTick).filter(
-                        and_(
-                            MarketTick.source == 'AODP',
-                            MarketTick.region == region,
-                            MarketTick.city == city,
-                            MarketTick.item_id == item_id,
-                            MarketTick.timestamp >= cutoff_time
-                        )
-                    ).order_by(MarketTick.timestamp.desc()).first()
+                by_quality = records.get((item_id, city), {})
+                for quality in qualities:
+                    if quality_mode == 'at_least':
+                        record = self._resolve_min_quality(by_quality, quality)
+                    else:
+                        record = by_quality.get(quality)
                     
-                    if aodp_tick:
-                        results.append(self._tick_to_dict(aodp_tick))
+                    if record:
+                        results.append(record)
         
         return results
     
+    def resolve_min_quality(
+        self,
+        prices: List[Dict[str, Any]],
+        qualities: List[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Resolve price records to the best offer at or above each quality
+        
+        Args:
+            prices: Price records covering qualities >= min(qualities)
+            qualities: Requested minimum quality levels
+            
+        Returns:
+            One record per (item, city, requested quality) that has data
+        """
+        records: Dict[tuple, Dict[int, Dict[str, Any]]] = {}
+        for price in prices:
+            key = (price.get('item_id'), price.get('city'))
+            records.setdefault(key, {})[price.get('quality', 0)] = price
+        
+        results = []
+        for by_quality in records.values():
+            for quality in qualities:
+                record = self._resolve_min_quality(by_quality, quality)
+                if record:
+                    results.append(record)
+        
+        return results
+    
+    def _resolve_min_quality(
+        self,
+        by_quality: Dict[int, Dict[str, Any]],
+        min_quality: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Resolve the buy and sell side of one (item, city) at quality >= min_quality
+        
+        Buy side (sell_price_min): the cheapest sell offer at quality >= min_quality.
+        Sell side (buy_price_*): the buy orders for exactly min_quality, the only
+        ones guaranteed to accept any item at or above it.
+        """
+        candidates = [
+            record for quality, record in by_quality.items()
+            if quality >= min_quality
+        ]
+        if not candidates:
+            return None
+        
+        # Cheapest sell order wins; without sell orders fall back to the lowest quality
+        best = min(
+            candidates,
+            key=lambda r: (
+                not r.get('sell_price_min'),
+                r.get('sell_price_min') or 0,
+                r.get('quality', 0)
+            )
+        )
+        record = best.copy()
+        record['requested_quality'] = min_quality
+        
+        sell_side = by_quality.get(min_quality) or {}
+        for field in ('buy_price_min', 'buy_price_max', 'buy_price_min_date', 'buy_price_max_date'):
+            if field in record or field in sell_side:
+                record[field] = sell_side.get(field)
+        return record
+    
     def _tick_to_dict(self, tick: MarketTick) -> Dict[str, Any]:
         """Convert MarketTick to dictionary with age calculation"""
         age_hours = (datetime.utcnow() - tick.timestamp).total_seconds() / 3600
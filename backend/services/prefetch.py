@@ -0,0 +1,176 @@
+"""
+Background price prefetch scheduler
+Keeps a watchlist of items/cities/qualities warm in the AODP cache
+"""
+
+import asyncio
+import heapq
+from typing import Any, Dict, List, Optional, Tuple
+
+WatchKey = Tuple[str, str, str, int]  # (region, item_id, city, quality)
+
+class PrefetchScheduler:
+    """
+    Refreshes watched prices before they expire, most valuable first
+
+    The watchlist combines static entries (e.g. a whole category from
+    ALBION_ITEMS) with entries learned from recent user requests. Each cycle
+    ranks due entries by staleness x expected value and refreshes as many as
+    the prefetch budget allows, skipping the cycle entirely while interactive
+    traffic is using the rate limit of the region's AODP host.
+    """
+
+    def __init__(
+        self,
+        aodp_client,
+        interval_seconds: int = 60,
+        budget_fraction: float = 0.5,
+        refresh_ahead_fraction: float = 0.2,
+        headroom_fraction: float = 0.5,
+        max_learned: int = 2000,
+        learn_decay: float = 0.98
+    ):
+        self.aodp_client = aodp_client
+        # Staleness is read from the in-process tier only, so a cycle never
+        # blocks the event loop on one Redis/SQLite round trip per watch key
+        self.cache = getattr(aodp_client.cache, "l1", aodp_client.cache)
+        self.interval_seconds = interval_seconds
+        self.budget_fraction = budget_fraction
+        self.refresh_ahead_fraction = refresh_ahead_fraction
+        self.headroom_fraction = headroom_fraction
+        self.max_learned = max_learned
+        self.learn_decay = learn_decay
+
+        self.static: Dict[WatchKey, float] = {}
+        self.learned: Dict[WatchKey, float] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {"cycles": 0, "skipped_cycles": 0, "requests": 0, "entries_refreshed": 0}
+
+    def watch(self, region: str, items: List[str], cities: List[str], qualities: List[int], weight: float = 1.0) -> None:
+        """Add static watchlist entries"""
+        for item_id in items:
+            for city in cities:
+                for quality in qualities:
+                    self.static[(region, item_id, city, quality)] = weight
+
+    def record_request(self, region: str, items: List[str], cities: List[str], qualities: List[int]) -> None:
+        """Learn from a user request: every requested combination gains value"""
+        for item_id in items:
+            for city in cities:
+                for quality in qualities:
+                    key = (region, item_id, city, quality)
+                    self.learned[key] = self.learned.get(key, 0.0) + 1.0
+
+        # Keep only the most requested entries; evicting a tenth at once
+        # means the selection runs once per many new keys, not on every call
+        if len(self.learned) > self.max_learned:
+            excess = len(self.learned) - self.max_learned + self.max_learned // 10
+            for key, _ in heapq.nsmallest(excess, self.learned.items(), key=lambda kv: kv[1]):
+                del self.learned[key]
+
+    def _expected_value(self, key: WatchKey) -> float:
+        return self.static.get(key, 0.0) + self.learned.get(key, 0.0)
+
+    def _staleness(self, key: WatchKey) -> Optional[float]:
+        """
+        Staleness in [0, 1+] or None if the entry is not due yet
+
+        Missing entries count as fully stale; entries within the last
+        refresh_ahead_fraction of their TTL become due and grow staler.
+        """
+        remaining = self.cache.ttl_remaining(self.aodp_client._price_cache_key(*key))
+        if remaining is None:
+            return 1.0
+
+        ttl = self.cache.ttl_seconds
+        if remaining > ttl * self.refresh_ahead_fraction:
+            return None
+        return 1.0 - remaining / ttl
+
+    def due_entries(self) -> List[Tuple[float, WatchKey]]:
+        """Watchlist entries that need a refresh, highest priority first"""
+        due = []
+        for key in set(self.static) | set(self.learned):
+            staleness = self._staleness(key)
+            if staleness is not None:
+                due.append((staleness * self._expected_value(key), key))
+        due.sort(key=lambda entry: entry[0], reverse=True)
+        return due
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Run a single prefetch cycle"""
+        self.stats["cycles"] += 1
+
+        # Group due entries by region, keeping priority order of items
+        by_region: Dict[str, Dict[str, Any]] = {}
+        for _, (region, item_id, city, quality) in self.due_entries():
+            group = by_region.setdefault(region, {"items": {}, "cities": {}, "qualities": {}})
+            group["items"][item_id] = None
+            group["cities"][city] = None
+            group["qualities"][quality] = None
+
+        requests = 0
+        entries = 0
+        skipped = 0
+        for region, group in by_region.items():
+            # Leave the region host's rate limit to interactive traffic when it is busy
+            limiter = self.aodp_client.region_rate_limiter(region)
+            if limiter.available() < limiter.capacity * self.headroom_fraction:
+                skipped += 1
+                continue
+
+            # Requests this cycle may spend (the limiter's rate can change at runtime)
+            budget = max(1, int(limiter.max_requests * self.budget_fraction * self.interval_seconds / 60))
+            cities = list(group["cities"])
+            qualities = sorted(group["qualities"])
+            chunks = self.aodp_client.plan_price_chunks(region, list(group["items"]), cities, qualities)[:budget]
+            items = [item_id for chunk in chunks for item_id in chunk]
+
+            result = await self.aodp_client.refresh_prices(region, items, cities, qualities, priority="background")
+            requests += len(chunks)
+            entries += result["rows"]
+
+        if by_region and skipped == len(by_region):
+            self.stats["skipped_cycles"] += 1
+
+        # Older interest slowly fades
+        for key in self.learned:
+            self.learned[key] *= self.learn_decay
+
+        self.stats["requests"] += requests
+        self.stats["entries_refreshed"] += entries
+        return {"requests": requests, "entries": entries}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Prefetch cycle failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background prefetch loop"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background prefetch loop"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler counters and watchlist size"""
+        return {
+            **self.stats,
+            "running": self.task is not None,
+            "static_entries": len(self.static),
+            "learned_entries": len(self.learned)
+        }
@@ -7,6 +7,19 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this many price rows the plain loop beats building arrays
+VECTORIZE_MIN_ROWS = 64
+
+def pair_quality(price: Dict[str, Any]) -> Any:
+    """Quality two price records must share to form a route (requested one in at_least mode)"""
+    return price.get("requested_quality", price.get("quality", 0))
+
+
 class PricingCalculator:
     """Calculate profit opportunities and apply filters"""
     
@@ -74,6 +87,54 @@ class PricingCalculator:
         
         return filtered
     
+    def align_regions(
+        self,
+        prices_by_region: Dict[str, List[Dict[str, Any]]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """
+        Align price rows of several regions by (item, city, quality)
+        
+        Args:
+            prices_by_region: Age-filtered price rows per region
+        
+        Returns:
+            Tuple of (one row per item/city/quality with a "regions" dict of
+            per-region prices and ages, per-region age summary)
+        """
+        aligned: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+        summaries: Dict[str, Dict[str, Any]] = {}
+        
+        for region, prices in prices_by_region.items():
+            ages = []
+            for price in prices:
+                key = (price.get("item_id", ""), price.get("city", ""), price.get("quality", 0))
+                if key not in aligned:
+                    aligned[key] = {"item_id": key[0], "city": key[1], "quality": key[2], "regions": {}}
+                age = price.get("age_hours")
+                if age is None:
+                    age = min(
+                        self.calculate_age_hours(price.get("sell_price_min_date")),
+                        self.calculate_age_hours(price.get("buy_price_max_date"))
+                    )
+                aligned[key]["regions"][region] = {
+                    "sell_price_min": price.get("sell_price_min"),
+                    "sell_price_min_date": price.get("sell_price_min_date"),
+                    "buy_price_max": price.get("buy_price_max"),
+                    "buy_price_max_date": price.get("buy_price_max_date"),
+                    "age_hours": round(age, 2)
+                }
+                ages.append(age)
+            
+            summaries[region] = {
+                "rows": len(prices),
+                "newest_age_hours": round(min(ages), 2) if ages else None,
+                "oldest_age_hours": round(max(ages), 2) if ages else None,
+                "avg_age_hours": round(sum(ages) / len(ages), 2) if ages else None
+            }
+        
+        rows = sorted(aligned.values(), key=lambda r: (r["item_id"], r["city"], r["quality"]))
+        return rows, summaries
+    
     def calculate_transaction_tax(self, amount: float, is_premium: bool) -> float:
         """
         Calculate transaction tax
@@ -126,23 +187,111 @@ class PricingCalculator:
         premium: bool,
         setup_fee: float,
         transport_cost: float = 0,
-        prefer_caerleon: bool = False
+        prefer_caerleon: bool = False,
+        top_k: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Calculate all profitable opportunities from price data
+        
+        With top_k, the NumPy engine ranks every route in arrays and only
+        builds dicts for the returned ones (when numpy is installed and the
+        input is large enough). Listing all routes always uses the loop:
+        building one dict per route dominates there and NumPy saves nothing.
+        
+        Args:
+            prices: Price rows (item_id, city, quality, sell_price_min, buy_price_max, ...)
+            premium: Premium account (4% instead of 8% sales tax)
+            setup_fee: Order setup fee rate
+            transport_cost: Flat cost per trade
+            prefer_caerleon: Boost Caerleon routes by 10% for sorting
+            top_k: Only return the best top_k routes, sorted by profit
+                percentage then absolute profit (descending, unrounded)
+        
+        Returns:
+            Opportunities in item/quality/city order, or the top_k best
         """
-        opportunities = []
+        if top_k is not None and np is not None and len(prices) >= VECTORIZE_MIN_ROWS:
+            opportunities = self._calculate_opportunities_vectorized(
+                prices, premium, setup_fee, transport_cost, prefer_caerleon, top_k
+            )
+            if opportunities is not None:
+                return opportunities
         
-        # Group prices by item and quality
+        return self._calculate_opportunities_loop(
+            prices, premium, setup_fee, transport_cost, prefer_caerleon, top_k
+        )
+    
+    def _group_prices(self, prices: List[Dict[str, Any]]) -> Dict[str, Dict[Any, Dict[str, Dict[str, Any]]]]:
+        """Group prices by item, then (requested) quality, then city (first-seen order)"""
         price_map = defaultdict(lambda: defaultdict(dict))
         for price in prices:
             item_id = price.get("item_id", "")
             city = price.get("city", "")
-            quality = price.get("quality", 0)
+            quality = pair_quality(price)
             price_map[item_id][quality][city] = price
+        return price_map
+    
+    def _opportunity(
+        self,
+        item_id: str,
+        quality: Any,
+        buy_city: str,
+        sell_city: str,
+        buy_data: Dict[str, Any],
+        sell_data: Dict[str, Any],
+        absolute_profit: float,
+        profit_percentage: float,
+        premium: bool,
+        setup_fee: float,
+        transport_cost: float,
+        prefer_caerleon: bool
+    ) -> Dict[str, Any]:
+        """Build the opportunity dict for one profitable route"""
+        is_caerleon_route = "Caerleon" in buy_city or "Caerleon" in sell_city
+        
+        opportunity = {
+            "item_id": item_id,
+            "item_name": self.item_names.get(item_id, item_id),
+            "quality": quality,
+            "buy_city": buy_city,
+            "sell_city": sell_city,
+            "buy_price": buy_data.get("sell_price_min"),
+            "sell_price": sell_data.get("buy_price_max"),
+            "buy_timestamp": buy_data.get("sell_price_min_date", ""),
+            "sell_timestamp": sell_data.get("buy_price_max_date", ""),
+            "fees_percentage": (0.04 if premium else 0.08) + setup_fee,
+            "setup_fee_percentage": setup_fee,
+            "transport_cost": transport_cost,
+            "profit_absolute": round(absolute_profit, 2),
+            "profit_percentage": round(profit_percentage, 2),
+            "is_caerleon_route": is_caerleon_route,
+            "data_age_hours": max(
+                buy_data.get("age_hours", 0),
+                sell_data.get("age_hours", 0)
+            )
+        }
+        
+        # Apply Caerleon preference
+        if prefer_caerleon and is_caerleon_route:
+            opportunity["profit_percentage"] *= 1.1  # 10% boost for sorting
+        
+        return opportunity
+    
+    def _calculate_opportunities_loop(
+        self,
+        prices: List[Dict[str, Any]],
+        premium: bool,
+        setup_fee: float,
+        transport_cost: float = 0,
+        prefer_caerleon: bool = False,
+        top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Reference implementation: check every city pair one by one"""
+        opportunities = []
+        ranking = []
         
         # Calculate opportunities for each item and quality
-        for item_id, quality_data in price_map.items():
+        for item_id, quality_data in self._group_prices(prices).items():
             for quality, city_prices in quality_data.items():
                 cities = list(city_prices.keys())
                 
@@ -178,34 +327,119 @@ class PricingCalculator:
                         
                         # Only include profitable opportunities
                         if absolute_profit > 0:
-                            is_caerleon_route = "Caerleon" in buy_city or "Caerleon" in sell_city
-                            
-                            opportunity = {
-                                "item_id": item_id,
-                                "item_name": self.item_names.get(item_id, item_id),
-                                "quality": quality,
-                                "buy_city": buy_city,
-                                "sell_city": sell_city,
-                                "buy_price": buy_price,
-                                "sell_price": sell_price,
-                                "buy_timestamp": buy_data.get("sell_price_min_date", ""),
-                                "sell_timestamp": sell_data.get("buy_price_max_date", ""),
-                                "fees_percentage": (0.04 if premium else 0.08) + setup_fee,
-                                "setup_fee_percentage": setup_fee,
-                                "transport_cost": transport_cost,
-                                "profit_absolute": round(absolute_profit, 2),
-                                "profit_percentage": round(profit_percentage, 2),
-                                "is_caerleon_route": is_caerleon_route,
-                                "data_age_hours": max(
-                                    buy_data.get("age_hours", 0),
-                                    sell_data.get("age_hours", 0)
-                                )
-                            }
-                            
-                            # Apply Caerleon preference
-                            if prefer_caerleon and is_caerleon_route:
-                                opportunity["profit_percentage"] *= 1.1  # 10% boost for sorting
-                            
+                            opportunity = self._opportunity(
+                                item_id, quality, buy_city, sell_city, buy_data, sell_data,
+                                absolute_profit, profit_percentage,
+                                premium, setup_fee, transport_cost, prefer_caerleon
+                            )
+                            if top_k is not None:
+                                if prefer_caerleon and opportunity["is_caerleon_route"]:
+                                    profit_percentage *= 1.1
+                                ranking.append((-profit_percentage, -absolute_profit, len(opportunities)))
                             opportunities.append(opportunity)
         
-        return opportunities
\ No newline at end of file
+        if top_k is not None:
+            # Ranked on unrounded values; ties keep the item/quality/city order
+            opportunities = [opportunities[n] for _, _, n in sorted(ranking)[:top_k]]
+        return opportunities
+    
+    def _calculate_opportunities_vectorized(
+        self,
+        prices: List[Dict[str, Any]],
+        premium: bool,
+        setup_fee: float,
+        transport_cost: float = 0,
+        prefer_caerleon: bool = False,
+        top_k: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        NumPy engine: every buy x sell city pair of every item/quality at once
+        
+        Price columns are factorized with np.unique into (group, city) arrays,
+        one group per (item, quality) present in the input, and the profit of
+        all routes is computed as one (group, buy city, sell city) tensor.
+        Masking and top_k ranking stay in NumPy; dicts are only built for
+        returned routes.
+        
+        Returns:
+            Same as the loop, or None if some price or key cannot be packed
+        """
+        count = len(prices)
+        if not count:
+            return []
+        try:
+            item_codes = np.unique(np.array([p.get("item_id", "") for p in prices]), return_inverse=True)[1]
+            quality_codes = np.unique(np.array([pair_quality(p) for p in prices]), return_inverse=True)[1]
+            city_names, city_codes = np.unique(np.array([p.get("city", "") for p in prices]), return_inverse=True)
+            buy_values = np.array([p.get("sell_price_min") or 0 for p in prices], dtype=np.float64)
+            sell_values = np.array([p.get("buy_price_max") or 0 for p in prices], dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+        item_codes, quality_codes, city_codes = item_codes.ravel(), quality_codes.ravel(), city_codes.ravel()
+        city_count = len(city_names)
+        
+        # Groups in loop order: items as first seen, then qualities as first seen in the item
+        group_keys, group_first, group_codes = np.unique(
+            item_codes * (quality_codes.max() + 1) + quality_codes, return_index=True, return_inverse=True
+        )
+        item_first = np.unique(item_codes, return_index=True)[1]
+        group_order = np.lexsort((group_first, item_first[item_codes[group_first]]))
+        group_rank = np.empty(len(group_keys), dtype=np.int64)
+        group_rank[group_order] = np.arange(len(group_keys))
+        group_rows = group_first[group_order]
+        
+        # One cell per (group, city): the last row wins, like the loop's dict,
+        # but the city is visited where the group first saw it
+        cells = group_rank[group_codes.ravel()] * city_count + city_codes
+        cell_keys, cell_first = np.unique(cells, return_index=True)
+        cell_last = count - 1 - np.unique(cells[::-1], return_index=True)[1]
+        cell_group, cell_city = cell_keys // city_count, cell_keys % city_count
+        
+        # Dense (group, city) arrays; cities a group has no row for stay at 0
+        shape = (len(group_keys), city_count)
+        buy = np.zeros(shape)
+        sell = np.zeros(shape)
+        row = np.zeros(shape, dtype=np.int64)
+        position = np.zeros(shape, dtype=np.int64)
+        buy[cell_group, cell_city] = buy_values[cell_last]
+        sell[cell_group, cell_city] = sell_values[cell_last]
+        row[cell_group, cell_city] = cell_last
+        position[cell_group, cell_city] = cell_first
+        
+        # Same operation order as calculate_profit, so floats match exactly
+        b = buy[:, :, None]
+        s = sell[:, None, :]
+        buy_cost = b + b * setup_fee
+        revenue = s - s * (0.04 if premium else 0.08) - s * setup_fee
+        profit = revenue - buy_cost - transport_cost
+        with np.errstate(divide="ignore", invalid="ignore"):
+            percentage = np.where(buy_cost > 0, profit / buy_cost * 100, 0.0)
+        
+        mask = (b > 0) & (s > 0) & (s > b) & (profit > 0)
+        mask &= ~np.eye(city_count, dtype=bool)
+        g, i, j = np.nonzero(mask)
+        
+        # Loop order: group, then buy city, then sell city as first seen in the group
+        order = np.lexsort((position[g, j], position[g, i], g))
+        g, i, j = g[order], i[order], j[order]
+        
+        if top_k is not None:
+            # Unrounded, like the loop; lexsort is stable so ties keep loop order
+            ranked_percentage = percentage[g, i, j]
+            if prefer_caerleon:
+                caerleon = np.char.find(city_names, "Caerleon") >= 0
+                ranked_percentage = np.where(caerleon[i] | caerleon[j], ranked_percentage * 1.1, ranked_percentage)
+            best = np.lexsort((-profit[g, i, j], -ranked_percentage))[:top_k]
+            g, i, j = g[best], i[best], j[best]
+        
+        opportunities = []
+        for g_, i_, j_ in zip(g.tolist(), i.tolist(), j.tolist()):
+            group_row = prices[group_rows[g_]]
+            buy_data, sell_data = prices[row[g_, i_]], prices[row[g_, j_]]
+            opportunities.append(self._opportunity(
+                group_row.get("item_id", ""), pair_quality(group_row),
+                buy_data.get("city", ""), sell_data.get("city", ""), buy_data, sell_data,
+                float(profit[g_, i_, j_]), float(percentage[g_, i_, j_]),
+                premium, setup_fee, transport_cost, prefer_caerleon
+            ))
+        return opportunities
@@ -0,0 +1,73 @@
+"""
+Response cache
+Pre-encoded endpoint responses with strong ETags and If-None-Match handling
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi.responses import Response
+
+from services import fastjson
+from services.cache import CacheManager
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+class ResponseCache(CacheManager):
+    """
+    CacheManager holding (etag, body) pairs of already encoded responses
+
+    Keys combine the endpoint, the normalized request body and a data
+    version (the price epoch signature of the requested items), so a hit
+    is served as stored bytes and new data changes the key. The TTL bounds
+    how long a response is reused while nothing refetches its prices.
+
+    Responses can carry the item and city tags of their request, so
+    invalidate_tags() drops them along with the underlying cached data.
+    """
+
+    def _estimate_size(self, key: str, value: Tuple[str, bytes]) -> int:
+        etag, body = value
+        return len(key) + len(etag) + len(body)
+
+    def make_key(self, endpoint: str, params: Dict[str, Any], version: str) -> str:
+        """Cache key for an endpoint call (endpoint is the stats namespace)"""
+        normalized = fastjson.dumps(params, sort_keys=True)
+        return f"{endpoint}:{hashlib.md5(normalized + version.encode()).hexdigest()}"
+
+    def lookup(self, key: str, if_none_match: Optional[str] = None) -> Optional[Response]:
+        """
+        Serve a cached response
+
+        Returns:
+            304 if the client already has it, the stored bytes otherwise,
+            or None on a miss
+        """
+        cached = self.get(key)
+        if cached is None:
+            return None
+        etag, body = cached
+        if _etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag, "X-Cache": "HIT"})
+
+    def store(
+        self,
+        key: str,
+        response: Response,
+        if_none_match: Optional[str] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> Response:
+        """Cache a freshly rendered response (with invalidation tags) and give it its ETag"""
+        etag = f'"{hashlib.md5(response.body).hexdigest()}"'
+        self.set(key, (etag, response.body), tags=tags)
+        if _etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,30 @@
+"""
+Shared test helpers
+Fake AODP transport and responses used by the client, prefetch and history tests
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services.aodp_client import AODPClient
+from services.cache import CacheManager
+
+def make_client(handler, **kwargs):
+    """Build an AODPClient whose HTTP calls are served by `handler`"""
+    return AODPClient(
+        "https://west.albion-online-data.com", CacheManager(), 6000,
+        transport=httpx.MockTransport(handler), **kwargs
+    )
+
+def price_rows(request):
+    """Fake AODP prices response: one row per item in the request path"""
+    items = request.url.path.rsplit("/", 1)[-1][:-len(".json")].split(",")
+    cities = request.url.params["locations"].split(",")
+    qualities = request.url.params["qualities"].split(",")
+    return [
+        {"item_id": item, "city": city, "quality": int(quality), "sell_price_min": 1000}
+        for item in items for city in cities for quality in qualities
+    ]
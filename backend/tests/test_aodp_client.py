@@ -0,0 +1,540 @@
+"""
+Tests for AODP client
+Run with: pytest tests/test_aodp_client.py -v
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services.aodp_client import (
+    AdaptiveRateController, AODPClient, AODPUnavailableError, CircuitBreaker, PriorityLimiter, RateLimiter
+)
+from services.cache import CacheManager
+from tests.conftest import make_client, price_rows
+
+class TestRateLimiter:
+
+    @pytest.mark.asyncio
+    async def test_burst_is_immediate(self):
+        """Test that requests within the burst capacity do not wait"""
+        limiter = RateLimiter(60, 60, burst=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+
+        assert time.monotonic() - start < 0.05
+
+    @pytest.mark.asyncio
+    async def test_waiters_are_served_fifo(self):
+        """Test that queued callers get their tokens in arrival order"""
+        limiter = RateLimiter(100, 1, burst=1)
+        order = []
+
+        async def worker(n):
+            await limiter.acquire()
+            order.append(n)
+
+        await asyncio.gather(*(worker(n) for n in range(10)))
+
+        assert order == list(range(10))
+
+    @pytest.mark.asyncio
+    async def test_defer_pauses_requests(self):
+        """Test that a Retry-After pause delays the next acquire"""
+        limiter = RateLimiter(1000, 1, burst=10)
+        limiter.defer(0.1)
+
+        start = time.monotonic()
+        await limiter.acquire()
+
+        assert time.monotonic() - start >= 0.09
+
+    def test_reserve_spaces_requests_by_rate(self):
+        """Test that reservations beyond the burst are spaced at the refill rate"""
+        limiter = RateLimiter(60, 60, burst=1)
+
+        assert limiter._reserve() == 0
+        assert abs(limiter._reserve() - 1.0) < 0.01
+        assert abs(limiter._reserve() - 2.0) < 0.01
+
+class TestAdaptiveRateController:
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Test AIMD adjustments within floor and ceiling"""
+        limiter = RateLimiter(100, 60)
+        controller = AdaptiveRateController(limiter, floor_per_min=30, ceiling_per_min=200)
+
+        for _ in range(100):
+            controller.on_success()
+        assert 100.9 < controller.rate_per_min < 101.1
+        assert limiter.max_requests == controller.rate_per_min
+
+        controller.on_throttle()
+        assert abs(controller.rate_per_min - 50.5) < 0.1
+
+        # Further throttles within the cooldown are ignored, floor holds after it
+        controller.on_throttle()
+        assert abs(controller.rate_per_min - 50.5) < 0.1
+        controller.last_decrease = 0
+        controller.on_throttle()
+        assert controller.rate_per_min == 30
+
+    def test_rate_persists_across_restarts(self, tmp_path):
+        """Test that the learned rate is reloaded from the state file"""
+        state_path = str(tmp_path / "rate.json")
+        controller = AdaptiveRateController(
+            RateLimiter(120, 60), floor_per_min=10, ceiling_per_min=120, state_path=state_path
+        )
+        controller.on_throttle()
+
+        restarted = AdaptiveRateController(
+            RateLimiter(120, 60), floor_per_min=10, ceiling_per_min=120, state_path=state_path
+        )
+        assert restarted.rate_per_min == 60
+        assert restarted.rate_limiter.max_requests == 60
+
+    def test_learns_above_configured_rate(self, tmp_path):
+        """Test that successes raise the rate past the configured one, up to the ceiling"""
+        state_path = str(tmp_path / "rate.json")
+        client = AODPClient(
+            "https://west.albion-online-data.com", CacheManager(), 120,
+            adaptive_rate={"floor_per_min": 10, "ceiling_per_min": 360, "state_path": state_path}
+        )
+        for _ in range(1000):
+            client.adaptive.on_success()
+        learned = client.adaptive.rate_per_min
+        client.save_rate_state()
+
+        restarted = AdaptiveRateController(
+            RateLimiter(120, 60), floor_per_min=10, ceiling_per_min=360, state_path=state_path
+        )
+        assert learned > client.rate_limit_per_min
+        assert restarted.rate_per_min == round(learned, 2)
+        assert client.get_region_rates()["west"] == round(learned, 2)
+
+    @pytest.mark.asyncio
+    async def test_client_backs_off_on_429(self):
+        """Test that a 429 lowers the learned rate"""
+        responses = [httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200, json=[])]
+
+        client = make_client(
+            lambda request: responses.pop(0),
+            adaptive_rate={"floor_per_min": 10, "ceiling_per_min": 6000}
+        )
+        await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        assert client.get_metrics()["adaptive_rate"]["decreases"] == 1
+        assert client.rate_limiter.max_requests < 6000
+
+class TestPriorityLimiter:
+
+    @pytest.mark.asyncio
+    async def test_interactive_overtakes_background(self):
+        """Test that an interactive request jumps ahead of queued background work"""
+        lanes = PriorityLimiter(RateLimiter(100, 1, burst=1))
+        order = []
+
+        async def worker(priority, n):
+            await lanes.acquire(priority)
+            order.append((priority, n))
+
+        tasks = [asyncio.ensure_future(worker("background", n)) for n in range(6)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(worker("interactive", 0)))
+        await asyncio.gather(*tasks)
+
+        assert order.index(("interactive", 0)) <= 2
+        assert [n for priority, n in order if priority == "background"] == list(range(6))
+
+        metrics = lanes.get_metrics()
+        assert metrics["background"]["dispatched"] == 6
+        assert metrics["interactive"]["queue_depth"] == 0
+
+    @pytest.mark.asyncio
+    async def test_weighted_share(self):
+        """Test that classes share tokens according to their weights"""
+        lanes = PriorityLimiter(RateLimiter(1000, 1, burst=1), {"a": 3, "b": 1})
+        order = []
+
+        async def worker(priority):
+            await lanes.acquire(priority)
+            order.append(priority)
+
+        await asyncio.gather(*(worker(p) for p in ["a"] * 12 + ["b"] * 12))
+
+        assert order[:8].count("a") == 6
+
+    @pytest.mark.asyncio
+    async def test_unknown_priority(self):
+        """Test that an unknown class is rejected"""
+        lanes = PriorityLimiter(RateLimiter(60, 60))
+        with pytest.raises(ValueError):
+            await lanes.acquire("urgent")
+
+class TestAODPClientPrices:
+
+    @pytest.mark.asyncio
+    async def test_large_item_lists_are_chunked(self):
+        """Test that long item lists are split into URL-length-safe requests"""
+        urls = []
+
+        def handler(request):
+            urls.append(str(request.url))
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler, max_url_length=300)
+        items = [f"T4_ITEM_{n:03d}" for n in range(100)]
+
+        prices = await client.get_prices("west", items, ["Martlock"], [1])
+
+        assert len(urls) > 1
+        assert all(len(url) <= 300 for url in urls)
+        assert sorted(p["item_id"] for p in prices) == sorted(items)
+
+    @pytest.mark.asyncio
+    async def test_price_loads_are_timed(self):
+        """Test that AODP price fetches are recorded as cache load latency"""
+        client = make_client(lambda request: httpx.Response(200, json=price_rows(request)))
+
+        await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+        await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        stats = client.cache.get_namespace_stats()["prices"]
+        assert (stats["loads"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+    @pytest.mark.asyncio
+    async def test_cache_is_read_and_written_in_batches(self, monkeypatch):
+        """Test that a request reads the cache once and writes it once per chunk"""
+        urls = []
+
+        def handler(request):
+            urls.append(request.url)
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler, max_url_length=300)
+        calls = []
+        for name in ("get_many", "set_many", "get_with_status"):
+            method = getattr(client.cache, name)
+            monkeypatch.setattr(
+                client.cache, name,
+                lambda *args, name=name, method=method, **kwargs: calls.append(name) or method(*args, **kwargs)
+            )
+        items = [f"T4_ITEM_{n:03d}" for n in range(100)]
+
+        await client.get_prices("west", items, ["Martlock", "Lymhurst"], [1, 2])
+
+        assert len(urls) > 1
+        assert calls == ["get_many"] + ["set_many"] * len(urls)
+
+    @pytest.mark.asyncio
+    async def test_rows_under_other_qualities_are_kept(self):
+        """Test that quality 0 requests keep AODP's real-quality rows and are cached"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json=[
+                {"item_id": "T4_BAG", "city": "Martlock", "quality": q, "sell_price_min": 1000 * q}
+                for q in (1, 2)
+            ])
+
+        client = make_client(handler)
+
+        prices = await client.get_prices("west", ["T4_BAG"], ["Martlock"], [0])
+        again = await client.get_prices("west", ["T4_BAG"], ["Martlock"], [0])
+
+        assert [p["quality"] for p in prices] == [1, 2]
+        assert again == prices
+        assert len(calls) == 1
+        assert [row["quality"] for row in client.cache.get("prices:west:T4_BAG:Martlock:0")] == [1, 2]
+        assert client.cache.get("prices:west:T4_BAG:Martlock:2")["sell_price_min"] == 2000
+
+    @pytest.mark.asyncio
+    async def test_partial_chunk_failures_are_reported(self):
+        """Test that one failing chunk does not discard the others"""
+        def handler(request):
+            if "T4_ITEM_000" in request.url.path:
+                return httpx.Response(404)
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler, max_url_length=300)
+        items = [f"T4_ITEM_{n:03d}" for n in range(100)]
+
+        result = await client.fetch_prices("west", items, ["Martlock"], [1])
+
+        assert len(result["errors"]) == 1
+        assert "T4_ITEM_000" in result["errors"][0]["items"]
+        failed = set(result["errors"][0]["items"])
+        assert {p["item_id"] for p in result["data"]} == set(items) - failed
+
+    @pytest.mark.asyncio
+    async def test_only_uncached_items_are_fetched(self):
+        """Test that overlapping requests reuse per-item cache entries"""
+        requested = []
+
+        def handler(request):
+            rows = price_rows(request)
+            requested.extend(row["item_id"] for row in rows)
+            return httpx.Response(200, json=rows)
+
+        client = make_client(handler)
+
+        await client.get_prices("west", ["T4_BAG", "T5_BAG"], ["Martlock"], [1])
+        prices = await client.get_prices("west", ["T4_BAG", "T5_BAG", "T6_BAG"], ["Martlock"], [1])
+
+        assert requested == ["T4_BAG", "T5_BAG", "T6_BAG"]
+        assert [p["item_id"] for p in prices] == ["T4_BAG", "T5_BAG", "T6_BAG"]
+
+    @pytest.mark.asyncio
+    async def test_missing_rows_are_cached(self):
+        """Test that combinations AODP has no row for are not refetched"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json=[])
+
+        client = make_client(handler)
+
+        assert await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1]) == []
+        assert await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1]) == []
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_rows_are_served_and_refreshed(self):
+        """Test stale-while-revalidate: stale rows return at once, refresh runs once"""
+        prices = {"value": 1000}
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            rows = price_rows(request)
+            for row in rows:
+                row["sell_price_min"] = prices["value"]
+            return httpx.Response(200, json=rows)
+
+        client = make_client(handler)
+        client.cache.ttl_seconds = 0.05
+        client.cache.stale_ttl_seconds = 60
+
+        await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+        await asyncio.sleep(0.06)
+        prices["value"] = 1200
+
+        stale = await asyncio.gather(*(
+            client.get_prices("west", ["T4_BAG"], ["Martlock"], [1]) for _ in range(3)
+        ))
+        assert all(result[0]["sell_price_min"] == 1000 for result in stale)
+
+        await asyncio.gather(*client._background_tasks)
+        fresh = await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        assert fresh[0]["sell_price_min"] == 1200
+        assert len(calls) == 2
+
+class TestAODPClientRegions:
+
+    @pytest.mark.asyncio
+    async def test_regions_have_separate_budgets(self):
+        """Test that each region host gets its own rate limit and runs concurrently"""
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler)
+
+        start = time.monotonic()
+        results = await asyncio.gather(*(
+            client.get_prices(region, ["T4_BAG"], ["Martlock"], [1])
+            for region in ("west", "europe", "east")
+        ))
+        elapsed = time.monotonic() - start
+
+        assert all(len(rows) == 1 for rows in results)
+        assert elapsed < 0.12  # Slowest region, not the sum of all three
+        assert set(client.get_metrics()["hosts"]) == {
+            "west.albion-online-data.com",
+            "europe.albion-online-data.com",
+            "east.albion-online-data.com"
+        }
+        assert client._channel(client.region_urls["europe"]).rate_limiter is not client.rate_limiter
+
+    def test_regions_on_one_host_share_a_budget(self):
+        """Test that regions pointed at the same host share one channel"""
+        client = make_client(
+            lambda request: httpx.Response(200, json=[]),
+            region_urls={region: "http://127.0.0.1:8100" for region in ("west", "europe", "east")}
+        )
+
+        assert client._channel(client.region_urls["east"]) is client._channel(client.region_urls["west"])
+        assert len(client.hosts) == 1
+
+class TestAODPClientTransport:
+
+    @pytest.mark.asyncio
+    async def test_http_settings_are_applied(self):
+        """Test that encodings and split timeouts reach the requests"""
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler, http_settings={"accept_encoding": "gzip", "read_timeout": 12.0})
+        await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        assert seen[0].headers["accept-encoding"] == "gzip"
+        assert seen[0].extensions["timeout"]["read"] == 12.0
+        assert seen[0].extensions["timeout"]["connect"] == 5.0
+
+    @pytest.mark.asyncio
+    async def test_each_host_gets_its_own_pool(self):
+        """Test that initialize opens one HTTP client per region host"""
+        client = make_client(lambda request: httpx.Response(200, json=[]))
+        await client.initialize()
+
+        pools = {id(channel.client) for channel in client.hosts.values()}
+        await client.close()
+
+        assert len(pools) == 3
+
+    @pytest.mark.asyncio
+    async def test_warm_up_skips_the_rate_limit(self):
+        """Test that warm-up probes every host without spending tokens"""
+        seen = []
+
+        def handler(request):
+            seen.append((request.method, request.url.host))
+            return httpx.Response(404)
+
+        client = make_client(handler, rate_limit_burst=5, http_settings={"warmup_connections": 2})
+        tokens = client.rate_limiter.available()
+
+        warmed = await client.warm_up()
+
+        assert sorted(warmed.values()) == [2, 2, 2]
+        assert all(method == "HEAD" for method, _ in seen)
+        assert len(seen) == 6
+        assert client.rate_limiter.available() >= tokens
+
+    def test_http2_falls_back_without_h2(self, monkeypatch):
+        """Test that HTTP/2 is turned off when h2 is missing"""
+        import importlib.util
+        monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+
+        client = make_client(lambda request: httpx.Response(200, json=[]), http_settings={"http2": True})
+
+        assert client.http_settings["http2"] is False
+
+class TestAODPClientCoalescing:
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_share_one_call(self):
+        """Test that concurrent callers for the same URL await one request"""
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=[{"timestamp": "2024-01-01T00:00:00"}])
+
+        client = make_client(handler)
+        url = "https://west.albion-online-data.com/api/v2/stats/history/T4_BAG.json"
+        params = {"locations": "Martlock", "time-scale": 24}
+
+        results = await asyncio.gather(*(client._make_request(url, params) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert all(result == results[0] for result in results)
+        assert client.get_metrics()["coalesced"] == 4
+        assert client.get_metrics()["in_flight"] == 0
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold_and_probes(self):
+        """Test closed -> open -> half-open -> closed transitions"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.allow_request()  # the single half-open probe
+        assert not breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow_request()
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed half-open probe opens the circuit again"""
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+        for _ in range(5):
+            breaker.record_failure()
+
+        time.sleep(0.06)
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert not breaker.allow_request()
+
+    @pytest.mark.asyncio
+    async def test_client_fails_fast_when_open(self):
+        """Test that an open circuit stops calls from reaching AODP"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError("connection refused")
+
+        client = make_client(handler, circuit_failure_threshold=1, circuit_reset_seconds=60)
+
+        with pytest.raises(AODPUnavailableError):
+            await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+        with pytest.raises(AODPUnavailableError):
+            await client.get_prices("west", ["T5_BAG"], ["Martlock"], [1])
+
+        assert len(calls) == 1
+        assert not client.is_available("west")
+        assert client.get_metrics()["circuit"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_all_chunks_failing_is_unavailable(self):
+        """Test that plain HTTP errors on every chunk still raise AODPUnavailableError"""
+        client = make_client(lambda request: httpx.Response(400), circuit_failure_threshold=100)
+
+        with pytest.raises(AODPUnavailableError):
+            await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        assert client.is_available("west")
+
+    @pytest.mark.asyncio
+    async def test_offline_mode_never_calls_aodp(self):
+        """Test that offline mode raises without sending requests"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json=price_rows(request))
+
+        client = make_client(handler, offline=True)
+
+        with pytest.raises(AODPUnavailableError):
+            await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+
+        assert calls == []
+        assert client.get_metrics()["circuit"] == "offline"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
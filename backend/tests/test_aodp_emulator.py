@@ -0,0 +1,76 @@
+"""
+Tests for the local AODP emulator
+Run with: pytest tests/test_aodp_emulator.py -v
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.aodp_emulator import AODPEmulator
+from services.aodp_client import AODPClient
+from services.cache import CacheManager
+
+def emulated_client(emulator):
+    """AODPClient talking to the emulator in-process"""
+    return AODPClient(
+        "http://aodp.local",
+        CacheManager(),
+        6000,
+        region_urls={"west": "http://aodp.local"},
+        transport=httpx.ASGITransport(app=emulator)
+    )
+
+class TestAODPEmulator:
+
+    @pytest.mark.asyncio
+    async def test_prices_are_deterministic(self):
+        """Test that the same request returns the same synthetic rows"""
+        client = emulated_client(AODPEmulator())
+        await client.initialize()
+
+        first = await client.refresh_prices("west", ["T4_BAG", "T5_BAG"], ["Martlock", "Lymhurst"], [1, 2])
+        rows = await client.get_prices("west", ["T4_BAG", "T5_BAG"], ["Martlock", "Lymhurst"], [1, 2])
+        await client.close()
+
+        expected = AODPEmulator().prices_payload(["T4_BAG"], ["Martlock"], [1])[0]
+        served = next(r for r in rows if (r["item_id"], r["city"], r["quality"]) == ("T4_BAG", "Martlock", 1))
+        assert first["rows"] == 8
+        assert len(rows) == 8
+        assert served["sell_price_min"] == expected["sell_price_min"]
+
+    @pytest.mark.asyncio
+    async def test_fixture_rows_are_served(self, tmp_path):
+        """Test that recorded rows take precedence over synthetic ones"""
+        fixtures = tmp_path / "fixtures.json"
+        fixtures.write_text(
+            '{"prices": [{"item_id": "T4_BAG", "city": "Martlock", "quality": 1, "sell_price_min": 4242}]}'
+        )
+        client = emulated_client(AODPEmulator(fixtures_path=str(fixtures)))
+        await client.initialize()
+
+        rows = await client.get_prices("west", ["T4_BAG"], ["Martlock"], [1])
+        await client.close()
+
+        assert rows[0]["sell_price_min"] == 4242
+
+    @pytest.mark.asyncio
+    async def test_injected_429s_are_retried(self):
+        """Test that injected 429s are retried and then given up on"""
+        emulator = AODPEmulator(rate_limit_per_min=1, retry_after=0)
+        client = emulated_client(emulator)
+        await client.initialize()
+
+        assert await client.get_history("west", "T4_BAG", "Martlock")
+        # The emulator keeps answering 429, so every retry is used up
+        assert not await client.get_history("west", "T5_BAG", "Martlock")
+        await client.close()
+
+        assert emulator.stats["requests"] == 4
+        assert emulator.stats["throttled"] == 3
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
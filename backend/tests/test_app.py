@@ -0,0 +1,191 @@
+"""
+Tests for API endpoints
+Run with: pytest tests/test_app.py -v
+"""
+
+import pytest
+from datetime import datetime
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app as app_module
+from database import Base, MarketHistory, get_db
+from services.aodp_client import AODPUnavailableError
+
+def price(city, quality, sell_price_min, buy_price_max):
+    now = datetime.utcnow().isoformat()
+    return {
+        "item_id": "T4_BAG",
+        "city": city,
+        "quality": quality,
+        "sell_price_min": sell_price_min,
+        "sell_price_max": None,
+        "buy_price_min": None,
+        "buy_price_max": buy_price_max,
+        "sell_price_min_date": now,
+        "sell_price_max_date": None,
+        "buy_price_min_date": None,
+        "buy_price_max_date": now,
+        "age_hours": 1
+    }
+
+class TestOpportunitiesEndpoints:
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        def override_db():
+            session = session_factory()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        async def get_prices(region, items, cities, qualities, **kwargs):
+            # Q1 is cheap everywhere; only Q2 has a high buy order (in Lymhurst)
+            return [
+                price("Martlock", 1, 1000, 900),
+                price("Lymhurst", 1, 1100, 950),
+                price("Martlock", 2, 3000, 2000),
+                price("Lymhurst", 2, 3200, 5000)
+            ]
+
+        monkeypatch.setattr(app_module.aodp_client, "get_prices", get_prices)
+        app_module.response_cache.clear()
+        app_module.app.dependency_overrides[get_db] = override_db
+        yield TestClient(app_module.app)
+        app_module.app.dependency_overrides.clear()
+
+    def _request(self, **overrides):
+        body = {
+            "region": "west",
+            "items": ["T4_BAG"],
+            "cities": ["Martlock", "Lymhurst"],
+            "qualities": [1, 2],
+            "premium": True,
+            "setup_fee": 0.025
+        }
+        body.update(overrides)
+        return body
+
+    def test_v2_pairs_same_quality_only(self, client):
+        """Test that a Q1 buy is never paired with a Q2 buy order"""
+        response = client.post("/api/market/opportunities/v2", json=self._request())
+
+        routes = response.json()["opportunities"]
+        assert response.status_code == 200
+        assert len(routes) == 4
+        for route in routes:
+            expected_buy = {1: {"Martlock": 1000, "Lymhurst": 1100}, 2: {"Martlock": 3000, "Lymhurst": 3200}}
+            expected_sell = {1: {"Martlock": 900, "Lymhurst": 950}, 2: {"Martlock": 2000, "Lymhurst": 5000}}
+            assert route["buy_price"] == expected_buy[route["quality"]][route["buy_city"]]
+            assert route["sell_price"] == expected_sell[route["quality"]][route["sell_city"]]
+
+    def test_v1_pairs_same_quality_only(self, client):
+        """Test that profitable routes only use buy orders of the same quality"""
+        response = client.post("/api/market/opportunities", json=self._request())
+
+        routes = response.json()["opportunities"]
+        assert [(r["quality"], r["buy_city"], r["sell_city"], r["sell_price"]) for r in routes] == [
+            (2, "Martlock", "Lymhurst", 5000)
+        ]
+
+    def test_v1_resolves_at_least(self, client, monkeypatch):
+        """Test that v1 fetches qualities >= Q and pairs routes on the requested quality"""
+        asked = []
+        fetch = app_module.aodp_client.get_prices
+
+        async def get_prices(region, items, cities, qualities, **kwargs):
+            asked.append(qualities)
+            return await fetch(region, items, cities, qualities, **kwargs)
+
+        monkeypatch.setattr(app_module.aodp_client, "get_prices", get_prices)
+        response = client.post(
+            "/api/market/opportunities", json=self._request(qualities=[2], quality_mode="at_least")
+        )
+
+        routes = response.json()["opportunities"]
+        assert asked == [[2, 3, 4, 5]]
+        assert [(r["quality"], r["buy_city"], r["sell_city"], r["sell_price"]) for r in routes] == [
+            (2, "Martlock", "Lymhurst", 5000)
+        ]
+
+    def test_v2_at_least_uses_requested_quality_buy_orders(self, client):
+        """Test that at_least routes sell into buy orders of the requested quality"""
+        response = client.post(
+            "/api/market/opportunities/v2", json=self._request(qualities=[1], quality_mode="at_least")
+        )
+
+        routes = response.json()["opportunities"]
+        assert sorted((r["buy_city"], r["sell_price"]) for r in routes) == [("Lymhurst", 900), ("Martlock", 950)]
+
+    def test_v2_prices_keep_requested_quality(self, client):
+        """Test that at_least price rows say which requested quality they answer"""
+        response = client.post(
+            "/api/market/prices/v2", json=self._request(qualities=[1, 2], quality_mode="at_least")
+        )
+
+        prices = response.json()["prices"]
+        assert sorted((p["city"], p["requested_quality"]) for p in prices) == [
+            ("Lymhurst", 1), ("Lymhurst", 2), ("Martlock", 1), ("Martlock", 2)
+        ]
+
+    def test_city_invalidation_drops_cached_responses(self, client):
+        """Test that invalidating a city alone stops cached responses for it being served"""
+        client.post("/api/market/opportunities/v2", json=self._request())
+        assert client.post("/api/market/opportunities/v2", json=self._request()).headers["X-Cache"] == "HIT"
+        other = self._request(cities=["Lymhurst", "Bridgewatch"])
+        client.post("/api/market/opportunities/v2", json=other)
+
+        client.post("/api/cache/invalidate", json={"region": "west", "cities": ["Martlock"]})
+
+        assert client.post("/api/market/opportunities/v2", json=self._request()).headers["X-Cache"] == "MISS"
+        assert client.post("/api/market/opportunities/v2", json=other).headers["X-Cache"] == "HIT"
+
+class TestHistoryEndpoint:
+
+    def test_degrades_to_stored_history(self, monkeypatch):
+        """Test that an unavailable AODP serves stored buckets instead of a 500"""
+        engine = create_engine(
+            "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        session.add(MarketHistory(
+            region="west", item_id="T4_BAG", city="Martlock", quality=1, timescale=24,
+            timestamp=datetime(2024, 1, 1), item_count=10, avg_price=1000
+        ))
+        session.commit()
+
+        async def get_history(**kwargs):
+            raise AODPUnavailableError("AODP offline mode is enabled")
+
+        monkeypatch.setattr(app_module.aodp_client, "get_history", get_history)
+        app_module.app.dependency_overrides[get_db] = lambda: session
+        try:
+            response = TestClient(app_module.app).get(
+                "/api/market/history", params={"region": "west", "item": "T4_BAG", "city": "Martlock"}
+            )
+        finally:
+            app_module.app.dependency_overrides.clear()
+            session.close()
+
+        assert response.status_code == 200
+        assert response.json()["degraded"] is True
+        assert response.json()["data"] == [
+            {"timestamp": "2024-01-01T00:00:00", "item_count": 10, "avg_price": 1000}
+        ]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
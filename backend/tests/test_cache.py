@@ -0,0 +1,322 @@
+"""
+Tests for cache manager
+Run with: pytest tests/test_cache.py -v
+"""
+
+import pytest
+import asyncio
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache import CacheManager, RedisCache, SQLiteCache, TieredCache
+
+class TestCacheManager:
+
+    @pytest.fixture
+    def cache(self):
+        return CacheManager(ttl_seconds=600)
+
+    def test_set_and_get(self, cache):
+        """Test basic set/get round trip"""
+        cache.set("prices:west:T4_BAG", {"sell_price_min": 1000})
+        assert cache.get("prices:west:T4_BAG") == {"sell_price_min": 1000}
+        assert cache.get("missing") is None
+
+    def test_stale_window(self, cache):
+        """Test that entries between soft and hard TTL are served as stale"""
+        cache.set("key", "value", ttl=0.05, stale_ttl=10)
+        time.sleep(0.06)
+
+        assert cache.get("key") is None
+        assert cache.get_with_status("key") == ("value", True)
+        assert cache.size() == 1
+
+    def test_hard_expiry(self, cache):
+        """Test that entries past the hard TTL are removed"""
+        cache.set("key", "value", ttl=0.05, stale_ttl=0)
+        time.sleep(0.06)
+
+        assert cache.get_with_status("key") == (None, False)
+        assert cache.size() == 0
+
+    def test_lru_eviction_by_entries(self):
+        """Test that the least recently used entry is evicted first"""
+        cache = CacheManager(ttl_seconds=600, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        """Test that the byte cap holds and oversized values are not stored"""
+        cache = CacheManager(ttl_seconds=600, max_bytes=100)
+        for n in range(10):
+            cache.set(f"key{n}", "x" * 20)
+
+        stats = cache.get_stats()
+        assert stats["bytes"] <= 100
+        assert stats["entries"] < 10
+        assert cache.get("key9") == "x" * 20
+
+        cache.set("huge", "x" * 200)
+        assert cache.get("huge") is None
+
+    def test_hit_and_miss_counters(self, cache):
+        """Test hit, stale hit and miss counting"""
+        cache.set("fresh", 1)
+        cache.set("stale", 2, ttl=0.01, stale_ttl=10)
+        time.sleep(0.02)
+
+        cache.get("fresh")
+        cache.get_with_status("stale")
+        cache.get("missing")
+
+        stats = cache.get_stats()
+        assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 1)
+        assert stats["hit_ratio"] == round(2 / 3, 4)
+
+    def test_namespace_stats(self, cache):
+        """Test that counters, sizes and load latency are kept per key namespace"""
+        cache.set("prices:west:T4_BAG:Martlock:1", {"sell_price_min": 1000})
+        cache.set("history:abc", [1, 2, 3])
+        cache.get("prices:west:T4_BAG:Martlock:1")
+        cache.get("prices:west:T5_BAG:Martlock:1")
+        cache.get("history:def")
+        cache.record_load("history", 0.2)
+        cache.record_load("history", 0.4)
+
+        stats = cache.get_namespace_stats()
+
+        assert (stats["prices"]["hits"], stats["prices"]["misses"]) == (1, 1)
+        assert stats["prices"]["hit_ratio"] == 0.5
+        assert stats["prices"]["avg_entry_bytes"] == cache.cache["prices:west:T4_BAG:Martlock:1"]["size"]
+        assert (stats["history"]["misses"], stats["history"]["entries"]) == (1, 1)
+        assert (stats["history"]["avg_load_ms"], stats["history"]["max_load_ms"]) == (300.0, 400.0)
+
+        cache.delete("history:abc")
+        assert cache.get_namespace_stats()["history"]["entries"] == 0
+
+    def test_incremental_cleanup(self, cache):
+        """Test that cleanup removes at most a batch of expired entries per call"""
+        for n in range(5):
+            cache.set(f"old{n}", n, ttl=0.01, stale_ttl=0)
+        cache.set("live", "value")
+        time.sleep(0.02)
+
+        assert cache.cleanup_expired(max_entries=3) == 3
+        assert cache.size() == 3
+        assert cache.cleanup_expired(max_entries=3) == 2
+        assert cache.size() == 1
+        assert cache.get_stats()["expirations"] == 5
+
+    def test_overwritten_entry_is_not_expired_early(self, cache):
+        """Test that a refreshed key keeps its new expiry"""
+        cache.set("key", "old", ttl=0.01, stale_ttl=0)
+        cache.set("key", "new", ttl=600)
+        time.sleep(0.02)
+
+        assert cache.cleanup_expired() == 0
+        assert cache.get("key") == "new"
+
+    def test_invalidate_tags(self, cache):
+        """Test that only entries carrying a given tag are dropped"""
+        cache.set("a", 1, tags=("item:west:T4_BAG", "city:west:Martlock"))
+        cache.set("b", 2, tags=("item:west:T5_BAG", "city:west:Martlock"))
+        cache.set("c", 3, tags=("item:west:T5_BAG", "city:west:Lymhurst"))
+
+        assert sorted(cache.invalidate_tags(["item:west:T4_BAG"])) == ["a"]
+        assert sorted(cache.invalidate_tags(["city:west:Martlock"])) == ["b"]
+        assert cache.get("c") == 3
+        assert cache.invalidate_tags(["item:west:T4_BAG"]) == []
+        assert cache.get_stats()["invalidations"] == 2
+
+    def test_overwrite_replaces_tags(self, cache):
+        """Test that rewriting an entry without a tag takes it out of that tag"""
+        cache.set("a", 1, tags=("item:west:T4_BAG",))
+        cache.set("a", 2)
+
+        assert cache.invalidate_tags(["item:west:T4_BAG"]) == []
+        assert cache.get("a") == 2
+
+    @pytest.mark.asyncio
+    async def test_background_sweeper(self, cache):
+        """Test that the sweeper task removes expired entries on its own"""
+        cache.set("key", "value", ttl=0.01, stale_ttl=0)
+        cache.start_sweeper(interval_seconds=0.01)
+        await asyncio.sleep(0.05)
+        await cache.stop_sweeper()
+
+        assert cache.size() == 0
+        assert cache.sweeper is None
+
+class TestTieredCache:
+
+    @pytest.fixture
+    def workers(self, tmp_path):
+        """Two workers, each with its own L1, sharing one SQLite L2"""
+        path = str(tmp_path / "l2.sqlite3")
+        first = TieredCache(CacheManager(ttl_seconds=600), SQLiteCache(path, ttl_seconds=600))
+        second = TieredCache(CacheManager(ttl_seconds=600), SQLiteCache(path, ttl_seconds=600))
+        yield first, second
+        first.l2.close()
+        second.l2.close()
+
+    def test_write_through_read_through(self, workers):
+        """Test that a value written by one worker is read through by another"""
+        first, second = workers
+        first.set("prices:west:T4_BAG:Martlock:1", {"sell_price_min": 1000})
+
+        assert second.get("prices:west:T4_BAG:Martlock:1") == {"sell_price_min": 1000}
+        # Copied into the second worker's L1
+        assert second.l1.get("prices:west:T4_BAG:Martlock:1") == {"sell_price_min": 1000}
+        assert second.get_stats()["l2_hits"] == 1
+
+    def test_stale_entries_keep_their_window(self, workers):
+        """Test that read-through keeps the L2 entry's soft expiry"""
+        first, second = workers
+        first.set("key", "value", ttl=0.05, stale_ttl=10)
+        time.sleep(0.06)
+
+        assert second.get_with_status("key") == ("value", True)
+        assert second.ttl_remaining("key") < 0
+
+    def test_delete_fans_out(self, workers):
+        """Test that a delete drops the other worker's L1 copy"""
+        first, second = workers
+        first.set("key", "value")
+        assert second.get("key") == "value"
+
+        first.delete("key")
+        assert second.l1.get("key") == "value"
+
+        assert second.apply_invalidations() == 1
+        assert second.get("key") is None
+        assert first.apply_invalidations() == 0  # Own invalidations are ignored
+
+    def test_warm_start_from_persistent_l2(self, tmp_path):
+        """Test that a restarted worker loads live entries from the file into L1"""
+        path = str(tmp_path / "l2.sqlite3")
+        before = TieredCache(CacheManager(ttl_seconds=600), SQLiteCache(path, ttl_seconds=600))
+        before.set("fresh", {"rows": 3})
+        before.set("expired", "gone", ttl=0)
+        before.l2.close()
+
+        after = TieredCache(CacheManager(ttl_seconds=600), SQLiteCache(path, ttl_seconds=600))
+        assert after.warm(100) == 1
+        assert after.l1.get("fresh") == {"rows": 3}
+        assert 0 < after.l1.ttl_remaining("fresh") <= 600
+        after.l2.close()
+
+    def test_compaction_enforces_size_cap(self, tmp_path):
+        """Test that compaction drops expired entries, then those closest to expiry"""
+        l2 = SQLiteCache(str(tmp_path / "l2.sqlite3"), ttl_seconds=600)
+        l2.set("expired", "x" * 100, ttl=0)
+        for n in range(4):
+            l2.set(f"key{n}", "x" * 100, ttl=100 * (n + 1))
+        l2.max_bytes = 2 * l2.total_bytes() // 5
+
+        assert l2.compact() == 3
+        assert l2.get("key0") is None
+        assert l2.get("key1") is None
+        assert l2.get("key3") == "x" * 100
+        assert l2.total_bytes() <= l2.max_bytes
+        assert l2.get_stats()["compaction_evictions"] == 2
+        l2.close()
+
+    def test_health_stats_do_not_scan_l2(self, workers):
+        """Test that size and stats use L1 and the compaction counts, not a table scan"""
+        first, second = workers
+        first.set_many([(f"key{n}", "x" * 100, None) for n in range(3)])
+        statements = []
+        first.l2.conn.set_trace_callback(statements.append)
+
+        assert first.size() == 3
+        assert first.get_stats()["l2"]["entries"] == 0  # Counted when the file was opened
+        assert not [sql for sql in statements if "COUNT" in sql or "SUM" in sql]
+
+        first.l2.compact()
+        assert first.get_stats()["l2"]["entries"] == 3
+        second.set("key3", "x" * 100)
+        assert first.get_stats(exact=True)["l2"]["entries"] == 4
+        first.l2.conn.set_trace_callback(None)
+
+    def test_bulk_tag_invalidation_is_chunked(self, tmp_path):
+        """Test that more tags than SQLite allows variables still invalidate"""
+        l2 = SQLiteCache(str(tmp_path / "l2.sqlite3"), ttl_seconds=600)
+        for n in range(1200):
+            l2.set(f"key{n}", n, tags=(f"item:west:T4_ITEM_{n}", "city:west:Martlock"))
+
+        keys = l2.invalidate_tags([f"item:west:T4_ITEM_{n}" for n in range(1200)] + ["city:west:Martlock"])
+
+        assert len(keys) == 1200
+        assert l2.size() == 0
+        l2.close()
+
+    def test_batch_write_and_read_through(self, workers):
+        """Test that batches reach L2 in one call and are read back through in one call"""
+        first, second = workers
+        first.set_many([(f"key{n}", n, (f"item:west:T4_ITEM_{n}",)) for n in range(1200)])
+        second.l1.set("key0", 0)
+        reads = []
+        read = second.l2.get_encoded_entries
+
+        def counted(keys):
+            reads.append(len(keys))
+            return read(keys)
+
+        second.l2.get_encoded_entries = counted
+        values = second.get_many([f"key{n}" for n in range(1200)] + ["missing"])
+
+        assert reads == [1200]  # key0 came from L1
+        assert values["key1199"] == (1199, False)
+        assert values["missing"] == (None, False)
+        assert second.l1.get("key1199") == 1199
+        assert first.l2.invalidate_tags(["item:west:T4_ITEM_7"]) == ["key7"]
+
+    def test_tag_invalidation_fans_out(self, workers):
+        """Test that a tag invalidation reaches L2 and the other worker's L1 copies"""
+        first, second = workers
+        first.set("T4", "value", tags=("item:west:T4_BAG",))
+        first.set("T5", "other", tags=("item:west:T5_BAG",))
+        assert second.get("T4") == "value"  # Read-through copy without tags
+
+        assert first.invalidate_tags(["item:west:T4_BAG"]) == ["T4"]
+        assert first.l2.get("T4") is None
+
+        assert second.apply_invalidations() == 1
+        assert second.get("T4") is None
+        assert second.get("T5") == "other"
+
+class TestRedisCache:
+
+    def test_unreachable_redis_polls_back_off(self, capsys):
+        """Test that a down Redis is retried with backoff and reported once"""
+        attempts = []
+
+        class DownRedis:
+            def pubsub(self, **kwargs):
+                attempts.append(time.monotonic())
+                raise ConnectionError("connection refused")
+
+        cache = RedisCache()
+        cache.enabled = True
+        cache.redis_client = DownRedis()
+
+        for _ in range(5):
+            assert cache.poll_invalidations("worker") == []
+        cache.poll_retry_at = 0  # Backoff elapsed
+        cache.poll_invalidations("worker")
+
+        assert len(attempts) == 2
+        assert cache.poll_backoff == 2.0
+        assert capsys.readouterr().out.count("Redis subscribe error") == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
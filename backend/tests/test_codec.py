@@ -0,0 +1,116 @@
+"""
+Tests for cache value codecs
+Run with: pytest tests/test_codec.py -v
+"""
+
+import pytest
+import sys
+import os
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import codec, fastjson
+from services.codec import Codec, CodecUnavailableError, decode, parse_codecs
+from services.cache import CacheManager, SQLiteCache, TieredCache
+
+HISTORY = [
+    {"item_count": 10 + n, "avg_price": 1000 + n, "timestamp": f"2024-01-{n + 1:02d}T00:00:00"}
+    for n in range(30)
+]
+
+class TestCodec:
+
+    @pytest.mark.parametrize("spec", ["json", "msgpack", "json+columnar+zlib", "msgpack+columnar+zstd", "msgpack+lz4"])
+    def test_round_trip(self, spec):
+        """Test that every codec returns what was encoded"""
+        encoder = parse_codecs(f"history={spec}")["history"]
+
+        assert decode(encoder.encode(HISTORY)) == HISTORY
+        assert decode(encoder.encode({"rows": 3})) == {"rows": 3}
+
+    def test_columnar_compressed_is_smaller(self):
+        """Test that columnar + compression shrinks a history series"""
+        plain = Codec().encode(HISTORY)
+        compact = Codec(columnar=True, compression="zlib").encode(HISTORY)
+
+        assert len(compact) * 3 < len(plain)
+
+    def test_ragged_rows_are_not_columnar(self):
+        """Test that rows with differing keys are stored as-is"""
+        rows = [{"a": 1}, {"a": 2, "b": 3}]
+
+        assert decode(Codec(columnar=True).encode(rows)) == rows
+
+    def test_decodes_plain_json(self):
+        """Test that values written before codecs existed still decode"""
+        assert decode(b'{"item_id": "T4_BAG"}') == {"item_id": "T4_BAG"}
+
+    def test_missing_libraries_fall_back(self, monkeypatch):
+        """Test that msgpack/zstd fall back to JSON/zlib when not installed"""
+        monkeypatch.setattr(codec, "msgpack", None)
+        monkeypatch.setattr(codec, "zstandard", None)
+
+        encoder = Codec(format="msgpack", compression="zstd", min_compress_bytes=0)
+
+        assert (encoder.format, encoder.compression) == ("json", "zlib")
+        assert decode(encoder.encode(HISTORY)) == HISTORY
+
+    def test_missing_library_on_decode_is_reported(self, monkeypatch):
+        """Test that bytes needing an absent library raise a clear error"""
+        data = Codec(compression="zlib", min_compress_bytes=0).encode(HISTORY)
+        data = bytes((data[0] | codec.MSGPACK,)) + data[1:]  # As if written with msgpack
+        monkeypatch.setattr(codec, "msgpack", None)
+
+        with pytest.raises(CodecUnavailableError):
+            decode(data)
+
+    def test_unknown_option_is_rejected(self):
+        with pytest.raises(ValueError):
+            parse_codecs("history=msgpack+brotli")
+
+class TestCachedCodecs:
+
+    def test_memory_cache_keeps_encoded_values(self):
+        """Test that namespaces with a codec are stored as bytes and decoded on read"""
+        cache = CacheManager(codecs=parse_codecs("history=columnar+zlib"))
+        cache.set("history:abc", HISTORY)
+        cache.set("prices:west:T4_BAG:Martlock:1", {"sell_price_min": 1000})
+
+        assert isinstance(cache.cache["history:abc"]["value"], bytes)
+        assert cache.cache["history:abc"]["size"] < len(Codec().encode(HISTORY))
+        assert cache.get("history:abc") == HISTORY
+        assert cache.cache["prices:west:T4_BAG:Martlock:1"]["value"] == {"sell_price_min": 1000}
+
+    def test_tiered_read_through_copies_encoded_bytes(self, tmp_path):
+        """Test that L2 payloads reach another worker's L1 without re-encoding"""
+        codecs = parse_codecs("history=columnar+zlib")
+        path = str(tmp_path / "l2.sqlite3")
+        first = TieredCache(CacheManager(codecs=codecs), SQLiteCache(path, codecs=codecs))
+        second = TieredCache(CacheManager(codecs=codecs), SQLiteCache(path, codecs=codecs))
+
+        first.set("history:abc", HISTORY)
+
+        assert second.get("history:abc") == HISTORY
+        assert second.l1.cache["history:abc"]["value"] == first.l2.get_encoded_entry("history:abc")[0]
+        first.l2.close()
+        second.l2.close()
+
+    def test_undecodable_l2_entries_are_misses(self, tmp_path, monkeypatch):
+        """Test that values written with a library this worker lacks are cache misses"""
+        # Writer has msgpack (a stand-in packing JSON), the reader does not
+        monkeypatch.setattr(codec, "msgpack", SimpleNamespace(packb=lambda value, **kwargs: fastjson.dumps(value)))
+        codecs = parse_codecs("history=msgpack")
+        path = str(tmp_path / "l2.sqlite3")
+        writer = TieredCache(CacheManager(codecs=codecs), SQLiteCache(path, codecs=codecs))
+        writer.set("history:abc", HISTORY)
+        monkeypatch.setattr(codec, "msgpack", None)
+        reader = TieredCache(CacheManager(codecs=codecs), SQLiteCache(path, codecs=codecs))
+
+        assert reader.warm(100) == 0
+        assert reader.get("history:abc") is None
+        assert writer.get("history:abc") is None  # Its own L1 copy is dropped too
+        writer.l2.close()
+        reader.l2.close()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
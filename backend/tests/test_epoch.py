@@ -0,0 +1,69 @@
+"""
+Tests for price epoch tracking
+Run with: pytest tests/test_epoch.py -v
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.epoch import PriceEpochs
+
+class TestPriceEpochs:
+
+    @pytest.fixture
+    def epochs(self):
+        return PriceEpochs()
+
+    def test_bump_is_monotonic(self, epochs):
+        """Test that every bump yields a higher epoch"""
+        epochs.bump("west", ["T4_BAG"])
+        first = epochs.get("west", "T4_BAG")
+        epochs.bump("west", ["T4_BAG"])
+
+        assert epochs.get("west", "T4_BAG") > first
+        assert epochs.get("europe", "T4_BAG") == 0
+
+    def test_observe_only_bumps_on_change(self, epochs):
+        """Test that identical AODP rows do not bump the epoch"""
+        rows = [{"item_id": "T4_BAG", "city": "Martlock", "sell_price_min": 1000}]
+
+        assert epochs.observe("west", "T4_BAG", rows) is True
+        assert epochs.observe("west", "T4_BAG", rows) is False
+
+        rows[0]["sell_price_min"] = 1100
+        assert epochs.observe("west", "T4_BAG", rows) is True
+
+    def test_observe_partial_fetches(self, epochs):
+        """Test that fetching other cities or qualities of an item does not bump it"""
+        martlock = {"item_id": "T4_BAG", "city": "Martlock", "quality": 1, "sell_price_min": 1000}
+        lymhurst = {"item_id": "T4_BAG", "city": "Lymhurst", "quality": 1, "sell_price_min": 1100}
+        quality_2 = {"item_id": "T4_BAG", "city": "Martlock", "quality": 2, "sell_price_min": 1500}
+
+        assert epochs.observe("west", "T4_BAG", [martlock, lymhurst, quality_2]) is True
+        assert epochs.observe("west", "T4_BAG", [martlock]) is False
+        assert epochs.observe("west", "T4_BAG", [lymhurst, quality_2]) is False
+        assert epochs.observe("west", "T4_BAG", [dict(lymhurst, sell_price_min=1200)]) is True
+
+    def test_fingerprints_are_bounded(self):
+        """Test that old fingerprints are dropped past max_fingerprints"""
+        epochs = PriceEpochs(max_fingerprints=2)
+        for city in ("Martlock", "Lymhurst", "Thetford"):
+            epochs.observe("west", "T4_BAG", [{"item_id": "T4_BAG", "city": city, "quality": 1}])
+
+        assert len(epochs.fingerprints) == 2
+        assert ("west", "T4_BAG", "Martlock", 1) not in epochs.fingerprints
+
+    def test_signature_tracks_items(self, epochs):
+        """Test that the signature changes only when a covered item changes"""
+        signature = epochs.signature("west", ["T4_BAG", "T5_BAG"])
+
+        epochs.bump("west", ["T6_BAG"])
+        assert epochs.signature("west", ["T5_BAG", "T4_BAG"]) == signature
+
+        epochs.bump("west", ["T5_BAG"])
+        assert epochs.signature("west", ["T4_BAG", "T5_BAG"]) != signature
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,50 @@
+"""
+Tests for the fast JSON layer
+Run with: pytest tests/test_fastjson.py -v
+"""
+
+import pytest
+import json
+from datetime import datetime
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import fastjson
+from services.fastjson import FastJSONResponse
+
+@pytest.fixture(params=["fast", "stdlib"])
+def backend(request, monkeypatch):
+    """Run each test with the installed backend and the stdlib fallback"""
+    if request.param == "stdlib":
+        monkeypatch.setattr(fastjson, "orjson", None)
+    return request.param
+
+class TestFastJSON:
+
+    def test_round_trip(self, backend):
+        """Test that encoding then decoding returns the same value"""
+        value = {"item_id": "T4_BAG", "prices": [1000, 1200.5, None], "city": "Fort Sterling", "ok": True}
+
+        encoded = fastjson.dumps(value)
+
+        assert isinstance(encoded, bytes)
+        assert fastjson.loads(encoded) == value
+        assert json.loads(encoded) == value
+
+    def test_sort_keys_is_stable(self, backend):
+        """Test that sorted output does not depend on insertion order"""
+        assert fastjson.dumps({"b": 1, "a": 2}, sort_keys=True) == fastjson.dumps({"a": 2, "b": 1}, sort_keys=True)
+
+    def test_response_encodes_datetimes(self, backend):
+        """Test that the response class renders values the stdlib can't encode natively"""
+        response = FastJSONResponse({"timestamp": datetime(2024, 1, 1, 12, 0), "name": "Caerleón"})
+
+        body = json.loads(response.body)
+
+        assert body["timestamp"].startswith("2024-01-01")
+        assert body["name"] == "Caerleón"
+        assert response.media_type == "application/json"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
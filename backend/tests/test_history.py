@@ -0,0 +1,91 @@
+"""
+Tests for batch market history
+Run with: pytest tests/test_history.py -v
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from services.history import HistoryService
+from tests.conftest import make_client
+
+def history_rows(request):
+    """Fake AODP history response: two completed days and today's partial bucket"""
+    items = request.url.path.rsplit("/", 1)[-1][:-len(".json")].split(",")
+    cities = request.url.params["locations"].split(",")
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=2), today - timedelta(days=1), today]
+    return [
+        {
+            "location": city,
+            "item_id": item,
+            "quality": 1,
+            "data": [
+                {"timestamp": day.isoformat(), "item_count": 10, "avg_price": 1000}
+                for day in days
+            ]
+        }
+        for item in items for city in cities
+    ]
+
+class TestHistoryService:
+
+    @pytest.fixture
+    def db(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_fetches_once_and_persists(self, db):
+        """Test one multi-item call, stored completed buckets and no refetch"""
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=history_rows(request))
+
+        client = make_client(handler)
+        service = HistoryService(client, client.cache)
+        items = ["T4_BAG", "T5_BAG"]
+        cities = ["Martlock", "Lymhurst"]
+
+        result = await service.get_history_batch(db, "west", items, cities, [24])
+
+        assert len(requests) == 1
+        assert len(result["series"]) == 4
+        # Today's bucket is still in progress and is not stored
+        assert all(len(series["data"]) == 2 for series in result["series"])
+        assert all(series["total_item_count"] == 20 for series in result["series"])
+
+        # A fresh cache (e.g. after restart) still serves completed buckets from the DB
+        service.cache.clear()
+        again = await service.get_history_batch(db, "west", items, cities, [24])
+
+        assert len(requests) == 1
+        assert again["series"] == result["series"]
+
+    @pytest.mark.asyncio
+    async def test_failed_chunks_are_reported(self, db):
+        """Test that AODP errors come back per chunk"""
+        client = make_client(lambda request: httpx.Response(404))
+        service = HistoryService(client, client.cache)
+
+        result = await service.get_history_batch(db, "west", ["T4_BAG"], ["Martlock"], [24])
+
+        assert result["series"] == []
+        assert result["errors"][0]["items"] == ["T4_BAG"]
+        assert result["errors"][0]["timescale"] == 24
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
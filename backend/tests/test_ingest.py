@@ -0,0 +1,145 @@
+"""
+Tests for private data ingestion service
+Run with: pytest tests/test_ingest.py -v
+"""
+
+import pytest
+from datetime import datetime, timedelta
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, MarketTick
+from services.ingest import IngestService
+from services.epoch import PriceEpochs
+from services.cache import CacheManager, city_tag, item_tag
+
+class TestIngestService:
+
+    @pytest.fixture
+    def db(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    @pytest.fixture
+    def service(self):
+        return IngestService()
+
+    def _add_tick(self, db, source, quality, sell_price_min, hours_ago=1, city="Martlock"):
+        db.add(MarketTick(
+            source=source,
+            region="west",
+            city=city,
+            item_id="T4_BAG",
+            quality=quality,
+            sell_price_min=sell_price_min,
+            buy_price_max=sell_price_min - 100,
+            timestamp=datetime.utcnow() - timedelta(hours=hours_ago)
+        ))
+        db.commit()
+
+    def test_snapshot_is_keyed_by_quality(self, db, service):
+        """Test that each requested quality gets its own record"""
+        self._add_tick(db, "AODP", 1, 1000)
+        self._add_tick(db, "AODP", 2, 1500, hours_ago=0.5)
+
+        snapshot = service.get_best_snapshot(
+            db=db, region="west", cities=["Martlock"], items=["T4_BAG"],
+            qualities=[1, 2]
+        )
+
+        assert [(r["quality"], r["sell_price_min"]) for r in snapshot] == [(1, 1000), (2, 1500)]
+
+    def test_snapshot_prefers_private(self, db, service):
+        """Test that PRIVATE data wins over newer AODP data for the same key"""
+        self._add_tick(db, "PRIVATE", 1, 1100, hours_ago=2)
+        self._add_tick(db, "AODP", 1, 1000, hours_ago=1)
+
+        snapshot = service.get_best_snapshot(
+            db=db, region="west", cities=["Martlock"], items=["T4_BAG"],
+            qualities=[1]
+        )
+
+        assert len(snapshot) == 1
+        assert snapshot[0]["source"] == "PRIVATE"
+        assert snapshot[0]["sell_price_min"] == 1100
+
+    def test_snapshot_at_least_mode(self, db, service):
+        """Test resolving a quality to the cheapest offer at or above it"""
+        self._add_tick(db, "AODP", 1, 1000)
+        self._add_tick(db, "AODP", 2, 1200)
+        self._add_tick(db, "AODP", 3, 900)
+
+        snapshot = service.get_best_snapshot(
+            db=db, region="west", cities=["Martlock"], items=["T4_BAG"],
+            qualities=[2], quality_mode="at_least"
+        )
+
+        assert len(snapshot) == 1
+        assert snapshot[0]["quality"] == 3
+        assert snapshot[0]["requested_quality"] == 2
+        # Sell side comes from the quality 2 buy orders, not the quality 3 record
+        assert snapshot[0]["buy_price_max"] == 1100
+
+    def test_resolve_min_quality(self, service):
+        """Test at_least resolution on merged price records"""
+        prices = [
+            {"item_id": "T4_BAG", "city": "Martlock", "quality": 1, "sell_price_min": 800},
+            {"item_id": "T4_BAG", "city": "Martlock", "quality": 2, "sell_price_min": 0},
+        ]
+
+        resolved = service.resolve_min_quality(prices, [1, 2])
+
+        assert [(r["requested_quality"], r["quality"]) for r in resolved] == [(1, 1), (2, 2)]
+
+    def test_ingest_bumps_price_epoch(self, db):
+        """Test that ingesting new PRIVATE data bumps the item's epoch"""
+        epochs = PriceEpochs()
+        service = IngestService(epochs=epochs)
+        record = {
+            "region": "west",
+            "city": "Martlock",
+            "item_id": "T4_BAG",
+            "quality": 1,
+            "sell_price_min": 1000,
+            "timestamp": "2024-01-01 12:00:00"
+        }
+
+        service.ingest_adc_data(db, [record])
+        epoch = epochs.get("west", "T4_BAG")
+        assert epoch > 0
+
+        # Re-ingesting the same record is a duplicate and keeps the epoch
+        service.ingest_adc_data(db, [record])
+        assert epochs.get("west", "T4_BAG") == epoch
+
+    def test_ingest_invalidates_cached_item_data(self, db):
+        """Test that ingesting an item drops its cached entries and nothing else"""
+        cache = CacheManager()
+        service = IngestService(cache=cache)
+        cache.set("prices:west:T4_BAG:Martlock:1", {"sell_price_min": 900},
+                  tags=(item_tag("west", "T4_BAG"), city_tag("west", "Martlock")))
+        cache.set("prices:west:T5_BAG:Martlock:1", {"sell_price_min": 2000},
+                  tags=(item_tag("west", "T5_BAG"), city_tag("west", "Martlock")))
+
+        stats = service.ingest_adc_data(db, [{
+            "region": "west",
+            "city": "Martlock",
+            "item_id": "T4_BAG",
+            "quality": 1,
+            "sell_price_min": 1000,
+            "timestamp": "2024-01-01 12:00:00"
+        }])
+
+        assert stats["cache_invalidated"] == 1
+        assert cache.get("prices:west:T4_BAG:Martlock:1") is None
+        assert cache.get("prices:west:T5_BAG:Martlock:1") == {"sell_price_min": 2000}
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+"""
+Tests for background prefetch scheduler
+Run with: pytest tests/test_prefetch.py -v
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from services.prefetch import PrefetchScheduler
+from tests.conftest import make_client, price_rows
+
+class TestPrefetchScheduler:
+
+    @pytest.fixture
+    def requests(self):
+        return []
+
+    @pytest.fixture
+    def client(self, requests):
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=price_rows(request))
+
+        return make_client(handler, max_url_length=200)
+
+    @pytest.mark.asyncio
+    async def test_run_once_warms_watchlist(self, client):
+        """Test that a cycle fills the cache for watched entries"""
+        scheduler = PrefetchScheduler(client)
+        scheduler.watch("west", ["T4_BAG", "T5_BAG"], ["Martlock"], [1])
+
+        await scheduler.run_once()
+
+        assert client.cache.get("prices:west:T4_BAG:Martlock:1") is not None
+        assert scheduler.due_entries() == []
+
+    @pytest.mark.asyncio
+    async def test_learned_entries_come_first_and_budget_is_kept(self, client, requests):
+        """Test priority order (staleness x value) under a one-request budget"""
+        client.rate_limiter.set_rate(1)
+        scheduler = PrefetchScheduler(client, interval_seconds=60)
+        items = [f"T4_ITEM_{n:03d}" for n in range(50)]
+        scheduler.watch("west", items, ["Martlock"], [1])
+        scheduler.record_request("west", ["T4_ITEM_049"], ["Martlock"], [1])
+
+        result = await scheduler.run_once()
+
+        assert result["requests"] == 1
+        assert len(requests) == 1
+        assert "T4_ITEM_049" in requests[0].url.path
+
+    @pytest.mark.asyncio
+    async def test_cycle_skipped_when_limiter_busy(self, client, requests):
+        """Test that prefetch leaves headroom for interactive traffic"""
+        scheduler = PrefetchScheduler(client)
+        scheduler.watch("west", ["T4_BAG"], ["Martlock"], [1])
+        client.rate_limiter.tokens = 0
+
+        await scheduler.run_once()
+
+        assert requests == []
+        assert scheduler.get_stats()["skipped_cycles"] == 1
+
+    @pytest.mark.asyncio
+    async def test_headroom_is_per_region_host(self, client, requests):
+        """Test that a busy west host does not stop prefetching for europe"""
+        scheduler = PrefetchScheduler(client)
+        scheduler.watch("europe", ["T4_BAG"], ["Martlock"], [1])
+        client.rate_limiter.tokens = 0
+
+        result = await scheduler.run_once()
+
+        assert result["requests"] == 1
+        assert requests[0].url.host == "europe.albion-online-data.com"
+
+    @pytest.mark.asyncio
+    async def test_quality_zero_entries_are_warmed(self, requests):
+        """Test that quality 0 entries AODP answers with real qualities stop being due"""
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=[
+                {"item_id": "T4_BAG", "city": "Martlock", "quality": q, "sell_price_min": 1000}
+                for q in (1, 2)
+            ])
+
+        scheduler = PrefetchScheduler(make_client(handler))
+        scheduler.watch("west", ["T4_BAG"], ["Martlock"], [0])
+
+        for _ in range(3):
+            await scheduler.run_once()
+
+        assert len(requests) == 1
+        assert scheduler.due_entries() == []
+
+    def test_learned_entries_are_bounded(self, client):
+        """Test that the least requested learned entries are evicted"""
+        scheduler = PrefetchScheduler(client, max_learned=100)
+        scheduler.record_request("west", ["T4_HOT"], ["Martlock"], [1])
+        scheduler.record_request("west", ["T4_HOT"], ["Martlock"], [1])
+        for n in range(150):
+            scheduler.record_request("west", [f"T4_ITEM_{n}"], ["Martlock"], [1])
+
+        assert len(scheduler.learned) <= 100
+        assert ("west", "T4_HOT", "Martlock", 1) in scheduler.learned
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
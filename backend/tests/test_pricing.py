@@ -9,8 +9,30 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from services import pricing
 from services.pricing import PricingCalculator
 
+def random_prices(seed: int, items: int = 12):
+    """Price rows with duplicates, missing and zero prices across qualities and cities"""
+    import random
+    rng = random.Random(seed)
+    cities = ["Martlock", "Lymhurst", "Bridgewatch", "Fort Sterling", "Thetford", "Caerleon"]
+    rows = []
+    for n in range(items):
+        for quality in (1, 2):
+            for city in rng.sample(cities, rng.randint(1, len(cities))):
+                rows.append({
+                    "item_id": f"T4_ITEM_{n}",
+                    "city": city,
+                    "quality": quality,
+                    "sell_price_min": rng.choice([None, 0, rng.randint(500, 1500)]),
+                    "buy_price_max": rng.choice([None, 0, rng.randint(500, 1800)]),
+                    "sell_price_min_date": "2024-01-01T00:00:00",
+                    "buy_price_max_date": "2024-01-01T00:00:00",
+                    "age_hours": rng.randint(0, 5)
+                })
+    return rows
+
 class TestPricingCalculator:
     
     @pytest.fixture
@@ -207,6 +229,89 @@ class TestPricingCalculator:
         
         # Should find no profitable opportunities
         assert len(opportunities) == 0
+    
+    def test_align_regions(self, calculator):
+        """Test aligning regions by item, city and quality"""
+        prices_by_region = {
+            "west": [
+                {"item_id": "T4_BAG", "city": "Martlock", "quality": 1, "sell_price_min": 1000, "age_hours": 1},
+                {"item_id": "T4_BAG", "city": "Lymhurst", "quality": 1, "sell_price_min": 1100, "age_hours": 3}
+            ],
+            "europe": [
+                {"item_id": "T4_BAG", "city": "Martlock", "quality": 1, "sell_price_min": 900, "age_hours": 2}
+            ],
+            "east": []
+        }
+        
+        rows, summaries = calculator.align_regions(prices_by_region)
+        
+        assert [(r["city"], sorted(r["regions"])) for r in rows] == [
+            ("Lymhurst", ["west"]),
+            ("Martlock", ["europe", "west"])
+        ]
+        assert rows[1]["regions"]["europe"]["sell_price_min"] == 900
+        assert summaries["west"] == {"rows": 2, "newest_age_hours": 1, "oldest_age_hours": 3, "avg_age_hours": 2}
+        assert summaries["east"]["rows"] == 0
+        assert summaries["east"]["newest_age_hours"] is None
+
+    def test_top_k_sorts_by_profit(self, calculator):
+        """Test that top_k returns the best routes by percentage, then absolute profit"""
+        prices = random_prices(1)
+        everything = calculator._calculate_opportunities_loop(prices, True, 0.025, 0, False)
+        
+        best = calculator.calculate_opportunities(prices, True, 0.025, top_k=5)
+        
+        rank = lambda x: (-x["profit_percentage"], -x["profit_absolute"])
+        assert len(best) == 5
+        assert best == sorted(best, key=rank)
+        assert all(rank(o) >= rank(best[-1]) for o in everything if o not in best)
+
+class TestVectorizedOpportunities:
+    
+    @pytest.fixture
+    def calculator(self):
+        if pricing.np is None:
+            pytest.skip("numpy not installed")
+        return PricingCalculator()
+    
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("premium,transport_cost,prefer_caerleon", [
+        (True, 0, False),
+        (False, 25, True)
+    ])
+    def test_matches_loop(self, calculator, seed, premium, transport_cost, prefer_caerleon):
+        """Test that the NumPy engine returns exactly what the loop returns"""
+        prices = random_prices(seed)
+        args = (prices, premium, 0.025, transport_cost, prefer_caerleon)
+        
+        assert calculator._calculate_opportunities_vectorized(*args) == calculator._calculate_opportunities_loop(*args)
+    
+    def test_top_k_matches_loop(self, calculator):
+        """Test that top_k ranks the same routes on both engines"""
+        prices = random_prices(7, items=40)
+        vectorized = calculator.calculate_opportunities(prices, True, 0.025, 10, True, top_k=20)
+        
+        assert vectorized == calculator._calculate_opportunities_loop(prices, True, 0.025, 10, True, top_k=20)
+    
+    def test_top_k_ties_keep_loop_order(self, calculator):
+        """Test that routes with equal profit are ranked in item/quality/city order"""
+        prices = [
+            {"item_id": f"T4_ITEM_{n}", "city": city, "quality": 1, "sell_price_min": 1000, "buy_price_max": 2000}
+            for n in range(40) for city in ("Martlock", "Lymhurst")
+        ]
+        
+        best = calculator.calculate_opportunities(prices, True, 0.025, top_k=3)
+        
+        assert [(o["item_id"], o["buy_city"]) for o in best] == [
+            ("T4_ITEM_0", "Martlock"), ("T4_ITEM_0", "Lymhurst"), ("T4_ITEM_1", "Martlock")
+        ]
+    
+    def test_non_numeric_prices_fall_back(self, calculator):
+        """Test that unexpected price values are left to the loop"""
+        prices = random_prices(2)
+        prices[0]["sell_price_min"] = "n/a"
+        
+        assert calculator._calculate_opportunities_vectorized(prices, True, 0.025) is None
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Tests for the response cache
+Run with: pytest tests/test_response_cache.py -v
+"""
+
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.epoch import PriceEpochs
+from services.fastjson import FastJSONResponse
+from services.response_cache import ResponseCache
+
+class TestResponseCache:
+
+    @pytest.fixture
+    def cache(self):
+        return ResponseCache(ttl_seconds=60)
+
+    def test_hit_serves_stored_bytes(self, cache):
+        """Test that a stored response is served as the same bytes with its ETag"""
+        key = cache.make_key("opportunities", {"items": ["T4_BAG"]}, "v1")
+        first = cache.store(key, FastJSONResponse({"opportunities": [1, 2, 3]}))
+
+        hit = cache.lookup(key)
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert hit.body == first.body
+        assert hit.headers["ETag"] == first.headers["ETag"]
+        assert hit.headers["X-Cache"] == "HIT"
+
+    def test_if_none_match_returns_304(self, cache):
+        """Test that a matching (strong, weak or listed) ETag gets an empty 304"""
+        key = cache.make_key("prices", {"items": ["T4_BAG"]}, "v1")
+        etag = cache.store(key, FastJSONResponse({"prices": []})).headers["ETag"]
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            response = cache.lookup(key, header)
+            assert response.status_code == 304
+            assert response.body == b""
+        assert cache.lookup(key, '"other"').status_code == 200
+        # A client revalidating right after a miss gets a 304 as well
+        assert cache.store(key, FastJSONResponse({"prices": []}), etag).status_code == 304
+
+    def test_key_follows_body_and_data_version(self, cache):
+        """Test that keys ignore key order but change with the data version"""
+        epochs = PriceEpochs()
+        params = {"region": "west", "items": ["T4_BAG"], "premium": True}
+
+        key = cache.make_key("opportunities", params, epochs.signature("west", ["T4_BAG"]))
+        same = cache.make_key("opportunities", dict(reversed(params.items())), epochs.signature("west", ["T4_BAG"]))
+        epochs.bump("west", ["T4_BAG"])
+        bumped = cache.make_key("opportunities", params, epochs.signature("west", ["T4_BAG"]))
+
+        assert key == same
+        assert key != bumped
+        assert key.startswith("opportunities:")
+
+    def test_size_counts_encoded_body(self, cache):
+        """Test that entries are sized by their bytes, so max_bytes bounds the cache"""
+        key = cache.make_key("prices", {}, "v1")
+        response = cache.store(key, FastJSONResponse({"prices": ["x" * 1000]}))
+
+        assert cache.get_stats()["bytes"] >= len(response.body)
+        assert cache.get_namespace_stats()["prices"]["entries"] == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -44,6 +44,11 @@ pip install uvicorn[standard]==0.24.0
 pip install httpx==0.25.1
 pip install pydantic==2.4.2
 pip install python-dotenv==1.0.0
+pip install orjson==3.9.10
+pip install numpy==1.26.2
+pip install msgpack==1.0.7
+pip install zstandard==0.22.0
+pip install lz4==4.3.2
 pip install pytest==7.4.3
 pip install pytest-asyncio==0.21.1
 